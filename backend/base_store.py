@@ -0,0 +1,201 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
+from .models import (
+    Product, ProductCreate, Cart, CartItemCreate, CartQuote, ChangeFeed, Order, User, SessionToken, StockLevel
+)
+
+# Sessions stop resolving this many seconds after login.
+SESSION_TTL = int(os.environ.get('ECOMMERCE_SESSION_TTL', str(7 * 24 * 3600)))
+# Stock reserved by adding to a cart is released again this many seconds
+# after the line was last added to, unless the cart is checked out first.
+HOLD_TTL = int(os.environ.get('ECOMMERCE_HOLD_TTL', '900'))
+
+
+class InsufficientStock(Exception):
+    """Raised when products in a cart or cart update are not available."""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(set(product_ids))
+        super().__init__(f"Insufficient stock for products {self.product_ids}")
+
+
+def check_quantities(quantities: Iterable[int]):
+    """Raise ValueError unless every quantity is at least one unit."""
+    if any(quantity <= 0 for quantity in quantities):
+        raise ValueError("Quantity must be at least 1")
+
+
+class BaseStore(ABC):
+    """Operations every storage engine provides to the API layer."""
+
+    session_ttl = SESSION_TTL
+    hold_ttl = HOLD_TTL
+    # Whether several processes may open the same store at once, e.g. as
+    # uvicorn workers.
+    shared = False
+
+    @abstractmethod
+    def open(self):
+        ...
+
+    @abstractmethod
+    def flush(self):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+    @abstractmethod
+    def search_products(self, query: str) -> List[Product]:
+        ...
+
+    @abstractmethod
+    def signup(self, username: str, password: str, role: str) -> bool:
+        ...
+
+    @abstractmethod
+    def login(self, username: str, password: str) -> Optional[SessionToken]:
+        ...
+
+    @abstractmethod
+    def get_user_by_token(self, token: str) -> Optional[User]:
+        ...
+
+    @abstractmethod
+    def get_session(self, token: str) -> Optional[SessionToken]:
+        """Return the session for ``token``, or None if unknown or expired."""
+
+    @abstractmethod
+    def purge_expired_sessions(self) -> int:
+        """Delete expired sessions from storage; returns how many went."""
+
+    @abstractmethod
+    def add_product(self, name: str, price: float, description: str, stock: Optional[int] = None) -> Product:
+        ...
+
+    @abstractmethod
+    def add_products(self, products: List[ProductCreate]) -> List[Product]:
+        """Add several products in a single storage transaction."""
+
+    @abstractmethod
+    def seed_products(self, products: List[ProductCreate]) -> List[Product]:
+        """Add ``products`` only if the catalog is empty; returns what was added.
+
+        The emptiness check and the insert are one atomic step, so when
+        several processes seed a shared store at once only one of them adds
+        anything.
+        """
+
+    @abstractmethod
+    def get_product(self, product_id: int) -> Optional[Product]:
+        ...
+
+    @abstractmethod
+    def get_all_products(self) -> List[Product]:
+        ...
+
+    @abstractmethod
+    def list_products(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                      sort: str = 'id', descending: bool = False,
+                      min_price: Optional[float] = None,
+                      max_price: Optional[float] = None) -> Tuple[List[Product], Optional[str]]:
+        """Return one page of products and the cursor for the next page.
+
+        The cursor is None on the last page. Raises ValueError for an unknown
+        sort key or a cursor issued for a different ordering.
+        """
+
+    @abstractmethod
+    def update_product(self, product_id: int, **kwargs) -> Optional[Product]:
+        ...
+
+    @abstractmethod
+    def delete_product(self, product_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def get_stock(self, product_id: int) -> Optional[StockLevel]:
+        """Stock level of a product; None if the product does not exist."""
+
+    @abstractmethod
+    def set_stock(self, product_id: int, stock: Optional[int]) -> Optional[StockLevel]:
+        """Set units on hand (None stops tracking); None if the product does not exist.
+
+        Raises ValueError if fewer units than carts currently hold are requested.
+        """
+
+    @abstractmethod
+    def release_expired_holds(self) -> int:
+        """Return expired cart holds to available stock; returns how many went."""
+
+    @abstractmethod
+    def get_cart(self, user_id: str) -> Cart:
+        ...
+
+    @abstractmethod
+    def add_to_cart(self, user_id: str, product_id: int, quantity: int = 1) -> bool:
+        """Add to the cart and hold the stock; raises InsufficientStock if it is not available.
+
+        Raises ValueError for a quantity below 1.
+        """
+
+    @abstractmethod
+    def add_to_cart_many(self, user_id: str, items: List[CartItemCreate]) -> List[int]:
+        """Add several cart lines at once.
+
+        Either every line is applied or, if some products do not exist,
+        nothing is and their ids are returned. Raises InsufficientStock,
+        again applying nothing, if some products lack stock, or ValueError
+        for a quantity below 1.
+        """
+
+    @abstractmethod
+    def remove_from_cart(self, user_id: str, product_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def quote_cart(self, user_id: str) -> CartQuote:
+        """Price the cart as checkout would, without placing an order."""
+
+    @abstractmethod
+    def checkout(self, user_id: str) -> Optional[Order]:
+        """Turn the cart into an order, deducting its stock.
+
+        Lines whose product is gone are left out and listed in the order's
+        missing_product_ids; lines are charged at the current price, and
+        those that changed since being added are listed in ``repriced``.
+        Returns None if no line can be ordered. Raises InsufficientStock,
+        leaving cart and stock unchanged, if a line is neither held nor
+        available any more.
+        """
+
+    @abstractmethod
+    def get_order(self, order_id: int) -> Optional[Order]:
+        ...
+
+    @abstractmethod
+    def list_orders(self, user_id: str, limit: int = 20,
+                    cursor: Optional[str] = None) -> Tuple[List[Order], Optional[str]]:
+        """Return one page of the user's orders, newest first, and the next cursor.
+
+        Only the user's own orders are read, however many exist in total.
+        Raises ValueError for a malformed cursor.
+        """
+
+    @abstractmethod
+    def changes(self, since: int = 0, limit: int = 100) -> ChangeFeed:
+        """Return up to ``limit`` changes with a sequence number above ``since``, oldest first.
+
+        Product adds, updates and deletes and checkouts are recorded, each
+        in the same step as the change itself.
+        """
+
+    @abstractmethod
+    def last_product_change(self) -> int:
+        """Sequence number of the latest product change in the feed, or 0.
+
+        Lets a process sharing the store tell whether products changed
+        since it last looked.
+        """
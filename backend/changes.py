@@ -0,0 +1,94 @@
+"""Ordered log of product and order changes, read through ``GET /changes``.
+
+Every product add, update and delete and every checkout appends one entry
+per product or order, numbered by a sequence that only ever grows.
+Consumers remember the last sequence number they handled and ask for what
+came after it, instead of re-reading the whole catalog.
+
+Entries only say what changed; the feed attaches the product or order as it
+is when read, so a consumer that falls behind sees each item's latest state
+(or None once it is gone) and does not need to replay every version.
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from .models import Change, ChangeFeed, Order, Product
+from .records import CHANGE_BLOCK, ChangeRecord, to_micros
+
+PRODUCT = "product"
+ORDER = "order"
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+
+def change_feed(entries: Iterable[Tuple[int, str, str, int, datetime]], since: int,
+                products: Dict[int, Product], orders: Dict[int, Order]) -> ChangeFeed:
+    """Build the feed from (seq, entity, action, id, at) entries, oldest first."""
+    changes = [
+        Change(seq=seq, entity=entity, action=action, id=entity_id, at=at,
+               product=products.get(entity_id) if entity == PRODUCT else None,
+               order=orders.get(entity_id) if entity == ORDER else None)
+        for seq, entity, action, entity_id, at in entries
+    ]
+    return ChangeFeed(changes=changes, last_seq=changes[-1].seq if changes else since)
+
+
+class ChangeLog:
+    """Change log for the shelve and memory engines.
+
+    Changes are stored in blocks of CHANGE_BLOCK per ``changes`` record,
+    so the log adds one key per block rather than per change (the dbm
+    behind shelve slows down with every key), and reading after a given
+    number is a few block lookups. Sequence numbers are handed out, written
+    and published under one lock, and readers only look up to the last
+    published number, so they never see a gap that a slower writer fills
+    in later.
+    """
+
+    def __init__(self, handle):
+        self._handle = handle
+        self._lock = threading.Lock()
+        self.last_seq = 0
+        self.last_product_seq = 0
+        # The block last_seq falls in, as stored.
+        self._tail: List[ChangeRecord] = []
+
+    def load(self):
+        self.last_seq = self._handle.get('meta', 'last_change_seq', 0)
+        # Logs written before this was kept fall back to the newest change.
+        self.last_product_seq = self._handle.get('meta', 'last_product_change_seq', self.last_seq)
+        self._tail = list(self._handle.get('changes', self.last_seq // CHANGE_BLOCK, ()))
+
+    def append(self, entity: str, action: str, ids: Iterable[int]):
+        """Record ``action`` on each id; the caller commits the handle."""
+        ids = list(ids)
+        if not ids:
+            return
+        at = to_micros(datetime.now())
+        with self._lock:
+            blocks = {}
+            tail = list(self._tail)
+            seq = self.last_seq
+            for entity_id in ids:
+                seq += 1
+                if seq % CHANGE_BLOCK == 0:
+                    tail = []
+                tail.append(ChangeRecord(seq, entity, action, entity_id, at))
+                blocks[seq // CHANGE_BLOCK] = tail
+            self._handle.put_many('changes', {block: tuple(records) for block, records in blocks.items()})
+            self._handle.put('meta', 'last_change_seq', seq)
+            if entity == PRODUCT:
+                self._handle.put('meta', 'last_product_change_seq', seq)
+                self.last_product_seq = seq
+            self._tail = tail
+            self.last_seq = seq
+
+    def read(self, since: int, limit: int) -> List[ChangeRecord]:
+        last = min(self.last_seq, since + limit)
+        if last <= since:
+            return []
+        blocks = range((since + 1) // CHANGE_BLOCK, last // CHANGE_BLOCK + 1)
+        found = self._handle.get_many('changes', blocks)
+        return [r for block in blocks for r in found.get(block, ()) if since < r.seq <= last]
@@ -0,0 +1,73 @@
+"""Pricing a cart for checkout.
+
+Engines resolve every cart line against the catalog in one bulk fetch and
+hand the result to ``price_cart``, which prices the whole cart in a single
+pass over integer cents. Totals are therefore exact however many lines a
+cart has, and each line costs the same small amount. Lines whose product no
+longer exists and lines whose price changed since they were added are
+reported rather than silently dropped or charged.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .models import CartQuote, Order, OrderItem, RepricedItem
+
+
+def to_cents(price: float) -> int:
+    return int(round(price * 100))
+
+
+class Quote(NamedTuple):
+    lines: List[Tuple[int, str, float, int]]  # product_id, name, current price, quantity
+    total_cents: int
+    missing: List[int]
+    repriced: List[Tuple[int, float, float]]  # product_id, price when added, current price
+
+    @property
+    def total(self) -> float:
+        return self.total_cents / 100
+
+
+def price_cart(cart: Iterable[Tuple[int, int, Optional[float]]],
+               catalog: Dict[int, Tuple[str, float]]) -> Quote:
+    """Price (product_id, quantity, price when added) lines against ``catalog``.
+
+    ``catalog`` maps product id -> (name, current price) for the products
+    that still exist.
+    """
+    lines = []
+    missing = []
+    repriced = []
+    total = 0
+    for product_id, quantity, seen in cart:
+        product = catalog.get(product_id)
+        if product is None:
+            missing.append(product_id)
+            continue
+        name, price = product
+        cents = to_cents(price)
+        if seen is not None and to_cents(seen) != cents:
+            repriced.append((product_id, seen, price))
+        total += cents * quantity
+        lines.append((product_id, name, price, quantity))
+    return Quote(lines, total, missing, repriced)
+
+
+def _repriced(quote: Quote) -> List[RepricedItem]:
+    return [RepricedItem(product_id=pid, old_price=old, new_price=new) for pid, old, new in quote.repriced]
+
+
+def order_items(quote: Quote) -> List[OrderItem]:
+    return [OrderItem(product_id=pid, name=name, price=price, quantity=quantity)
+            for pid, name, price, quantity in quote.lines]
+
+
+def quote_model(quote: Quote) -> CartQuote:
+    return CartQuote(items=order_items(quote), total=quote.total,
+                     missing_product_ids=quote.missing, repriced=_repriced(quote))
+
+
+def with_report(order: Order, quote: Quote) -> Order:
+    """Attach the quote's missing and repriced lines to a fresh order."""
+    order.missing_product_ids = quote.missing
+    order.repriced = _repriced(quote)
+    return order
@@ -1,12 +1,173 @@
+import os
 import shelve
+import threading
+import time
 from contextlib import contextmanager
 
+from . import records
+from .locks import ProcessLock
+from .metrics import STORE_CODEC, STORE_IO
+
 DB_PATH = 'ecommerce_db'
+# Seconds between syncs of the shelve index; 0 syncs after every mutation.
+SYNC_INTERVAL = float(os.environ.get('ECOMMERCE_SYNC_INTERVAL', '1.0'))
+
+
+_OPEN = STORE_IO.labels('shelve', 'open')
+_READ = STORE_IO.labels('shelve', 'read')
+_WRITE = STORE_IO.labels('shelve', 'write')
+_SYNC = STORE_IO.labels('shelve', 'sync')
+_ENCODE = STORE_CODEC.labels('shelve', 'encode')
+_DECODE = STORE_CODEC.labels('shelve', 'decode')
+
+
+def record_key(table: str, key) -> str:
+    return f"{table}:{key}"
+
+
+class ShelfHandle:
+    """A shelve file that is opened once and kept open until close().
+
+    Every record lives under its own key (``product:1``, ``cart:alice``...)
+    so writing one record only encodes that record. Values are stored in
+    the compact binary form from ``records``.
+
+    Syncing rewrites the whole key index of a dbm.dumb file, so doing it
+    after every mutation made each write cost grow with the catalog.
+    Mutations only mark the handle dirty; a background thread syncs at most
+    every ``sync_interval`` seconds, and close() syncs what is left. Record
+    data reaches the file as it is written, and so do new keys. A crash
+    loses at most the last interval of rewrites that moved a record, which
+    then read back with their previous value.
+    """
+
+    def __init__(self, path: str = DB_PATH, sync_interval: float = SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._db = None
+        self._dirty = False
+        self._stopping = threading.Event()
+        self._syncer = None
+        self._lock = threading.RLock()
+        # shelve (dbm) files must not be written by two processes at once.
+        self._process_lock = ProcessLock(f"{path}.lock")
+
+    @property
+    def is_open(self) -> bool:
+        return self._db is not None
+
+    def open(self) -> shelve.Shelf:
+        with self._lock:
+            if self._db is None:
+                started = time.perf_counter()
+                self._process_lock.acquire()
+                self._db = shelve.open(self.path)
+                _OPEN.observe(time.perf_counter() - started)
+                if self.sync_interval > 0:
+                    self._stopping.clear()
+                    self._syncer = threading.Thread(target=self._sync_loop, name='store-shelve-syncer', daemon=True)
+                    self._syncer.start()
+            return self._db
+
+    @contextmanager
+    def session(self):
+        # Opens lazily so importing code that runs before the lifespan
+        # startup hook still works; afterwards this just reuses the handle.
+        with self._lock:
+            yield self.open()
+
+    # Reads and writes time the shelve access (dbm I/O plus pickling)
+    # separately from the record codec.
+
+    def get(self, table: str, key, default=None):
+        started = time.perf_counter()
+        with self.session() as db:
+            value = db.get(record_key(table, key))
+        read = time.perf_counter()
+        _READ.observe(read - started)
+        if value is None:
+            return default
+        record = records.load(table, value)
+        _DECODE.observe(time.perf_counter() - read)
+        return record
+
+    def get_many(self, table: str, keys) -> dict:
+        """key -> record for the ``keys`` that exist, read under one lock acquisition."""
+        started = time.perf_counter()
+        with self.session() as db:
+            stored = {key: db.get(record_key(table, key)) for key in keys}
+        read = time.perf_counter()
+        _READ.observe(read - started)
+        loaded = {key: records.load(table, value) for key, value in stored.items() if value is not None}
+        _DECODE.observe(time.perf_counter() - read)
+        return loaded
+
+    def put(self, table: str, key, value):
+        self.put_many(table, {key: value})
+
+    def put_many(self, table: str, values: dict):
+        started = time.perf_counter()
+        encoded = {record_key(table, key): records.dump(table, value) for key, value in values.items()}
+        write = time.perf_counter()
+        _ENCODE.observe(write - started)
+        with self.session() as db:
+            for key, value in encoded.items():
+                db[key] = value
+        _WRITE.observe(time.perf_counter() - write)
+
+    def delete(self, table: str, key) -> bool:
+        started = time.perf_counter()
+        with self.session() as db:
+            try:
+                del db[record_key(table, key)]
+            except KeyError:
+                return False
+            finally:
+                _WRITE.observe(time.perf_counter() - started)
+            return True
+
+    def contains(self, table: str, key) -> bool:
+        with self.session() as db:
+            return record_key(table, key) in db
+
+    def values(self, table: str) -> list:
+        prefix = record_key(table, '')
+        started = time.perf_counter()
+        with self.session() as db:
+            stored = [db[k] for k in list(db.keys()) if k.startswith(prefix)]
+        read = time.perf_counter()
+        _READ.observe(read - started)
+        loaded = [records.load(table, value) for value in stored]
+        _DECODE.observe(time.perf_counter() - read)
+        return loaded
+
+    def commit(self):
+        # Called after each mutation; the syncer thread picks it up.
+        if self.sync_interval > 0:
+            self._dirty = True
+        else:
+            self.sync()
+
+    def _sync_loop(self):
+        while not self._stopping.wait(self.sync_interval):
+            if self._dirty:
+                self.sync()
+
+    def sync(self):
+        with self._lock:
+            if self._db is not None:
+                self._dirty = False
+                started = time.perf_counter()
+                self._db.sync()
+                _SYNC.observe(time.perf_counter() - started)
 
-@contextmanager
-def get_db():
-    db = shelve.open(DB_PATH, writeback=True)
-    try:
-        yield db
-    finally:
-        db.close()
+    def close(self):
+        syncer, self._syncer = self._syncer, None
+        if syncer is not None:
+            self._stopping.set()
+            syncer.join()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+                self._process_lock.release()
@@ -0,0 +1,233 @@
+"""Response formats and compression negotiated from Accept / Accept-Encoding.
+
+Bodies are JSON by default, or MessagePack for clients that list
+``application/msgpack`` in ``Accept`` at least as high as JSON. MessagePack
+carries exactly the JSON data (datetimes as ISO strings), so clients decode
+either into the same values. Bodies of at least ``ECOMMERCE_COMPRESS_MIN_BYTES``
+(default 1024) are compressed with brotli or gzip, whichever the client
+prefers; brotli only when the ``brotli`` package is installed, as
+MessagePack needs ``msgpack``.
+
+CompressionMiddleware compresses any response on the way out, streamed ones
+included. The cached catalog routes instead keep each encoded variant next
+to the cached JSON (see ``cached_response``), so a popular listing is
+compressed once rather than on every request.
+"""
+import gzip
+import json
+import os
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .http_cache import conditional_response, dump_json, plain_value
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+COMPRESS_MIN_BYTES = int(os.environ.get("ECOMMERCE_COMPRESS_MIN_BYTES", "1024"))
+# Mid-range levels: most of the size reduction for a fraction of the CPU.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE = (JSON, MSGPACK, "application/x-ndjson", "text/")
+# Server preference when the client ranks several encodings equally.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _preferences(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-style header into {value: q}."""
+    preferences = {}
+    for part in (header or "").split(","):
+        value, *params = part.split(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        preferences[value] = q
+    return preferences
+
+
+def choose_media_type(accept: Optional[str]) -> str:
+    if msgpack is None or not accept:
+        return JSON
+    preferences = _preferences(accept)
+    binary = max(preferences.get(media, 0.0) for media in MSGPACK_TYPES)
+    text = preferences.get(JSON, preferences.get("application/*", preferences.get("*/*", 0.0)))
+    return MSGPACK if binary > 0 and binary >= text else JSON
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    preferences = _preferences(accept_encoding)
+    wildcard = preferences.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = preferences.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+def encode(content: Any, media_type: str) -> bytes:
+    if media_type == MSGPACK:
+        return msgpack.packb(content, default=plain_value)
+    return dump_json(content)
+
+
+def transcode(body: bytes, media_type: str) -> bytes:
+    """Turn a JSON body into ``media_type``."""
+    return body if media_type == JSON else msgpack.packb(json.loads(body))
+
+
+def negotiate(request: Request) -> Tuple[str, Optional[str]]:
+    return choose_media_type(request.headers.get("accept")), choose_encoding(request.headers.get("accept-encoding"))
+
+
+def variant_etag(etag: str, media_type: str, encoding: Optional[str]) -> str:
+    # Each representation gets its own strong ETag; etag_matches() compares
+    # only the part before the first "-".
+    suffix = ("-msgpack" if media_type == MSGPACK else "") + (f"-{encoding}" if encoding else "")
+    return f"{etag[:-1]}{suffix}\"" if suffix else etag
+
+
+def encoded_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """``content`` as JSON or MessagePack, as the client asked.
+
+    Compression is left to CompressionMiddleware.
+    """
+    media_type, _ = negotiate(request)
+    return Response(content=encode(content, media_type), media_type=media_type,
+                    headers={**(headers or {}), "Vary": "Accept"})
+
+
+def cached_response(request: Request, read_cache, key, cached, if_none_match: Optional[str]) -> Response:
+    """Serve a read cache entry in the negotiated format and encoding.
+
+    The transcoded and compressed bodies are kept on the entry, so each is
+    produced once per cached response.
+    """
+    media_type, encoding = negotiate(request)
+    if encoding and len(cached.body) < COMPRESS_MIN_BYTES:
+        encoding = None
+    variant = (media_type, encoding)
+    body = cached.body if variant == (JSON, None) else cached.variants.get(variant)
+    if body is None:
+        body = transcode(cached.body, media_type)
+        if encoding:
+            body = compress(body, encoding)
+        read_cache.put_variant(key, cached, variant, body)
+    headers = {**(cached.headers or {}), "Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return conditional_response(body, if_none_match, headers, variant_etag(cached.etag, media_type, encoding),
+                                media_type=media_type)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses the client accepts compressed.
+
+    Whole bodies are compressed when they reach ``minimum_size``; streamed
+    bodies are compressed chunk by chunk and flushed after each one, so the
+    client still receives them as they are produced. Responses that already
+    carry a Content-Encoding are passed through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = None
+        for name, value in scope['headers']:
+            if name == b'accept-encoding':
+                accept_encoding = value.decode('latin-1')
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_wrapper(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+            if start is not None:
+                first, start = start, None
+                headers = {name.lower(): value for name, value in first['headers']}
+                body = message.get('body', b'')
+                more = message.get('more_body', False)
+                media_type = headers.get(b'content-type', b'').decode('latin-1')
+                if (b'content-encoding' in headers or not media_type.startswith(COMPRESSIBLE)
+                        or (not more and len(body) < self.minimum_size)):
+                    await send(first)
+                    await send(message)
+                    return
+                raw = [(n, v) for n, v in first['headers'] if n.lower() not in (b'content-length', b'vary')]
+                vary = headers.get(b'vary')
+                raw.append((b'vary', vary + b', Accept-Encoding' if vary else b'Accept-Encoding'))
+                raw.append((b'content-encoding', encoding.encode()))
+                if not more:
+                    body = compress(body, encoding)
+                    raw.append((b'content-length', str(len(body)).encode()))
+                    await send({**first, 'headers': raw})
+                    await send({**message, 'body': body})
+                    return
+                compressor = _StreamCompressor(encoding)
+                await send({**first, 'headers': raw})
+            if compressor is None:
+                await send(message)
+                return
+            more = message.get('more_body', False)
+            chunk = compressor.feed(message.get('body', b''), last=not more)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': more})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def feed(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data) if data else b""
+            return out + (self._brotli.finish() if last else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import profiling
+from .metrics import STORE_OPERATION, STORE_QUEUE_WAIT
+
+# How many store calls may run at once. Every engine does blocking file or
+# database I/O, so calls run on this pool instead of the event loop. 0 runs
+# them inline on the loop, which is only useful for benchmarking.
+STORE_THREADS = int(os.environ.get("ECOMMERCE_STORE_THREADS", "16"))
+
+
+def _timed(fn, args, kwargs):
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        STORE_OPERATION.labels(fn.__name__).observe(time.perf_counter() - started)
+
+
+class StoreExecutor:
+    """Bounded thread pool that runs blocking store calls for async routes.
+
+    Every call is timed per operation (the store method's name), and the
+    time it spent waiting for a free thread is recorded separately.
+    """
+
+    def __init__(self, max_workers: int = STORE_THREADS):
+        self.max_workers = max_workers
+        self._pool = None
+
+    def start(self):
+        if self._pool is None and self.max_workers > 0:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="store")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    async def run(self, fn, *args, **kwargs):
+        if self.max_workers <= 0:
+            return _timed(fn, args, kwargs)
+        if self._pool is None:
+            self.start()
+        submitted = time.perf_counter()
+        # Context variables do not follow run_in_executor, so hand the
+        # request's profile (if any) to the store thread explicitly.
+        profile = profiling.current() if profiling.ENABLED else None
+
+        def call():
+            STORE_QUEUE_WAIT.observe(time.perf_counter() - submitted)
+            if profile is None:
+                return _timed(fn, args, kwargs)
+            profile.track()
+            try:
+                return _timed(fn, args, kwargs)
+            finally:
+                profile.untrack()
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, call)
@@ -0,0 +1,66 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+def plain_value(value: Any) -> Any:
+    """Fallback for serializers: models become their field dicts, datetimes ISO strings."""
+    if isinstance(value, BaseModel):
+        # Field values live in __dict__ with pydantic 1 and 2 alike.
+        return value.__dict__
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+
+def dump_json(content: Any) -> bytes:
+    # Same output as FastAPI's JSONResponse. orjson, when installed, walks
+    # the models itself instead of first copying them into plain dicts.
+    if orjson is not None:
+        return orjson.dumps(content, default=plain_value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _base_tag(tag: str) -> str:
+    # Encoded variants append "-msgpack" / "-gzip" / "-br" inside the quotes.
+    return tag.strip().lstrip("W/").strip('"').split("-", 1)[0]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if the client holds ``etag``, or another encoding of the same body."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or _base_tag(etag) in {_base_tag(tag) for tag in tags}
+
+
+def conditional_response(body: bytes, if_none_match: Optional[str] = None,
+                         headers: Optional[Dict[str, str]] = None, etag: Optional[str] = None,
+                         media_type: str = "application/json") -> Response:
+    """JSON response carrying an ETag, or an empty 304 if the client has it.
+
+    Clients are told to revalidate (``no-cache``) rather than reuse the
+    body blindly, so a product edit is visible on the next request.
+    """
+    etag = etag or make_etag(body)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
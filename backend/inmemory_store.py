@@ -0,0 +1,282 @@
+import os
+import pickle
+import threading
+import time
+from typing import Dict
+from . import records
+from .locks import ProcessLock
+from .memory_store import MemoryStore
+from .metrics import STORE_CODEC, STORE_IO
+
+MEMORY_PATH = 'ecommerce_mem'
+# Pending writes are flushed to the journal every FLUSH_INTERVAL seconds, or
+# as soon as FLUSH_BATCH of them have queued up, whichever comes first.
+FLUSH_INTERVAL = float(os.environ.get('ECOMMERCE_FLUSH_INTERVAL', '0.5'))
+FLUSH_BATCH = int(os.environ.get('ECOMMERCE_FLUSH_BATCH', '500'))
+# Once the journal grows past this many bytes it is folded into a new snapshot.
+COMPACT_BYTES = int(os.environ.get('ECOMMERCE_COMPACT_BYTES', str(64 * 1024 * 1024)))
+
+_OPEN = STORE_IO.labels('memory', 'open')
+_WRITE = STORE_IO.labels('memory', 'write')
+_SYNC = STORE_IO.labels('memory', 'sync')
+_SNAPSHOT = STORE_IO.labels('memory', 'snapshot')
+_ENCODE = STORE_CODEC.labels('memory', 'encode')
+
+
+class JournalHandle:
+    """Record handle that keeps every table in memory.
+
+    Reads are plain dict lookups returning the records kept in memory.
+    Each mutation is encoded (see ``records``) into a pending buffer that a
+    background thread appends to ``<path>.journal`` in batches. On open the
+    last ``<path>.snapshot`` is loaded and the journal replayed over it;
+    close() writes a fresh snapshot and empties the journal.
+
+    Every snapshot gets the next epoch number and the journal starts with
+    the epoch of the snapshot it continues. A journal from an older epoch
+    is already part of the snapshot and is discarded rather than replayed,
+    so a crash between replacing the snapshot and emptying the journal
+    cannot bring deleted records back or undo later writes.
+    """
+
+    def __init__(self, path: str = MEMORY_PATH, flush_interval: float = FLUSH_INTERVAL,
+                 flush_batch: int = FLUSH_BATCH, compact_bytes: int = COMPACT_BYTES):
+        self.path = path
+        self.snapshot_path = f"{path}.snapshot"
+        self.journal_path = f"{path}.journal"
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.compact_bytes = compact_bytes
+        self._tables = None
+        # Set by close(); only an explicit open() clears it.
+        self._closed = False
+        self._epoch = 0
+        self._pending = []
+        self._journal = None
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._flusher = None
+        # Each process would replay and then overwrite the other's journal.
+        self._process_lock = ProcessLock(f"{path}.lock")
+
+    @property
+    def is_open(self) -> bool:
+        return self._tables is not None
+
+    def open(self):
+        with self._io_lock, self._lock:
+            if self._tables is not None:
+                return
+            self._closed = False
+            started = time.perf_counter()
+            self._process_lock.acquire()
+            self._tables = self._load_snapshot()
+            self._replay_journal()
+            _OPEN.observe(time.perf_counter() - started)
+            self._journal = open(self.journal_path, 'ab')
+            if self._journal.tell() == 0:
+                self._write_epoch()
+            self._stopping = False
+            self._flusher = threading.Thread(target=self._flush_loop, name='store-journal-flusher', daemon=True)
+            self._flusher.start()
+
+    def _load_snapshot(self) -> Dict[str, dict]:
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                stored = pickle.load(f)
+        except FileNotFoundError:
+            self._epoch = 0
+            return {}
+        # Snapshots from before epochs are a bare dict of tables.
+        self._epoch, stored = stored[1:] if isinstance(stored, tuple) else (0, stored)
+        return {
+            table: {key: records.load(table, value) for key, value in rows.items()}
+            for table, rows in stored.items()
+        }
+
+    def _replay_journal(self):
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            good = 0
+            # Journals from before epochs have no header and follow epoch 0.
+            epoch = 0
+            while True:
+                try:
+                    op, table, key, value = pickle.load(f)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+                    # A torn write at the tail from a crash; drop it.
+                    break
+                if op == 'epoch':
+                    epoch = key
+                elif epoch != self._epoch:
+                    # Written before the snapshot we loaded was taken.
+                    good = 0
+                    break
+                else:
+                    self._apply(op, table, key, value)
+                good = f.tell()
+        if good != os.path.getsize(self.journal_path):
+            os.truncate(self.journal_path, good)
+
+    def _apply(self, op: str, table: str, key, value):
+        if op == 'put':
+            self._tables.setdefault(table, {})[key] = records.load(table, value)
+        elif op == 'put_many':
+            self._tables.setdefault(table, {}).update(
+                (k, records.load(table, v)) for k, v in value.items()
+            )
+        else:
+            self._tables.get(table, {}).pop(key, None)
+
+    def _table(self, table: str) -> dict:
+        if self._tables is None:
+            # Opening lazily is for use before startup. After close() nothing
+            # would flush or compact a reopened journal, so refuse instead.
+            if self._closed:
+                raise RuntimeError(f"Store at {self.path} is closed")
+            self.open()
+        return self._tables.get(table, {})
+
+    def get(self, table: str, key, default=None):
+        return self._table(table).get(key, default)
+
+    def get_many(self, table: str, keys) -> dict:
+        data = self._table(table)
+        return {key: data[key] for key in keys if key in data}
+
+    def contains(self, table: str, key) -> bool:
+        return key in self._table(table)
+
+    def values(self, table: str) -> list:
+        return list(self._table(table).values())
+
+    def put(self, table: str, key, value):
+        self._table(table)
+        started = time.perf_counter()
+        entry = pickle.dumps(('put', table, key, records.dump(table, value)), pickle.HIGHEST_PROTOCOL)
+        _ENCODE.observe(time.perf_counter() - started)
+        with self._lock:
+            self._tables.setdefault(table, {})[key] = value
+            self._pending.append(entry)
+
+    def put_many(self, table: str, values: dict):
+        # One journal entry for the whole batch, so replay applies all of it
+        # or (after a torn write) none of it.
+        self._table(table)
+        started = time.perf_counter()
+        encoded = {key: records.dump(table, value) for key, value in values.items()}
+        entry = pickle.dumps(('put_many', table, None, encoded), pickle.HIGHEST_PROTOCOL)
+        _ENCODE.observe(time.perf_counter() - started)
+        with self._lock:
+            self._tables.setdefault(table, {}).update(values)
+            self._pending.append(entry)
+
+    def delete(self, table: str, key) -> bool:
+        self._table(table)
+        with self._lock:
+            if key not in self._tables.get(table, {}):
+                return False
+            del self._tables[table][key]
+            self._pending.append(pickle.dumps(('del', table, key, None), pickle.HIGHEST_PROTOCOL))
+            return True
+
+    def commit(self):
+        # Write-behind: only nudge the flusher once a full batch is waiting.
+        if len(self._pending) >= self.flush_batch:
+            self._wakeup.set()
+
+    def _flush_loop(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush_pending()
+
+    def _flush_pending(self):
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch or self._journal is None:
+                return
+            started = time.perf_counter()
+            self._journal.write(b''.join(batch))
+            self._journal.flush()
+            written = time.perf_counter()
+            os.fsync(self._journal.fileno())
+            _WRITE.observe(written - started)
+            _SYNC.observe(time.perf_counter() - written)
+            if self._journal.tell() >= self.compact_bytes:
+                self._compact()
+
+    def _write_epoch(self):
+        self._journal.write(pickle.dumps(('epoch', None, self._epoch, None), pickle.HIGHEST_PROTOCOL))
+        self._journal.flush()
+
+    def _compact(self):
+        # Caller holds _io_lock. Writers are paused while the snapshot is
+        # pickled so it matches the journal position we truncate to.
+        started = time.perf_counter()
+        with self._lock:
+            epoch = self._epoch + 1
+            data = pickle.dumps(('snapshot', epoch, {
+                table: {key: records.dump(table, value) for key, value in rows.items()}
+                for table, rows in self._tables.items()
+            }), pickle.HIGHEST_PROTOCOL)
+            self._pending = []
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # From here the journal on disk is stale until it is emptied and
+        # stamped with the new epoch.
+        self._epoch = epoch
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        self._write_epoch()
+        _SNAPSHOT.observe(time.perf_counter() - started)
+
+    def sync(self):
+        if self._tables is not None:
+            self._flush_pending()
+
+    def close(self):
+        if self._tables is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self._io_lock:
+            # The snapshot already covers anything still pending.
+            self._compact()
+            self._journal.close()
+            self._journal = None
+        with self._lock:
+            self._tables = None
+            self._closed = True
+        self._process_lock.release()
+
+
+class InMemoryStore(MemoryStore):
+    """Store that serves every read from native dicts.
+
+    The full dataset is loaded at startup; writes are journaled to disk
+    asynchronously by JournalHandle.
+    """
+
+    def __init__(self, path: str = MEMORY_PATH):
+        super().__init__(handle=JournalHandle(path))
+
+    def open(self):
+        self._handle.open()
+        self._init_counters()
+        self._build_indexes()
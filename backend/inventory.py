@@ -0,0 +1,247 @@
+"""Stock counters and cart holds for the shelve and memory engines.
+
+Adding to a cart takes the units out of the product's available count and
+records a hold for the user; checkout then only has to deduct on-hand stock
+for units that are already set aside. A hold not checked out within the
+store's ``hold_ttl`` is handed back by ``release_expired_holds()``.
+
+Each product's available units are split over ``ECOMMERCE_STOCK_SHARDS``
+separately locked shards (default 8). A reservation starts at the shard its
+user hashes to and only visits the others when that one runs dry, so many
+shoppers reserving the same hot product mostly take different locks, and
+no reservation ever waits on storage.
+
+Holds live in process memory only. After a restart the cart lines they
+covered are simply checked against available stock again at checkout.
+"""
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .base_store import InsufficientStock, check_quantities
+
+STOCK_SHARDS = int(os.environ.get('ECOMMERCE_STOCK_SHARDS', '8'))
+
+
+class ShardedCounter:
+    """A non-negative count split over independently locked shards."""
+
+    def __init__(self, value: int = 0, shards: int = STOCK_SHARDS):
+        self._locks = [threading.Lock() for _ in range(max(1, shards))]
+        self._units = [0] * len(self._locks)
+        self._spread(value)
+
+    def _spread(self, value: int):
+        base, extra = divmod(value, len(self._units))
+        for i in range(len(self._units)):
+            self._units[i] = base + (1 if i < extra else 0)
+
+    @property
+    def value(self) -> int:
+        # Not a snapshot: shards may change while they are being added up.
+        return sum(self._units)
+
+    @contextmanager
+    def _locked(self):
+        # Always acquired in index order, so two callers cannot deadlock.
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def take(self, count: int, hint: int = 0) -> bool:
+        """Take ``count`` units, starting at shard ``hint``; all or nothing."""
+        if self._take_shards(count, hint):
+            return True
+        # Shard by shard, two buyers that each hold part of what is left
+        # can both come up short and give back. Settle it with the whole
+        # count locked, so the units are only reported missing when they are.
+        with self._locked():
+            if sum(self._units) < count:
+                return False
+            for i in range(len(self._units)):
+                got = min(self._units[i], count)
+                self._units[i] -= got
+                count -= got
+            return True
+
+    def _take_shards(self, count: int, hint: int) -> bool:
+        # Locks one shard at a time; gives back what it got if that falls short.
+        taken = []
+        size = len(self._units)
+        for step in range(size):
+            i = (hint + step) % size
+            with self._locks[i]:
+                got = min(self._units[i], count)
+                self._units[i] -= got
+            if got:
+                taken.append((i, got))
+                count -= got
+            if not count:
+                return True
+        for i, got in taken:
+            with self._locks[i]:
+                self._units[i] += got
+        return False
+
+    def give(self, count: int, hint: int = 0):
+        i = hint % len(self._units)
+        with self._locks[i]:
+            self._units[i] += count
+
+    def adjust(self, delta: int) -> bool:
+        """Add ``delta`` (may be negative) to the total and even out the shards.
+
+        Returns False, changing nothing, if the total would drop below zero.
+        """
+        with self._locked():
+            total = sum(self._units) + delta
+            if total < 0:
+                return False
+            self._spread(total)
+            return True
+
+
+def _shard_hint(user_id: str) -> int:
+    return zlib.crc32(user_id.encode())
+
+
+class Inventory:
+    """Available stock per tracked product and the holds carts keep on it.
+
+    Calls for one user must not run concurrently; the store serialises them
+    with its per-user cart locks. Dropping a product's holds and sweeping
+    expired ones reach across users, so every change to the hold dicts
+    (and every walk over them) also takes ``_holds_lock``. Products without
+    a counter are not tracked and are always available.
+    """
+
+    def __init__(self, hold_ttl: float, shards: int = STOCK_SHARDS, clock=time.monotonic):
+        self.hold_ttl = hold_ttl
+        self.shards = shards
+        self._clock = clock
+        self._counters: Dict[int, ShardedCounter] = {}
+        # user -> {product_id: [units held, expiry on the clock]}
+        self._holds: Dict[str, Dict[int, list]] = {}
+        self._holds_lock = threading.Lock()
+
+    def load(self, levels: Iterable[Tuple[int, int]]):
+        """Start tracking from (product_id, on_hand) pairs; nothing is held yet."""
+        self._counters = {pid: ShardedCounter(on_hand, self.shards) for pid, on_hand in levels}
+        with self._holds_lock:
+            self._holds = {}
+
+    def track(self, product_id: int, on_hand: int):
+        self._drop_holds(product_id)
+        self._counters[product_id] = ShardedCounter(on_hand, self.shards)
+
+    def untrack(self, product_id: int):
+        self._counters.pop(product_id, None)
+        self._drop_holds(product_id)
+
+    def _drop_holds(self, product_id: int):
+        # Holds on a product that stops (or starts afresh) being tracked
+        # no longer stand for units taken from its counter.
+        with self._holds_lock:
+            for holds in self._holds.values():
+                holds.pop(product_id, None)
+
+    def available(self, product_id: int) -> Optional[int]:
+        counter = self._counters.get(product_id)
+        return counter.value if counter is not None else None
+
+    def adjust(self, product_id: int, delta: int):
+        """Change on-hand stock of a tracked product by ``delta``.
+
+        Raises ValueError if that would leave less than what carts hold.
+        """
+        counter = self._counters.get(product_id)
+        if counter is not None and not counter.adjust(delta):
+            raise ValueError("Stock cannot be set below the units held in carts")
+
+    def _take(self, user_id: str, wanted: Dict[int, int]) -> List[Tuple[int, int]]:
+        check_quantities(wanted.values())
+        hint = _shard_hint(user_id)
+        taken = []
+        short = []
+        for pid, quantity in wanted.items():
+            counter = self._counters.get(pid)
+            if counter is None:
+                continue
+            if counter.take(quantity, hint):
+                taken.append((pid, quantity))
+            else:
+                short.append(pid)
+        if short:
+            for pid, quantity in taken:
+                self._counters[pid].give(quantity, hint)
+            raise InsufficientStock(short)
+        return taken
+
+    def reserve(self, user_id: str, lines: Dict[int, int]):
+        """Hold ``lines`` (product_id -> units) for the user; all or nothing.
+
+        Raises InsufficientStock if any tracked product lacks the units.
+        """
+        taken = self._take(user_id, lines)
+        if not taken:
+            return
+        expires = self._clock() + self.hold_ttl
+        with self._holds_lock:
+            holds = self._holds.setdefault(user_id, {})
+            for pid, quantity in taken:
+                hold = holds.setdefault(pid, [0, expires])
+                hold[0] += quantity
+                hold[1] = expires
+
+    def cover(self, user_id: str, lines: Dict[int, int]):
+        """Make sure every unit in ``lines`` is held, taking what is missing.
+
+        Used at checkout for lines whose hold expired or predates a restart.
+        Raises InsufficientStock, taking nothing, if that is not possible.
+        """
+        with self._holds_lock:
+            holds = self._holds.get(user_id, {})
+            missing = {pid: quantity - holds[pid][0] if pid in holds else quantity
+                       for pid, quantity in lines.items()}
+        self.reserve(user_id, {pid: quantity for pid, quantity in missing.items() if quantity > 0})
+
+    def tracked(self, lines: Dict[int, int]) -> Dict[int, int]:
+        return {pid: quantity for pid, quantity in lines.items() if pid in self._counters}
+
+    def consume(self, user_id: str):
+        """Forget the user's holds once their units have left stock."""
+        with self._holds_lock:
+            self._holds.pop(user_id, None)
+
+    def release(self, user_id: str, product_id: int):
+        with self._holds_lock:
+            holds = self._holds.get(user_id)
+            hold = holds.pop(product_id, None) if holds else None
+            if hold is None:
+                return
+            if not holds:
+                self._holds.pop(user_id, None)
+        counter = self._counters.get(product_id)
+        if counter is not None:
+            counter.give(hold[0], _shard_hint(user_id))
+
+    def users_with_expired_holds(self) -> List[str]:
+        now = self._clock()
+        with self._holds_lock:
+            return [user for user, holds in self._holds.items()
+                    if any(expires <= now for _, expires in holds.values())]
+
+    def release_expired(self, user_id: str) -> int:
+        now = self._clock()
+        with self._holds_lock:
+            expired = [pid for pid, (_, expires) in self._holds.get(user_id, {}).items() if expires <= now]
+        for pid in expired:
+            self.release(user_id, pid)
+        return len(expired)
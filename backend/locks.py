@@ -0,0 +1,61 @@
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+STRIPES = 256
+
+
+class KeyedLocks:
+    """Striped locks: one of a fixed set of locks is picked by hashing the key.
+
+    Operations on the same key always serialise, while operations on
+    different keys almost always get different locks, so unrelated users
+    do not queue behind each other. Memory stays bounded however many keys
+    are seen.
+    """
+
+    def __init__(self, stripes: int = STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, key) -> threading.Lock:
+        # crc32 rather than hash() so the mapping is stable for str keys
+        # regardless of PYTHONHASHSEED.
+        return self._locks[zlib.crc32(str(key).encode()) % len(self._locks)]
+
+
+class ProcessLock:
+    """An exclusive advisory lock on ``path`` held by one process at a time.
+
+    Engines that keep their state in process memory take it while their
+    files are open, so a second process (say, another uvicorn worker)
+    fails at startup instead of silently overwriting the first one's
+    writes. Where ``fcntl`` is not available nothing is locked.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        if self._file is not None or fcntl is None:
+            return
+        f = open(self.path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            raise RuntimeError(
+                f"{self.path} is held by another process; use the sqlite engine "
+                f"(ECOMMERCE_STORE=sqlite) to run several processes on one store"
+            ) from None
+        self._file = f
+
+    def release(self):
+        if self._file is not None:
+            # Closing the file drops the lock.
+            self._file.close()
+            self._file = None
@@ -1,60 +1,285 @@
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
-from .models import Product, ProductCreate, ProductUpdate, Cart, Order, UserSignup, UserLogin, SessionToken
-from .memory_store import store
+from starlette.datastructures import State
+from typing import List, Literal, Optional
+from .models import (
+    Product, ProductCreate, ProductUpdate, Cart, CartItemCreate, CartQuote, Order, UserSignup, UserLogin, SessionToken,
+    StockLevel, StockUpdate, ChangeFeed
+)
+from .base_store import InsufficientStock
+from .executor import StoreExecutor
+from .encoding import CompressionMiddleware, cached_response, encoded_response
+from .http_cache import dump_json
+from . import metrics, ndjson, profiling
+from .read_cache import LISTING, PRODUCT, SEARCH, ReadCache
+from .session_cache import MISS, SessionCache
+from .stores import create_store, engine_class
+
+# ECOMMERCE_STORE picks the storage engine: "shelve" (default, single
+# process), "sqlite" (WAL mode, safe to share between worker processes) or
+# "memory" (everything in dicts, journaled to disk in the background).
+STORE_ENGINE = os.environ.get("ECOMMERCE_STORE", "shelve")
+STORE_PATH = os.environ.get("ECOMMERCE_DB_PATH")
+# Number of uvicorn worker processes; every worker imports this module and
+# builds its own app, with its own store, caches and thread pool.
+WORKERS = int(os.environ.get("ECOMMERCE_WORKERS", "1"))
+# On a shared engine, how often (in seconds) each worker asks the store
+# whether other workers changed products, and so how long it may serve
+# a cached response after such a write.
+CHANGE_CHECK_INTERVAL = float(os.environ.get("ECOMMERCE_CHANGE_CHECK_INTERVAL", "0.1"))
+# How often expired sessions are deleted from the store and expired cart
+# holds returned to stock.
+SESSION_SWEEP_INTERVAL = float(os.environ.get("ECOMMERCE_SESSION_SWEEP_INTERVAL", "300"))
+
+# Largest number of items a single batch request may carry; the SDK splits
+# bigger inputs into chunks of at most this size.
+MAX_BATCH = int(os.environ.get("ECOMMERCE_MAX_BATCH", "1000"))
+# Products per store call while streaming an export, and the longest line
+# an import accepts.
+EXPORT_PAGE = int(os.environ.get("ECOMMERCE_EXPORT_PAGE", "1000"))
+MAX_IMPORT_LINE = 1024 * 1024
+# A long-polling GET /changes asks the store for new changes this often (in
+# seconds) and waits at most MAX_CHANGES_WAIT seconds in total.
+CHANGES_POLL_INTERVAL = float(os.environ.get("ECOMMERCE_CHANGES_POLL_INTERVAL", "0.2"))
+MAX_CHANGES_WAIT = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+def app_state(request: Request) -> State:
+    """The app's store, thread pool and caches (see create_app)."""
+    return request.app.state
+
+
+async def sweep_sessions(state: State):
+    while True:
+        try:
+            await state.executor.run(state.store.purge_expired_sessions)
+        except Exception:
+            logger.exception("Failed to purge expired sessions")
+        try:
+            await state.executor.run(state.store.release_expired_holds)
+        except Exception:
+            logger.exception("Failed to release expired cart holds")
+        state.session_cache.sweep()
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+
+
+async def follow_store_changes(state: State):
+    # Product writes made by other workers sharing the store never reach
+    # this worker's read cache, so it is emptied whenever the store's latest
+    # product change moves. Asked at most every CHANGE_CHECK_INTERVAL, so
+    # cache hits between checks skip the store entirely.
+    if not state.store.shared:
+        return
+    now = time.monotonic()
+    if now < state.next_change_check:
+        return
+    state.next_change_check = now + CHANGE_CHECK_INTERVAL
+    state.read_cache.follow(await state.executor.run(state.store.last_product_change))
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once in every worker process. Building the store opens its
+    # backing files (and for shelve and memory loads the indexes); it stays
+    # open until shutdown, which flushes pending writes. SQLite connections
+    # are made per thread, so each worker's pool threads connect on first use.
+    #
+    # The lifespan may be entered again while running, e.g. by an
+    # in-process AsyncEcommerceSDK inside a TestClient. Entries are counted:
+    # the first opens the store and the last one out closes it, whichever
+    # order they leave in. Each entry that opened runs the sweeper on its
+    # own event loop and stops it when it leaves.
+    state = app.state
+    sweeper = None
+    if state.lifespans == 0:
+        state.store = create_store(STORE_ENGINE, STORE_PATH)
+        state.read_cache.clear()
+        state.executor.start()
+        sweeper = asyncio.create_task(sweep_sessions(state))
+    state.lifespans += 1
+    try:
+        yield
+    finally:
+        if sweeper is not None:
+            sweeper.cancel()
+        state.lifespans -= 1
+        if state.lifespans == 0:
+            state.executor.shutdown()
+            state.store.close()
+            state.store = None
 
-app = FastAPI(title="E-commerce API", version="1.0.0")
-@app.post("/signup")
-async def signup(user: UserSignup):
-    ok = store.signup(user.username, user.password, user.role)
+
+router = APIRouter()
+
+@router.post("/signup")
+async def signup(user: UserSignup, state: State = Depends(app_state)):
+    ok = await state.executor.run(state.store.signup, user.username, user.password, user.role)
     if not ok:
         raise HTTPException(status_code=400, detail="Username already exists")
     return {"message": "Signup successful"}
 
-@app.post("/login", response_model=SessionToken)
-async def login(user: UserLogin):
-    session = store.login(user.username, user.password)
+@router.post("/login", response_model=SessionToken)
+async def login(user: UserLogin, state: State = Depends(app_state)):
+    session = await state.executor.run(state.store.login, user.username, user.password)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    state.session_cache.put(session.token, session.username, session.expires_at)
     return session
 
-@app.get("/products/search", response_model=List[Product])
-async def search_products(query: str):
-    return store.search_products(query)
+@router.get("/products/search", response_model=List[Product])
+async def search_products(
+    request: Request,
+    query: str,
+    if_none_match: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    key = (SEARCH, query)
+    await follow_store_changes(state)
+    cached = state.read_cache.get(key)
+    if cached is None:
+        generation = state.read_cache.generation
+        products = await state.executor.run(state.store.search_products, query)
+        cached = state.read_cache.put(key, dump_json(products), generation)
+    return cached_response(request, state.read_cache, key, cached, if_none_match)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@router.get("/products/export")
+async def export_products(state: State = Depends(app_state)):
+    # One page of products is in memory at a time, whatever the catalog
+    # size; the client sees one JSON product per line, in id order.
+    async def pages():
+        cursor = None
+        while True:
+            products, cursor = await state.executor.run(
+                state.store.list_products, limit=EXPORT_PAGE, cursor=cursor
+            )
+            if products:
+                yield ndjson.encode_lines(products)
+            if not cursor:
+                return
+
+    return StreamingResponse(pages(), media_type=ndjson.MEDIA_TYPE)
+
+@router.post("/products/import")
+async def import_products(request: Request, state: State = Depends(app_state)):
+    # Reads one ProductCreate per line and commits every MAX_BATCH lines.
+    # Batches committed before a bad line stay; the error says how many.
+    imported = 0
+    batch = []
+
+    async def commit():
+        nonlocal imported, batch
+        await state.executor.run(state.store.add_products, batch)
+        state.read_cache.products_added()
+        imported += len(batch)
+        batch = []
 
-@app.post("/products", response_model=Product)
-async def add_product(product: ProductCreate):
-    return store.add_product(
+    try:
+        async for number, line in ndjson.read_lines(request.stream(), MAX_IMPORT_LINE):
+            try:
+                product = ProductCreate(**json.loads(line))
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"Line {number}: {e}") from None
+            batch.append(product)
+            if len(batch) == MAX_BATCH:
+                await commit()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "imported": imported})
+    if batch:
+        await commit()
+    return {"imported": imported}
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@router.post("/products", response_model=Product)
+async def add_product(product: ProductCreate, state: State = Depends(app_state)):
+    created = await state.executor.run(
+        state.store.add_product,
         name=product.name,
         price=product.price,
-        description=product.description
+        description=product.description,
+        stock=product.stock
     )
+    state.read_cache.products_added()
+    return created
 
-@app.get("/products", response_model=List[Product])
-async def list_products():
-    return store.get_all_products()
+@router.post("/products/batch", response_model=List[Product])
+async def add_products(products: List[ProductCreate], state: State = Depends(app_state)):
+    if len(products) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH} products per batch")
+    created = await state.executor.run(state.store.add_products, products)
+    state.read_cache.products_added()
+    return created
 
-@app.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: int):
-    product = store.get_product(product_id)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+@router.get("/products", response_model=List[Product])
+async def list_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "price", "name"] = "id",
+    desc: bool = False,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    if_none_match: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    # Without a limit the whole (filtered) catalog is returned, as before.
+    # When more products follow, the cursor for the next page is sent in
+    # the X-Next-Cursor header.
+    key = (LISTING, limit, cursor, sort, desc, min_price, max_price)
+    await follow_store_changes(state)
+    cached = state.read_cache.get(key)
+    if cached is None:
+        generation = state.read_cache.generation
+        try:
+            products, next_cursor = await state.executor.run(
+                state.store.list_products,
+                limit=limit,
+                cursor=cursor,
+                sort=sort,
+                descending=desc,
+                min_price=min_price,
+                max_price=max_price
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        cached = state.read_cache.put(key, dump_json(products), generation, headers)
+    return cached_response(request, state.read_cache, key, cached, if_none_match)
 
-@app.put("/products/{product_id}", response_model=Product)
-async def update_product(product_id: int, product_update: ProductUpdate):
-    product = store.update_product(
+@router.get("/products/{product_id}", response_model=Product)
+async def get_product(
+    request: Request,
+    product_id: int,
+    if_none_match: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    key = (PRODUCT, product_id)
+    await follow_store_changes(state)
+    cached = state.read_cache.get(key)
+    if cached is None:
+        generation = state.read_cache.generation
+        product = await state.executor.run(state.store.get_product, product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        cached = state.read_cache.put(key, dump_json(product), generation)
+    return cached_response(request, state.read_cache, key, cached, if_none_match)
+
+@router.put("/products/{product_id}", response_model=Product)
+async def update_product(product_id: int, product_update: ProductUpdate, state: State = Depends(app_state)):
+    product = await state.executor.run(
+        state.store.update_product,
         product_id,
         name=product_update.name,
         price=product_update.price,
@@ -62,57 +287,241 @@ async def update_product(product_id: int, product_update: ProductUpdate):
     )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    state.read_cache.products_changed([product_id])
     return product
 
-@app.delete("/products/{product_id}")
-async def delete_product(product_id: int):
-    if not store.delete_product(product_id):
+@router.delete("/products/{product_id}")
+async def delete_product(product_id: int, state: State = Depends(app_state)):
+    if not await state.executor.run(state.store.delete_product, product_id):
         raise HTTPException(status_code=404, detail="Product not found")
+    state.read_cache.products_changed([product_id])
     return {"message": "Product deleted successfully"}
 
-@app.post("/cart")
-async def add_to_cart(product_id: int, quantity: int = 1, token: Optional[str] = Header(None)):
-    user = store.get_user_by_token(token) if token else None
-    user_id = user.username if user else "default_user"
-    if not store.add_to_cart(user_id, product_id, quantity):
+# Stock is served apart from the product so that sales do not invalidate
+# cached product and catalog responses.
+@router.get("/products/{product_id}/stock", response_model=StockLevel)
+async def get_stock(product_id: int, state: State = Depends(app_state)):
+    level = await state.executor.run(state.store.get_stock, product_id)
+    if not level:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return level
+
+@router.put("/products/{product_id}/stock", response_model=StockLevel)
+async def set_stock(product_id: int, update: StockUpdate, state: State = Depends(app_state)):
+    try:
+        level = await state.executor.run(state.store.set_stock, product_id, update.stock)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not level:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return level
+
+def out_of_stock(e: InsufficientStock) -> HTTPException:
+    return HTTPException(status_code=409, detail={"message": "Insufficient stock", "product_ids": e.product_ids})
+
+async def session_username(state: State, token: Optional[str]) -> Optional[str]:
+    """The username of a valid session token; None if missing, unknown or expired."""
+    if not token:
+        return None
+    username = state.session_cache.get(token)
+    if username is MISS:
+        session = await state.executor.run(state.store.get_session, token)
+        if session:
+            username = session.username
+            state.session_cache.put(token, username, session.expires_at)
+        else:
+            username = None
+            state.session_cache.put(token, None)
+    return username
+
+async def resolve_user_id(state: State, token: Optional[str]) -> str:
+    # Carts work without logging in; anonymous callers share one cart.
+    return await session_username(state, token) or "default_user"
+
+async def require_user_id(state: State, token: Optional[str]) -> str:
+    username = await session_username(state, token)
+    if username is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return username
+
+@router.post("/cart")
+async def add_to_cart(
+    product_id: int,
+    quantity: int = Query(1, ge=1),
+    token: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    user_id = await resolve_user_id(state, token)
+    try:
+        added = await state.executor.run(state.store.add_to_cart, user_id, product_id, quantity)
+    except InsufficientStock as e:
+        raise out_of_stock(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not added:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"message": "Product added to cart"}
 
-@app.get("/cart", response_model=Cart)
-async def view_cart(token: Optional[str] = Header(None)):
-    user = store.get_user_by_token(token) if token else None
-    user_id = user.username if user else "default_user"
-    return store.get_cart(user_id)
-
-@app.delete("/cart/{product_id}")
-async def remove_from_cart(product_id: int, token: Optional[str] = Header(None)):
-    user = store.get_user_by_token(token) if token else None
-    user_id = user.username if user else "default_user"
-    store.remove_from_cart(user_id, product_id)
+@router.post("/cart/batch")
+async def add_to_cart_many(
+    items: List[CartItemCreate],
+    token: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    if len(items) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH} items per batch")
+    user_id = await resolve_user_id(state, token)
+    try:
+        missing = await state.executor.run(state.store.add_to_cart_many, user_id, items)
+    except InsufficientStock as e:
+        raise out_of_stock(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Products not found", "product_ids": missing})
+    return {"message": f"{len(items)} items added to cart"}
+
+@router.get("/cart", response_model=Cart)
+async def view_cart(request: Request, token: Optional[str] = Header(None), state: State = Depends(app_state)):
+    user_id = await resolve_user_id(state, token)
+    return encoded_response(request, await state.executor.run(state.store.get_cart, user_id))
+
+@router.get("/cart/quote", response_model=CartQuote)
+async def quote_cart(request: Request, token: Optional[str] = Header(None), state: State = Depends(app_state)):
+    # What checkout would charge right now, including lines it would leave
+    # out or charge at a new price.
+    user_id = await resolve_user_id(state, token)
+    return encoded_response(request, await state.executor.run(state.store.quote_cart, user_id))
+
+@router.delete("/cart/{product_id}")
+async def remove_from_cart(
+    product_id: int,
+    token: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    user_id = await resolve_user_id(state, token)
+    await state.executor.run(state.store.remove_from_cart, user_id, product_id)
     return {"message": "Product removed from cart"}
 
-@app.post("/checkout", response_model=Order)
-async def checkout(token: Optional[str] = Header(None)):
-    user = store.get_user_by_token(token) if token else None
-    user_id = user.username if user else "default_user"
-    order = store.checkout(user_id)
+@router.post("/checkout", response_model=Order)
+async def checkout(token: Optional[str] = Header(None), state: State = Depends(app_state)):
+    user_id = await resolve_user_id(state, token)
+    try:
+        order = await state.executor.run(state.store.checkout, user_id)
+    except InsufficientStock as e:
+        raise out_of_stock(e)
     if not order:
         raise HTTPException(status_code=400, detail="Cart is empty")
     return order
 
-@app.get("/")
+@router.get("/orders", response_model=List[Order])
+async def list_orders(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    token: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    # The caller's orders, newest first; X-Next-Cursor is set when older
+    # orders follow. Anonymous callers all share one cart user, so order
+    # history needs a session.
+    user_id = await require_user_id(state, token)
+    try:
+        orders, next_cursor = await state.executor.run(
+            state.store.list_orders, user_id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return encoded_response(request, orders, {"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+@router.get("/orders/{order_id}", response_model=Order)
+async def get_order(
+    request: Request,
+    order_id: int,
+    token: Optional[str] = Header(None),
+    state: State = Depends(app_state),
+):
+    user_id = await require_user_id(state, token)
+    order = await state.executor.run(state.store.get_order, order_id)
+    # Someone else's order is reported exactly like a missing one.
+    if not order or order.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return encoded_response(request, order)
+
+@router.get("/changes", response_model=ChangeFeed)
+async def get_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(0, ge=0, le=MAX_CHANGES_WAIT),
+    state: State = Depends(app_state),
+):
+    # Long poll: with nothing after ``since`` yet, keep asking the store
+    # until a change arrives or ``wait`` seconds pass. Asking the store,
+    # rather than waiting for a signal from this process, also picks up
+    # changes made by other workers.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        feed = await state.executor.run(state.store.changes, since, limit)
+        remaining = deadline - loop.time()
+        if feed.changes or remaining <= 0:
+            return encoded_response(request, feed)
+        await asyncio.sleep(min(CHANGES_POLL_INTERVAL, remaining))
+
+@router.get("/")
 async def root():
     return {"message": "E-commerce API is running"}
 
+
+
+def create_app() -> FastAPI:
+    """Build the API application.
+
+    Nothing is opened here; the store is created when the app starts up.
+    ``uvicorn --factory backend.main:create_app`` calls this directly.
+    """
+    if WORKERS > 1 and not engine_class(STORE_ENGINE).shared:
+        raise RuntimeError(f"The {STORE_ENGINE} engine cannot be shared by {WORKERS} worker processes; "
+                           f"set ECOMMERCE_STORE=sqlite")
+    app = FastAPI(title="E-commerce API", version="1.0.0", lifespan=lifespan)
+    # Everything routes serve from lives on the app, so two apps never share
+    # a store or caches. The store is built by the lifespan startup hook, so
+    # importing this module (tooling, test collection, the uvicorn reloader)
+    # opens no files.
+    app.state.store = None
+    app.state.lifespans = 0
+    # Store calls block on disk, so routes hand them to a bounded thread
+    # pool instead of running them on the event loop.
+    app.state.executor = StoreExecutor()
+    # Token -> username, so authenticated requests skip the store entirely.
+    app.state.session_cache = SessionCache()
+    # Serialized catalog responses; product writes below invalidate it.
+    app.state.read_cache = ReadCache()
+    app.state.next_change_check = 0.0
+    app.include_router(router)
+    # Compresses what the routes send unless they did so themselves.
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag", "X-Profile-File"],
+    )
+    # Only installed when enabled, so normal requests pay nothing for it.
+    if profiling.ENABLED:
+        app.add_middleware(profiling.ProfilingMiddleware)
+    # Added last so it wraps everything else and sees every request.
+    app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
-# --- Add sample dataset if DB is empty ---
-try:
-    if not store.get_all_products():
-        store.add_product(name="Sample Phone", price=299.99, description="A great phone.")
-        store.add_product(name="Sample Laptop", price=899.99, description="A powerful laptop.")
-        store.add_product(name="Sample Headphones", price=99.99, description="Noise-cancelling headphones.")
-except Exception:
-    pass
+    # Several workers need the app as an import string so each process can
+    # import it for itself.
+    uvicorn.run(app if WORKERS == 1 else "backend.main:app", host="0.0.0.0", port=8000, workers=WORKERS)
@@ -1,165 +1,387 @@
-from typing import Dict, List, Optional
-from datetime import datetime
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 import secrets
-from .models import Product, Cart, Order, OrderItem, User, SessionToken, CartItem
-from .db_store import get_db
-
-
-class MemoryStore:
-    def __init__(self):
-        with get_db() as db:
-            if 'products' not in db:
-                db['products'] = {}
-            if 'carts' not in db:
-                db['carts'] = {}
-            if 'orders' not in db:
-                db['orders'] = {}
-            if 'users' not in db:
-                db['users'] = {}
-            if 'sessions' not in db:
-                db['sessions'] = {}
-            if 'next_product_id' not in db:
-                db['next_product_id'] = 1
-            if 'next_order_id' not in db:
-                db['next_order_id'] = 1
-    def search_products(self, query: str):
-        query = query.lower()
-        with get_db() as db:
-            return [p for p in db['products'].values() if query in p.name.lower() or query in p.description.lower()]
+import threading
+from .base_store import BaseStore, check_quantities
+from .changes import CREATED, DELETED, ORDER, PRODUCT, UPDATED, ChangeLog, change_feed
+from .checkout import price_cart, quote_model, with_report
+from .inventory import Inventory
+from .models import (
+    Product, ProductCreate, Cart, CartQuote, ChangeFeed, Order, User, SessionToken, CartItemCreate, StockLevel
+)
+from .db_store import DB_PATH, ShelfHandle
+from .locks import KeyedLocks
+from .migrate import is_legacy, migrate_legacy
+from .pagination import (
+    ProductOrderIndex, check_sort, decode_cursor, decode_order_cursor, encode_cursor, encode_order_cursor,
+    sort_value
+)
+from .records import (
+    CartLine, OrderLine, OrderRecord, ProductRecord, SessionRecord, StockRecord, UserRecord,
+    cart_model, from_micros, order_model, product_model, session_model, to_micros, user_model
+)
+from .search_index import SearchIndex
+
+
+def _expired(session: SessionRecord, now: int) -> bool:
+    # Sessions written before expiry was tracked have no expires_at; they
+    # count as expired so they get swept like the rest.
+    return session.expires_at is None or session.expires_at <= now
+
+
+class MemoryStore(BaseStore):
+    """Store backed by a shelve file holding one record per key.
+
+    Records are kept as the compact tuples from ``records`` and only turned
+    into the Pydantic models when returned to callers.
+    """
+
+    def __init__(self, path: str = DB_PATH, handle=None):
+        self._handle = handle if handle is not None else ShelfHandle(path)
+        self._search_index = SearchIndex()
+        self._order_index = ProductOrderIndex()
+        self._inventory = Inventory(self.hold_ttl)
+        self._changes = ChangeLog(self._handle)
+        self._indexes_built = False
+        # Read-modify-write cycles lock only the record they touch: carts per
+        # user, products per id, users per name. Id counters have their own
+        # lock so two writers can never hand out the same id.
+        self._cart_locks = KeyedLocks()
+        self._product_locks = KeyedLocks()
+        self._user_locks = KeyedLocks()
+        self._id_lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        self.open()
+
+    def open(self):
+        with self._handle.session() as db:
+            if is_legacy(db):
+                migrate_legacy(db)
+        self._init_counters()
+        self._build_indexes()
+
+    def _build_indexes(self):
+        # Indexes live in process memory and are kept up to date by every
+        # write below, so they only need building from storage once.
+        if self._indexes_built:
+            return
+        products = self._handle.values('product')
+        self._search_index.rebuild(products)
+        self._order_index.rebuild(products)
+        self._inventory.load((s.product_id, s.on_hand) for s in self._handle.values('stock'))
+        self._indexes_built = True
+
+    def _init_counters(self):
+        if not self._handle.contains('meta', 'next_product_id'):
+            self._handle.put('meta', 'next_product_id', 1)
+        if not self._handle.contains('meta', 'next_order_id'):
+            self._handle.put('meta', 'next_order_id', 1)
+        self._handle.commit()
+        self._changes.load()
+
+    def flush(self):
+        self._handle.sync()
+
+    def close(self):
+        self._handle.close()
+
+    def _next_id(self, counter: str, count: int = 1) -> int:
+        """Reserve ``count`` consecutive ids and return the first one."""
+        with self._id_lock:
+            value = self._handle.get('meta', counter)
+            self._handle.put('meta', counter, value + count)
+            return value
+
+    def search_products(self, query: str) -> List[Product]:
+        products = (self._handle.get('product', pid) for pid in self._search_index.search(query))
+        return [product_model(p) for p in products if p is not None]
+
     def signup(self, username: str, password: str, role: str) -> bool:
-        with get_db() as db:
-            if username in db['users']:
+        with self._user_locks(username):
+            if self._handle.contains('user', username):
                 return False
-            db['users'][username] = User(username=username, password=password, role=role)
-            db.sync()
+            self._handle.put('user', username, UserRecord(username, password, role))
+            self._handle.commit()
             return True
 
     def login(self, username: str, password: str) -> Optional[SessionToken]:
-        with get_db() as db:
-            user = db['users'].get(username)
-            if not user or user.password != password:
-                return None
-            token = secrets.token_hex(16)
-            session = SessionToken(token=token, username=username, role=user.role)
-            db['sessions'][token] = session
-            db.sync()
-            return session
+        user = self._handle.get('user', username)
+        if not user or user.password != password:
+            return None
+        token = secrets.token_hex(16)
+        expires_at = to_micros(datetime.now() + timedelta(seconds=self.session_ttl))
+        session = SessionRecord(token, username, user.role, expires_at)
+        self._handle.put('session', token, session)
+        self._handle.commit()
+        return session_model(session)
 
     def get_user_by_token(self, token: str) -> Optional[User]:
-        with get_db() as db:
-            session = db['sessions'].get(token)
-            if not session:
-                return None
-            return db['users'].get(session.username)
-
-    def add_product(self, name: str, price: float, description: str) -> Product:
-        with get_db() as db:
-            pid = db['next_product_id']
-            product = Product(
-                id=pid,
-                name=name,
-                price=price,
-                description=description
-            )
-            db['products'][pid] = product
-            db['next_product_id'] += 1
-            db.sync()
-            return product
+        session = self._handle.get('session', token)
+        if not session or _expired(session, to_micros(datetime.now())):
+            return None
+        user = self._handle.get('user', session.username)
+        return user_model(user) if user else None
+
+    def get_session(self, token: str) -> Optional[SessionToken]:
+        session = self._handle.get('session', token)
+        if not session or _expired(session, to_micros(datetime.now())):
+            return None
+        if not self._handle.contains('user', session.username):
+            return None
+        return session_model(session)
+
+    def purge_expired_sessions(self) -> int:
+        now = to_micros(datetime.now())
+        expired = [s.token for s in self._handle.values('session') if _expired(s, now)]
+        for token in expired:
+            self._handle.delete('session', token)
+        if expired:
+            self._handle.commit()
+        return len(expired)
+
+    def add_product(self, name: str, price: float, description: str, stock: Optional[int] = None) -> Product:
+        pid = self._next_id('next_product_id')
+        product = ProductRecord(pid, name, price, description)
+        self._handle.put('product', pid, product)
+        if stock is not None:
+            self._handle.put('stock', pid, StockRecord(pid, stock))
+            self._inventory.track(pid, stock)
+        self._search_index.add(pid, name, description)
+        self._order_index.add(product)
+        self._changes.append(PRODUCT, CREATED, [pid])
+        self._handle.commit()
+        return product_model(product)
+
+    def add_products(self, products: List[ProductCreate]) -> List[Product]:
+        products = list(products)
+        first = self._next_id('next_product_id', len(products))
+        created = [
+            ProductRecord(first + i, p.name, p.price, p.description)
+            for i, p in enumerate(products)
+        ]
+        self._handle.put_many('product', {p.id: p for p in created})
+        stock = {r.id: StockRecord(r.id, p.stock) for r, p in zip(created, products) if p.stock is not None}
+        if stock:
+            self._handle.put_many('stock', stock)
+            for s in stock.values():
+                self._inventory.track(s.product_id, s.on_hand)
+        self._search_index.add_many(created)
+        self._order_index.add_many(created)
+        self._changes.append(PRODUCT, CREATED, (p.id for p in created))
+        self._handle.commit()
+        return [product_model(p) for p in created]
+
+    def seed_products(self, products: List[ProductCreate]) -> List[Product]:
+        with self._seed_lock:
+            if len(self._order_index):
+                return []
+            return self.add_products(products)
 
     def get_product(self, product_id: int) -> Optional[Product]:
-        with get_db() as db:
-            return db['products'].get(product_id)
+        product = self._handle.get('product', product_id)
+        return product_model(product) if product else None
 
     def get_all_products(self) -> List[Product]:
-        with get_db() as db:
-            return list(db['products'].values())
+        return [product_model(p) for p in sorted(self._handle.values('product'), key=lambda p: p.id)]
+
+    def list_products(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                      sort: str = 'id', descending: bool = False,
+                      min_price: Optional[float] = None,
+                      max_price: Optional[float] = None) -> Tuple[List[Product], Optional[str]]:
+        check_sort(sort)
+        after = decode_cursor(cursor, sort, descending) if cursor else None
+        ids, more = self._order_index.page(limit, after, sort, descending, min_price, max_price)
+        products = [self._handle.get('product', pid) for pid in ids]
+        products = [p for p in products if p is not None]
+        next_cursor = None
+        if more and products:
+            last = products[-1]
+            next_cursor = encode_cursor(sort, descending, sort_value(sort, last), last.id)
+        return [product_model(p) for p in products], next_cursor
 
     def update_product(self, product_id: int, **kwargs) -> Optional[Product]:
-        with get_db() as db:
-            if product_id not in db['products']:
+        with self._product_locks(product_id):
+            product = self._handle.get('product', product_id)
+            if product is None:
                 return None
-            product = db['products'][product_id]
-            for key, value in kwargs.items():
-                if value is not None:
-                    setattr(product, key, value)
-            db['products'][product_id] = product
-            db.sync()
-            return product
+            product = product._replace(**{key: value for key, value in kwargs.items() if value is not None})
+            self._handle.put('product', product_id, product)
+            self._search_index.add(product_id, product.name, product.description)
+            self._order_index.add(product)
+            self._changes.append(PRODUCT, UPDATED, [product_id])
+            self._handle.commit()
+            return product_model(product)
 
     def delete_product(self, product_id: int) -> bool:
-        with get_db() as db:
-            if product_id in db['products']:
-                del db['products'][product_id]
-                db.sync()
+        with self._product_locks(product_id):
+            if self._handle.delete('product', product_id):
+                self._handle.delete('stock', product_id)
+                self._inventory.untrack(product_id)
+                self._search_index.remove(product_id)
+                self._order_index.remove(product_id)
+                self._changes.append(PRODUCT, DELETED, [product_id])
+                self._handle.commit()
                 return True
             return False
 
+    def _stock_level(self, product_id: int) -> StockLevel:
+        stock = self._handle.get('stock', product_id)
+        if stock is None:
+            return StockLevel(product_id=product_id, stock=None)
+        available = self._inventory.available(product_id)
+        return StockLevel(product_id=product_id, stock=stock.on_hand,
+                          reserved=stock.on_hand - available, available=available)
+
+    def get_stock(self, product_id: int) -> Optional[StockLevel]:
+        if not self._handle.contains('product', product_id):
+            return None
+        return self._stock_level(product_id)
+
+    def set_stock(self, product_id: int, stock: Optional[int]) -> Optional[StockLevel]:
+        with self._product_locks(product_id):
+            if not self._handle.contains('product', product_id):
+                return None
+            current = self._handle.get('stock', product_id)
+            if stock is None:
+                self._handle.delete('stock', product_id)
+                self._inventory.untrack(product_id)
+            else:
+                if current is None:
+                    self._inventory.track(product_id, stock)
+                else:
+                    self._inventory.adjust(product_id, stock - current.on_hand)
+                self._handle.put('stock', product_id, StockRecord(product_id, stock))
+            self._handle.commit()
+            return self._stock_level(product_id)
+
+    def release_expired_holds(self) -> int:
+        released = 0
+        for user_id in self._inventory.users_with_expired_holds():
+            with self._cart_locks(user_id):
+                released += self._inventory.release_expired(user_id)
+        return released
+
+    def _cart_lines(self, user_id: str) -> Dict[int, CartLine]:
+        """The user's cart as an ordered product_id -> CartLine dict."""
+        return {line.product_id: line for line in self._handle.get('cart', user_id) or ()}
+
+    def _put_cart(self, user_id: str, lines: Dict[int, CartLine]):
+        self._handle.put('cart', user_id, tuple(lines.values()))
+
+    def _add_lines(self, user_id: str, added: Dict[int, int], products: Dict[int, ProductRecord]):
+        # Each line remembers the price the shopper last saw, so checkout
+        # can report lines whose price has changed since.
+        lines = self._cart_lines(user_id)
+        for pid, quantity in added.items():
+            line = lines.get(pid)
+            lines[pid] = CartLine(pid, quantity + (line.quantity if line else 0), products[pid].price)
+        self._put_cart(user_id, lines)
+
     def get_cart(self, user_id: str) -> Cart:
-        with get_db() as db:
-            if user_id not in db['carts']:
-                db['carts'][user_id] = Cart()
-            return db['carts'][user_id]
+        return cart_model(self._handle.get('cart', user_id) or ())
 
     def add_to_cart(self, user_id: str, product_id: int, quantity: int = 1) -> bool:
-        with get_db() as db:
-            if product_id not in db['products']:
+        check_quantities([quantity])
+        with self._cart_locks(user_id):
+            product = self._handle.get('product', product_id)
+            if product is None:
                 return False
-            cart = db['carts'].get(user_id, Cart())
-            for item in cart.items:
-                if item.product_id == product_id:
-                    item.quantity += quantity
-                    db['carts'][user_id] = cart
-                    db.sync()
-                    return True
-            cart.items.append(CartItem(product_id=product_id, quantity=quantity))
-            db['carts'][user_id] = cart
-            db.sync()
+            self._inventory.reserve(user_id, {product_id: quantity})
+            self._add_lines(user_id, {product_id: quantity}, {product_id: product})
+            self._handle.commit()
             return True
 
+    def add_to_cart_many(self, user_id: str, items: List[CartItemCreate]) -> List[int]:
+        check_quantities(item.quantity for item in items)
+        with self._cart_locks(user_id):
+            products = self._handle.get_many('product', {item.product_id for item in items})
+            missing = [item.product_id for item in items if item.product_id not in products]
+            if missing:
+                return missing
+            added: Dict[int, int] = {}
+            for item in items:
+                added[item.product_id] = added.get(item.product_id, 0) + item.quantity
+            self._inventory.reserve(user_id, added)
+            self._add_lines(user_id, added, products)
+            self._handle.commit()
+            return []
+
     def remove_from_cart(self, user_id: str, product_id: int) -> bool:
-        with get_db() as db:
-            cart = db['carts'].get(user_id, Cart())
-            cart.items = [item for item in cart.items if item.product_id != product_id]
-            db['carts'][user_id] = cart
-            db.sync()
+        with self._cart_locks(user_id):
+            lines = self._cart_lines(user_id)
+            lines.pop(product_id, None)
+            self._inventory.release(user_id, product_id)
+            self._put_cart(user_id, lines)
+            self._handle.commit()
             return True
 
+    def _quote(self, lines: Dict[int, CartLine]):
+        products = self._handle.get_many('product', lines)
+        return price_cart(lines.values(), {pid: (p.name, p.price) for pid, p in products.items()})
+
+    def quote_cart(self, user_id: str) -> CartQuote:
+        return quote_model(self._quote(self._cart_lines(user_id)))
+
     def checkout(self, user_id: str) -> Optional[Order]:
-        with get_db() as db:
-            cart = db['carts'].get(user_id, Cart())
-            if not cart.items:
+        with self._cart_locks(user_id):
+            quote = self._quote(self._cart_lines(user_id))
+            if not quote.lines:
                 return None
-            order_items = []
-            total = 0.0
-            for cart_item in cart.items:
-                product = db['products'].get(cart_item.product_id)
-                if product:
-                    order_item = OrderItem(
-                        product_id=product.id,
-                        name=product.name,
-                        price=product.price,
-                        quantity=cart_item.quantity
-                    )
-                    order_items.append(order_item)
-                    total += product.price * cart_item.quantity
-            oid = db['next_order_id']
-            order = Order(
-                id=oid,
-                items=order_items,
-                total=total,
-                created_at=datetime.now(),
-                paid=True
-            )
-            db['orders'][oid] = order
-            db['next_order_id'] += 1
-            cart.items = []
-            db['carts'][user_id] = cart
-            db.sync()
-            return order
+            quantities = {pid: quantity for pid, _, _, quantity in quote.lines}
+            # Every unit is held (or taken now) before anything is written,
+            # so the on-hand deductions below cannot fail.
+            self._inventory.cover(user_id, quantities)
+            for pid, quantity in self._inventory.tracked(quantities).items():
+                with self._product_locks(pid):
+                    stock = self._handle.get('stock', pid)
+                    if stock is not None:
+                        self._handle.put('stock', pid, stock._replace(on_hand=stock.on_hand - quantity))
+            self._inventory.consume(user_id)
+            oid = self._next_id('next_order_id')
+            items = tuple(OrderLine._make(line) for line in quote.lines)
+            order = OrderRecord(oid, items, quote.total, to_micros(datetime.now()), True, user_id)
+            self._handle.put('order', oid, order)
+            # The user's order ids, oldest first. Ids are handed out in
+            # creation order and the cart lock serialises this user's
+            # checkouts, so appending keeps the list sorted.
+            history = self._handle.get('user_orders', user_id) or ()
+            self._handle.put('user_orders', user_id, history + (oid,))
+            self._put_cart(user_id, {})
+            self._changes.append(ORDER, CREATED, [oid])
+            self._handle.commit()
+            return with_report(order_model(order), quote)
 
     def get_order(self, order_id: int) -> Optional[Order]:
-        with get_db() as db:
-            return db['orders'].get(order_id)
+        order = self._handle.get('order', order_id)
+        return order_model(order) if order else None
+
+    def last_product_change(self) -> int:
+        return self._changes.last_product_seq
+
+    def changes(self, since: int = 0, limit: int = 100) -> ChangeFeed:
+        entries = self._changes.read(since, limit)
+        ids = {PRODUCT: set(), ORDER: set()}
+        for change in entries:
+            ids[change.entity].add(change.entity_id)
+        products = self._handle.get_many('product', ids[PRODUCT])
+        orders = self._handle.get_many('order', ids[ORDER])
+        return change_feed(
+            ((c.seq, c.entity, c.action, c.entity_id, from_micros(c.at)) for c in entries), since,
+            {pid: product_model(p) for pid, p in products.items()},
+            {oid: order_model(o) for oid, o in orders.items()},
+        )
 
+    def list_orders(self, user_id: str, limit: int = 20,
+                    cursor: Optional[str] = None) -> Tuple[List[Order], Optional[str]]:
+        history = self._handle.get('user_orders', user_id) or ()
+        end = bisect_left(history, decode_order_cursor(cursor)) if cursor else len(history)
+        start = max(0, end - limit)
+        orders = []
+        for oid in reversed(history[start:end]):
+            order = self._handle.get('order', oid)
+            if order:
+                orders.append(order_model(order))
+        next_cursor = encode_order_cursor(history[start]) if start > 0 else None
+        return orders, next_cursor
 
-store = MemoryStore()
@@ -0,0 +1,67 @@
+"""Convert a shelve file from the old one-dict-per-table layout.
+
+Older versions kept every product, cart, order, user and session in a single
+pickled dict (``db['products']``, ``db['carts']``, ...). The store now keeps
+one record per key, so this rewrites those dicts as individual records,
+encoded with the binary codec from ``records``.
+
+Usage: python -m backend.migrate [DB_PATH]
+"""
+import shelve
+import sys
+
+from . import records
+from .db_store import DB_PATH, record_key
+
+LEGACY_TABLES = {
+    'products': 'product',
+    'carts': 'cart',
+    'orders': 'order',
+    'users': 'user',
+    'sessions': 'session',
+}
+LEGACY_COUNTERS = ('next_product_id', 'next_order_id')
+
+
+def is_legacy(db) -> bool:
+    return any(name in db for name in (*LEGACY_TABLES, *LEGACY_COUNTERS))
+
+
+def migrate_legacy(db) -> int:
+    """Rewrite legacy tables in ``db`` as per-record keys.
+
+    Records are written before the legacy keys are removed, so an
+    interrupted run can simply be repeated. Returns the number of records
+    written.
+    """
+    written = 0
+    for legacy, table in LEGACY_TABLES.items():
+        if legacy not in db:
+            continue
+        for key, value in db[legacy].items():
+            db[record_key(table, key)] = records.dump(table, records.load(table, value))
+            written += 1
+    for counter in LEGACY_COUNTERS:
+        if counter in db:
+            db[record_key('meta', counter)] = db[counter]
+    db.sync()
+    for name in (*LEGACY_TABLES, *LEGACY_COUNTERS):
+        if name in db:
+            del db[name]
+    db.sync()
+    return written
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else DB_PATH
+    with shelve.open(path) as db:
+        if not is_legacy(db):
+            print(f"{path}: already using the per-record layout")
+            return
+        written = migrate_legacy(db)
+    print(f"{path}: migrated {written} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -14,6 +14,9 @@ class ProductCreate(BaseModel):
     name: str
     price: float
     description: str
+    # Units on hand; None means stock is not tracked and the product never
+    # runs out.
+    stock: Optional[int] = Field(None, ge=0)
 
 
 class ProductUpdate(BaseModel):
@@ -22,9 +25,29 @@ class ProductUpdate(BaseModel):
     description: Optional[str] = None
 
 
+class StockUpdate(BaseModel):
+    stock: Optional[int] = Field(None, ge=0)
+
+
+class StockLevel(BaseModel):
+    product_id: int
+    stock: Optional[int]  # units on hand, None when not tracked
+    reserved: int = 0  # units held by carts
+    available: Optional[int] = None  # stock - reserved
+
+
+class CartItemCreate(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+
 class CartItem(BaseModel):
     product_id: int
+    # Not constrained here: carts stored before quantities were checked are
+    # still served.
     quantity: int
+    # Unit price when the line was last added to; set by the server.
+    price: Optional[float] = None
 
 
 class Cart(BaseModel):
@@ -39,12 +62,30 @@ class OrderItem(BaseModel):
 
 
 
+class RepricedItem(BaseModel):
+    product_id: int
+    old_price: float  # when added to the cart
+    new_price: float  # charged
+
+
+class CartQuote(BaseModel):
+    items: List[OrderItem]
+    total: float
+    missing_product_ids: List[int] = []
+    repriced: List[RepricedItem] = []
+
+
 class Order(BaseModel):
     id: int
     items: List[OrderItem]
     total: float
     created_at: datetime
     paid: bool = False
+    user_id: Optional[str] = None
+    # Only filled in on the checkout response: cart lines left out because
+    # the product is gone, and lines charged at a changed price.
+    missing_product_ids: List[int] = []
+    repriced: List[RepricedItem] = []
 
 
 # User and Auth Models
@@ -66,3 +107,22 @@ class SessionToken(BaseModel):
     token: str
     username: str
     role: str
+    expires_at: Optional[datetime] = None
+
+
+class Change(BaseModel):
+    seq: int
+    entity: Literal["product", "order"]
+    action: Literal["created", "updated", "deleted"]
+    id: int
+    at: datetime
+    # The product or order as it is now (not as it was at this change);
+    # None once it has been deleted.
+    product: Optional[Product] = None
+    order: Optional[Order] = None
+
+
+class ChangeFeed(BaseModel):
+    changes: List[Change]
+    # Pass as ``since`` to continue after these changes.
+    last_seq: int
@@ -0,0 +1,37 @@
+"""Newline-delimited JSON helpers for the catalog export and import routes."""
+from typing import AsyncIterator, Iterable, Tuple
+
+from .http_cache import dump_json
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_lines(items: Iterable) -> bytes:
+    return b"".join(dump_json(item) + b"\n" for item in items)
+
+
+async def read_lines(chunks: AsyncIterator[bytes], max_line: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield (line number, line) from a chunked body, skipping blank lines.
+
+    Only the current partial line is buffered. Raises ValueError if a line
+    grows beyond ``max_line`` bytes.
+    """
+    def too_long(number):
+        return ValueError(f"Line {number} is longer than {max_line} bytes")
+
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            number += 1
+            if len(line) > max_line:
+                raise too_long(number)
+            if line.strip():
+                yield number, line
+        if len(buffer) > max_line:
+            raise too_long(number + 1)
+    if buffer.strip():
+        yield number + 1, buffer
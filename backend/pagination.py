@@ -0,0 +1,163 @@
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SORT_KEYS = ('id', 'price', 'name')
+PRICE = SORT_KEYS.index('price')
+
+
+def name_key(name: str) -> str:
+    """What products sort by for ``sort=name``; the SQLite engine stores it."""
+    return name.lower()
+
+
+def sort_value(sort: str, product):
+    if sort == 'price':
+        return product.price
+    if sort == 'name':
+        return name_key(product.name)
+    return product.id
+
+
+def encode_cursor(sort: str, descending: bool, value, product_id: int) -> str:
+    raw = json.dumps([sort, descending, value, product_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str, descending: bool) -> Tuple[object, int]:
+    """Return the (sort value, product id) a page should continue after.
+
+    Raises ValueError if the cursor is malformed or was issued for a
+    different ordering.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        c_sort, c_desc, value, product_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    if c_sort != sort or c_desc != descending:
+        raise ValueError("Cursor does not match the requested sort order")
+    expected = str if sort == 'name' else (int, float) if sort == 'price' else int
+    if not isinstance(product_id, int) or not isinstance(value, expected):
+        raise ValueError("Invalid cursor")
+    return value, product_id
+
+
+def encode_order_cursor(order_id: int) -> str:
+    # Order history is always newest first, so the cursor only needs the id
+    # of the last order on the page.
+    return encode_cursor('order', True, order_id, order_id)
+
+
+def decode_order_cursor(cursor: str) -> int:
+    """Return the order id a page of order history should continue after."""
+    return decode_cursor(cursor, 'order', True)[1]
+
+
+def check_sort(sort: str):
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key {sort!r}, expected one of {list(SORT_KEYS)}")
+
+
+class ProductOrderIndex:
+    """Sorted (value, id) lists for each sort key.
+
+    A page is found by bisecting to the cursor position and walking forward,
+    so its cost depends on the page size rather than the catalog size. A
+    price filter on another sort key can cost more; see ``page``.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, List[tuple]] = {sort: [] for sort in SORT_KEYS}
+        # product id -> its indexed values, in SORT_KEYS order
+        self._values: Dict[int, tuple] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def rebuild(self, products: Iterable):
+        with self._lock:
+            self._entries = {sort: [] for sort in SORT_KEYS}
+            self._values = {}
+            self.add_many(products)
+
+    def add(self, product):
+        values = tuple(sort_value(sort, product) for sort in SORT_KEYS)
+        with self._lock:
+            self.remove(product.id)
+            self._values[product.id] = values
+            for sort, value in zip(SORT_KEYS, values):
+                insort(self._entries[sort], (value, product.id))
+
+    def add_many(self, products: Iterable):
+        """Index several products, re-sorting each list once at the end."""
+        latest = {product.id: product for product in products}
+        with self._lock:
+            for product_id in latest:
+                self.remove(product_id)
+            for product in latest.values():
+                values = tuple(sort_value(sort, product) for sort in SORT_KEYS)
+                self._values[product.id] = values
+                for sort, value in zip(SORT_KEYS, values):
+                    self._entries[sort].append((value, product.id))
+            for entries in self._entries.values():
+                entries.sort()
+
+    def remove(self, product_id: int):
+        with self._lock:
+            values = self._values.pop(product_id, None)
+            if values is None:
+                return
+            for sort, value in zip(SORT_KEYS, values):
+                entries = self._entries[sort]
+                del entries[bisect_left(entries, (value, product_id))]
+
+    def page(self, limit: Optional[int], after: Optional[tuple] = None, sort: str = 'id',
+             descending: bool = False, min_price: Optional[float] = None,
+             max_price: Optional[float] = None) -> Tuple[List[int], bool]:
+        """Return up to ``limit`` product ids and whether more follow.
+
+        With ``sort='price'`` a price range is a bisected slice. With another
+        sort key the matching prices are counted by bisection: a band narrow
+        enough to sort is sorted (O(m log m) for m matches), a wider one is
+        walked in sort order skipping misses, which takes about
+        ``limit * n / m`` steps and up to O(n) when the matches sit at the
+        far end of the order.
+        """
+        with self._lock:
+            entries = self._entries[sort]
+            lo, hi = 0, len(entries)
+            if min_price is not None or max_price is not None:
+                prices = self._entries['price']
+                p_lo, p_hi = 0, len(prices)
+                if min_price is not None:
+                    p_lo = bisect_left(prices, (min_price,))
+                if max_price is not None:
+                    p_hi = bisect_right(prices, (max_price, float('inf')))
+                if sort == 'price':
+                    lo, hi = p_lo, p_hi
+                elif limit is None or (p_hi - p_lo) ** 2 < limit * len(entries):
+                    column = SORT_KEYS.index(sort)
+                    entries = sorted((self._values[pid][column], pid) for _, pid in prices[p_lo:p_hi])
+                    lo, hi = 0, len(entries)
+            if after is not None:
+                if descending:
+                    hi = min(hi, bisect_left(entries, tuple(after)))
+                else:
+                    lo = max(lo, bisect_right(entries, tuple(after)))
+            positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+            ids = []
+            for pos in positions:
+                product_id = entries[pos][1]
+                price = self._values[product_id][PRICE]
+                if min_price is not None and price < min_price:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                if limit is not None and len(ids) == limit:
+                    return ids, True
+                ids.append(product_id)
+            return ids, False
@@ -0,0 +1,139 @@
+"""Opt-in sampling profiler for individual requests.
+
+Disabled by default, in which case main.py does not install the middleware
+and the store executor skips its hook, so there is no cost at all. Enable
+it with either:
+
+- ``ECOMMERCE_PROFILE_RATE`` - fraction of requests to profile (e.g. 0.01)
+- ``ECOMMERCE_PROFILE_HEADER=1`` - profile requests sent with ``X-Profile: 1``
+
+While a request is profiled, a sampler thread records the Python stack of
+the event loop thread and of every store thread running a call for that
+request, every ``ECOMMERCE_PROFILE_INTERVAL`` seconds (default 0.001).
+Other requests sharing the event loop at the time show up in its samples
+too. When the request finishes, the samples are written in collapsed-stack
+format (one ``frame;frame;frame count`` line per distinct stack) to
+``ECOMMERCE_PROFILE_DIR`` (default ``profiles``); speedscope, flamegraph.pl
+and most flamegraph viewers open these directly. The file name is returned
+in the ``X-Profile-File`` response header.
+"""
+import contextvars
+import itertools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+PROFILE_RATE = float(os.environ.get('ECOMMERCE_PROFILE_RATE', '0'))
+PROFILE_HEADER = os.environ.get('ECOMMERCE_PROFILE_HEADER', '') in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get('ECOMMERCE_PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.environ.get('ECOMMERCE_PROFILE_INTERVAL', '0.001'))
+
+ENABLED = PROFILE_RATE > 0 or PROFILE_HEADER
+
+_current: contextvars.ContextVar = contextvars.ContextVar('request_profile', default=None)
+_sequence = itertools.count(1)
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def current() -> Optional['RequestProfile']:
+    """The profile of the request being handled, if it is profiled."""
+    return _current.get()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """Samples the threads working on one request until stop() is called."""
+
+    def __init__(self, method: str, path: str, directory: str = PROFILE_DIR,
+                 interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        slug = _UNSAFE.sub('_', path.strip('/'))[:60] or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_sequence):05d}-{method}-{slug}.collapsed"
+        self.path = os.path.join(directory, name)
+        self._threads = {threading.get_ident(): 'event-loop'}
+        self._stacks = Counter()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        # The sampler thread writes the file, so the event loop never waits.
+        self._done.set()
+
+    def track(self):
+        """Sample the calling thread until untrack(); used by store threads."""
+        self._threads[threading.get_ident()] = threading.current_thread().name
+
+    def untrack(self):
+        self._threads.pop(threading.get_ident(), None)
+
+    def _sample(self):
+        frames = sys._current_frames()
+        for ident, label in list(self._threads.items()):
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(label)
+            self._stacks[';'.join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            self._sample()
+        self._sample()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles sampled or explicitly requested requests."""
+
+    def __init__(self, app, rate: float = PROFILE_RATE, header: bool = PROFILE_HEADER,
+                 directory: str = PROFILE_DIR):
+        self.app = app
+        self.rate = rate
+        self.header = header
+        self.directory = directory
+
+    def _wanted(self, scope) -> bool:
+        if self.header:
+            for name, value in scope['headers']:
+                if name == b'x-profile':
+                    return value in (b'1', b'true', b'yes')
+        return self.rate > 0 and random.random() < self.rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(scope['method'], scope['path'], self.directory)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'x-profile-file', profile.path.encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        token = _current.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.stop()
+            _current.reset(token)
@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional
+
+from .http_cache import make_etag
+
+# Upper bound on the serialized bytes kept by the read cache; 0 disables it.
+READ_CACHE_BYTES = int(os.environ.get('ECOMMERCE_READ_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# Key namespaces: ("product", id), ("list", params...), ("search", query).
+PRODUCT = "product"
+LISTING = "list"
+SEARCH = "search"
+
+
+class CachedBody:
+    __slots__ = ("body", "etag", "headers", "variants")
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.etag = make_etag(body)
+        self.headers = headers
+        # (media type, content encoding) -> the body in that form
+        self.variants: Dict[tuple, bytes] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(map(len, self.variants.values()))
+
+
+class ReadCache:
+    """LRU cache of serialized JSON responses for the catalog read routes.
+
+    Holds single products, catalog listings (one entry per query) and
+    search results as ready-to-send bytes with their ETag, bounded by the
+    total body size. Writes invalidate through the ``products_*`` hooks: a
+    changed product drops its own entry plus every listing and search, an
+    added product only the listings and searches.
+
+    A reader takes ``generation`` before asking the store and passes it to
+    put(); if a write invalidated anything in between, the possibly stale
+    body is not cached.
+
+    Writes made by other processes sharing the store never reach these
+    hooks. For such stores readers call follow() with the store's latest
+    product change first, which empties the cache whenever it has moved.
+    """
+
+    def __init__(self, max_bytes: int = READ_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._followed = None
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, body: bytes, generation: int,
+            headers: Optional[Dict[str, str]] = None) -> CachedBody:
+        entry = CachedBody(body, headers)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if generation != self.generation:
+                return entry
+            self._pop(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            self._evict()
+        return entry
+
+    def put_variant(self, key: Hashable, entry: CachedBody, variant: tuple, body: bytes):
+        """Keep another encoding of ``entry``'s body; it counts towards ``max_bytes``."""
+        with self._lock:
+            if variant in entry.variants:
+                return
+            entry.variants[variant] = body
+            if self._entries.get(key) is entry:
+                self._size += len(body)
+                self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+
+    def _pop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _drop_namespaces(self, *namespaces: str):
+        for key in [k for k in self._entries if k[0] in namespaces]:
+            self._pop(key)
+
+    def products_added(self):
+        with self._lock:
+            self.generation += 1
+            self._drop_namespaces(LISTING, SEARCH)
+
+    def products_changed(self, product_ids: Iterable[int]):
+        """Call after products were updated or deleted."""
+        with self._lock:
+            self.generation += 1
+            for product_id in product_ids:
+                self._pop((PRODUCT, product_id))
+            self._drop_namespaces(LISTING, SEARCH)
+
+    def follow(self, change_seq: int):
+        """Drop everything if products changed since the last call."""
+        with self._lock:
+            if change_seq == self._followed:
+                return
+            self._followed = change_seq
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._size = 0
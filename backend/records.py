@@ -0,0 +1,353 @@
+"""Compact record types and the binary codec used by the storage engines.
+
+The shelve and memory engines keep records as plain named tuples instead of
+Pydantic models: no per-instance ``__dict__`` or validation state, and they
+are written to disk with a small fixed-schema ``struct`` encoding rather
+than pickled class instances. Every encoded record starts with a version
+byte, so the layout can change later while old files still load.
+
+MemoryStore converts records to the Pydantic models in ``models.py`` only
+when handing them out, i.e. at the API boundary.
+"""
+import struct
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Tuple
+
+from .models import Cart, CartItem, Order, OrderItem, Product, SessionToken, User
+
+CODEC_VERSION = 1
+# Orders are at version 2, which added the owner (user_id).
+ORDER_VERSION = 2
+# Carts are at version 2, which added the unit price seen when adding.
+CART_VERSION = 2
+
+_EPOCH = datetime(1970, 1, 1)
+_NAN = float('nan')
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(value: datetime) -> int:
+    """Naive datetime -> integer microseconds, exact in both directions."""
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+class ProductRecord(NamedTuple):
+    id: int
+    name: str
+    price: float
+    description: str
+
+
+class CartLine(NamedTuple):
+    product_id: int
+    quantity: int
+    price: Optional[float] = None  # unit price when last added; None for carts from before prices were kept
+
+
+class OrderLine(NamedTuple):
+    product_id: int
+    name: str
+    price: float
+    quantity: int
+
+
+class OrderRecord(NamedTuple):
+    id: int
+    items: Tuple[OrderLine, ...]
+    total: float
+    created_at: int  # microseconds, see to_micros()
+    paid: bool
+    user_id: Optional[str] = None  # None for orders placed before owners were recorded
+
+
+class UserRecord(NamedTuple):
+    username: str
+    password: str
+    role: str
+
+
+class SessionRecord(NamedTuple):
+    token: str
+    username: str
+    role: str
+    expires_at: Optional[int]  # microseconds, see to_micros()
+
+
+# A cart is stored as a tuple of CartLine, in insertion order.
+CartRecord = Tuple[CartLine, ...]
+# Per-user order history: the user's order ids, ascending (oldest first).
+OrderIdsRecord = Tuple[int, ...]
+
+
+class StockRecord(NamedTuple):
+    product_id: int
+    on_hand: int
+
+
+class ChangeRecord(NamedTuple):
+    seq: int
+    entity: str  # one of CHANGE_ENTITIES
+    action: str  # one of CHANGE_ACTIONS
+    entity_id: int
+    at: int  # microseconds, see to_micros()
+
+
+# Changes are stored CHANGE_BLOCK to a key (block n holds sequence numbers
+# n * CHANGE_BLOCK to n * CHANGE_BLOCK + CHANGE_BLOCK - 1), in order.
+ChangeBlock = Tuple[ChangeRecord, ...]
+CHANGE_BLOCK = 32
+# Stored as their index in these tuples; only ever append to them.
+CHANGE_ENTITIES = ('product', 'order')
+CHANGE_ACTIONS = ('created', 'updated', 'deleted')
+
+
+# --- Records -> API models ---
+
+def product_model(r: ProductRecord) -> Product:
+    return Product(id=r.id, name=r.name, price=r.price, description=r.description)
+
+
+def cart_model(lines: CartRecord) -> Cart:
+    return Cart(items=[
+        CartItem(product_id=line.product_id, quantity=line.quantity, price=line.price) for line in lines
+    ])
+
+
+def order_model(r: OrderRecord) -> Order:
+    return Order(
+        id=r.id,
+        items=[OrderItem(product_id=i.product_id, name=i.name, price=i.price, quantity=i.quantity) for i in r.items],
+        total=r.total,
+        created_at=from_micros(r.created_at),
+        paid=r.paid,
+        user_id=r.user_id
+    )
+
+
+def user_model(r: UserRecord) -> User:
+    return User(username=r.username, password=r.password, role=r.role)
+
+
+def session_model(r: SessionRecord) -> SessionToken:
+    return SessionToken(
+        token=r.token,
+        username=r.username,
+        role=r.role,
+        expires_at=from_micros(r.expires_at) if r.expires_at is not None else None
+    )
+
+
+# --- Pydantic objects found in files written by older versions -> records ---
+
+def _upgrade_product(p) -> ProductRecord:
+    return ProductRecord(p.id, p.name, p.price, p.description)
+
+
+def _upgrade_cart(c) -> CartRecord:
+    return tuple(CartLine(i.product_id, i.quantity) for i in c.items)
+
+
+def _upgrade_order(o) -> OrderRecord:
+    items = tuple(OrderLine(i.product_id, i.name, i.price, i.quantity) for i in o.items)
+    return OrderRecord(o.id, items, o.total, to_micros(o.created_at), o.paid, getattr(o, 'user_id', None))
+
+
+def _upgrade_user(u) -> UserRecord:
+    return UserRecord(u.username, u.password, u.role)
+
+
+def _upgrade_session(s) -> SessionRecord:
+    expires_at = getattr(s, 'expires_at', None)
+    return SessionRecord(s.token, s.username, s.role, to_micros(expires_at) if expires_at else None)
+
+
+# --- Binary codec ---
+#
+# Strings are UTF-8 and length-prefixed by the fixed-size header that
+# precedes them; all integers are little-endian.
+
+_PRODUCT = struct.Struct('<BqdII')        # version, id, price, len(name), len(description)
+_CART = struct.Struct('<BI')              # version, line count
+_CART_LINE_V1 = struct.Struct('<qq')      # product_id, quantity
+_CART_LINE = struct.Struct('<qqd')        # product_id, quantity, price (NaN = unknown)
+_ORDER_V1 = struct.Struct('<Bqdq?I')      # version, id, total, created_at, paid, line count
+_ORDER = struct.Struct('<Bqdq?II')        # as v1, then len(user_id) (0 = no owner)
+_ORDER_LINE = struct.Struct('<qdqI')      # product_id, price, quantity, len(name)
+_USER = struct.Struct('<BIII')            # version, len(username), len(password), len(role)
+_SESSION = struct.Struct('<B?qIII')       # version, has expiry, expires_at, len(token), len(username), len(role)
+_ID_LIST = struct.Struct('<BI')           # version, count; followed by count int64 ids
+_STOCK = struct.Struct('<Bqq')            # version, product_id, on_hand
+_CHANGE = struct.Struct('<qBBqq')         # seq, entity, action, entity id, at; after an _ID_LIST-style header
+
+
+def _strings(data: bytes, offset: int, lengths) -> list:
+    out = []
+    for length in lengths:
+        out.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    return out
+
+
+def _encode_product(r: ProductRecord) -> bytes:
+    name = r.name.encode('utf-8')
+    description = r.description.encode('utf-8')
+    return _PRODUCT.pack(CODEC_VERSION, r.id, r.price, len(name), len(description)) + name + description
+
+
+def _decode_product(data: bytes) -> ProductRecord:
+    # Hot path (every product read on the shelve engine), so no helper.
+    _, pid, price, name_len, description_len = _PRODUCT.unpack_from(data)
+    end = _PRODUCT.size + name_len
+    return ProductRecord(pid, data[_PRODUCT.size:end].decode('utf-8'), price,
+                         data[end:end + description_len].decode('utf-8'))
+
+
+def _encode_cart(lines: CartRecord) -> bytes:
+    parts = [_CART.pack(CART_VERSION, len(lines))]
+    parts.extend(
+        _CART_LINE.pack(line.product_id, line.quantity, _NAN if line.price is None else line.price)
+        for line in lines
+    )
+    return b''.join(parts)
+
+
+def _decode_cart_v1(data: bytes) -> CartRecord:
+    _, count = _CART.unpack_from(data)
+    body = data[_CART.size:_CART.size + count * _CART_LINE_V1.size]
+    return tuple(CartLine(pid, qty) for pid, qty in _CART_LINE_V1.iter_unpack(body))
+
+
+def _decode_cart(data: bytes) -> CartRecord:
+    # iter_unpack keeps B2B carts with thousands of lines cheap to load.
+    _, count = _CART.unpack_from(data)
+    body = data[_CART.size:_CART.size + count * _CART_LINE.size]
+    return tuple(
+        CartLine(pid, qty, None if price != price else price) for pid, qty, price in _CART_LINE.iter_unpack(body)
+    )
+
+
+def _encode_order(r: OrderRecord) -> bytes:
+    user_id = (r.user_id or '').encode('utf-8')
+    parts = [_ORDER.pack(ORDER_VERSION, r.id, r.total, r.created_at, r.paid, len(r.items), len(user_id)), user_id]
+    for item in r.items:
+        name = item.name.encode('utf-8')
+        parts.append(_ORDER_LINE.pack(item.product_id, item.price, item.quantity, len(name)))
+        parts.append(name)
+    return b''.join(parts)
+
+
+def _decode_order_lines(data: bytes, offset: int, count: int) -> Tuple[OrderLine, ...]:
+    items = []
+    for _ in range(count):
+        product_id, price, quantity, name_len = _ORDER_LINE.unpack_from(data, offset)
+        offset += _ORDER_LINE.size
+        items.append(OrderLine(product_id, data[offset:offset + name_len].decode('utf-8'), price, quantity))
+        offset += name_len
+    return tuple(items)
+
+
+def _decode_order_v1(data: bytes) -> OrderRecord:
+    _, oid, total, created_at, paid, count = _ORDER_V1.unpack_from(data)
+    return OrderRecord(oid, _decode_order_lines(data, _ORDER_V1.size, count), total, created_at, paid)
+
+
+def _decode_order(data: bytes) -> OrderRecord:
+    _, oid, total, created_at, paid, count, user_len = _ORDER.unpack_from(data)
+    offset = _ORDER.size + user_len
+    user_id = data[_ORDER.size:offset].decode('utf-8') or None
+    return OrderRecord(oid, _decode_order_lines(data, offset, count), total, created_at, paid, user_id)
+
+
+def _encode_user(r: UserRecord) -> bytes:
+    fields = [f.encode('utf-8') for f in r]
+    return _USER.pack(CODEC_VERSION, *map(len, fields)) + b''.join(fields)
+
+
+def _decode_user(data: bytes) -> UserRecord:
+    _, *lengths = _USER.unpack_from(data)
+    return UserRecord(*_strings(data, _USER.size, lengths))
+
+
+def _encode_session(r: SessionRecord) -> bytes:
+    fields = [r.token.encode('utf-8'), r.username.encode('utf-8'), r.role.encode('utf-8')]
+    has_expiry = r.expires_at is not None
+    header = _SESSION.pack(CODEC_VERSION, has_expiry, r.expires_at if has_expiry else 0, *map(len, fields))
+    return header + b''.join(fields)
+
+
+def _decode_session(data: bytes) -> SessionRecord:
+    _, has_expiry, expires_at, *lengths = _SESSION.unpack_from(data)
+    token, username, role = _strings(data, _SESSION.size, lengths)
+    return SessionRecord(token, username, role, expires_at if has_expiry else None)
+
+
+def _encode_ids(ids: OrderIdsRecord) -> bytes:
+    return _ID_LIST.pack(CODEC_VERSION, len(ids)) + struct.pack(f'<{len(ids)}q', *ids)
+
+
+def _decode_ids(data: bytes) -> OrderIdsRecord:
+    _, count = _ID_LIST.unpack_from(data)
+    return struct.unpack_from(f'<{count}q', data, _ID_LIST.size)
+
+
+def _encode_stock(r: StockRecord) -> bytes:
+    return _STOCK.pack(CODEC_VERSION, r.product_id, r.on_hand)
+
+
+def _decode_stock(data: bytes) -> StockRecord:
+    return StockRecord(*_STOCK.unpack_from(data)[1:])
+
+
+def _encode_changes(block: ChangeBlock) -> bytes:
+    parts = [_ID_LIST.pack(CODEC_VERSION, len(block))]
+    for r in block:
+        parts.append(_CHANGE.pack(r.seq, CHANGE_ENTITIES.index(r.entity), CHANGE_ACTIONS.index(r.action),
+                                  r.entity_id, r.at))
+    return b''.join(parts)
+
+
+def _decode_changes(data: bytes) -> ChangeBlock:
+    return tuple(
+        ChangeRecord(seq, CHANGE_ENTITIES[entity], CHANGE_ACTIONS[action], entity_id, at)
+        for seq, entity, action, entity_id, at in _CHANGE.iter_unpack(data[_ID_LIST.size:])
+    )
+
+
+# table -> (encoder, {version: decoder}, upgrade from a legacy Pydantic object)
+CODECS = {
+    'product': (_encode_product, {1: _decode_product}, _upgrade_product),
+    'cart': (_encode_cart, {1: _decode_cart_v1, 2: _decode_cart}, _upgrade_cart),
+    'order': (_encode_order, {1: _decode_order_v1, 2: _decode_order}, _upgrade_order),
+    'user': (_encode_user, {1: _decode_user}, _upgrade_user),
+    'session': (_encode_session, {1: _decode_session}, _upgrade_session),
+    'user_orders': (_encode_ids, {1: _decode_ids}, tuple),
+    'stock': (_encode_stock, {1: _decode_stock}, StockRecord._make),
+    'changes': (_encode_changes, {1: _decode_changes}, tuple),
+}
+
+
+def dump(table: str, record):
+    """Encode a record for storage; tables without a codec pass through."""
+    codec = CODECS.get(table)
+    return codec[0](record) if codec else record
+
+
+def load(table: str, value):
+    """Decode a stored value back into a record.
+
+    Pydantic objects pickled by older versions are converted on the fly, so
+    existing files keep working and are re-encoded as they get rewritten.
+    """
+    codec = CODECS.get(table)
+    if codec is None or value is None:
+        return value
+    if isinstance(value, bytes):
+        decoder = codec[1].get(value[0])
+        if decoder is None:
+            raise ValueError(f"Unknown {table} record version {value[0]}")
+        return decoder(value)
+    return codec[2](value)
@@ -0,0 +1,150 @@
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Set, Tuple
+
+TOKEN_RE = re.compile(r"\w+")
+
+# BM25 parameters; a hit in the product name counts NAME_WEIGHT times as
+# much as one in the description.
+K1 = 1.2
+B = 0.75
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Inverted index over product names and descriptions.
+
+    Every query term is matched as a prefix, all terms must match (AND), and
+    results are ranked with BM25 over a weighted name/description term
+    frequency. The index is updated incrementally, so a query only touches
+    the postings of the terms it matches.
+    """
+
+    def __init__(self):
+        # term -> {product_id: (name_tf, description_tf)}
+        self._postings: Dict[str, Dict[int, Tuple[int, int]]] = {}
+        # Sorted vocabulary, used to expand a prefix into matching terms.
+        self._terms: List[str] = []
+        self._doc_terms: Dict[int, Set[str]] = {}
+        self._doc_lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def rebuild(self, products: Iterable):
+        with self._lock:
+            self._postings = {}
+            self._terms = []
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0.0
+            self.add_many(products)
+
+    def add(self, product_id: int, name: str, description: str):
+        with self._lock:
+            self.remove(product_id)
+            for term in self._insert(product_id, name, description):
+                insort(self._terms, term)
+
+    def add_many(self, products: Iterable):
+        """Index several products, sorting new vocabulary once at the end."""
+        latest = {product.id: product for product in products}
+        with self._lock:
+            for product_id in latest:
+                self.remove(product_id)
+            new_terms = []
+            for product in latest.values():
+                new_terms.extend(self._insert(product.id, product.name, product.description))
+            if new_terms:
+                self._terms.extend(new_terms)
+                self._terms.sort()
+
+    def _insert(self, product_id: int, name: str, description: str) -> List[str]:
+        """Add postings for one product; returns terms not seen before."""
+        name_tokens = tokenize(name)
+        description_tokens = tokenize(description)
+        counts: Dict[str, List[int]] = {}
+        for token in name_tokens:
+            counts.setdefault(token, [0, 0])[0] += 1
+        for token in description_tokens:
+            counts.setdefault(token, [0, 0])[1] += 1
+        length = NAME_WEIGHT * len(name_tokens) + DESCRIPTION_WEIGHT * len(description_tokens)
+        new_terms = []
+        for term, (name_tf, description_tf) in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                new_terms.append(term)
+            postings[product_id] = (name_tf, description_tf)
+        self._doc_terms[product_id] = set(counts)
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+        return new_terms
+
+    def remove(self, product_id: int):
+        with self._lock:
+            terms = self._doc_terms.pop(product_id, None)
+            if terms is None:
+                return
+            self._total_length -= self._doc_lengths.pop(product_id)
+            for term in terms:
+                postings = self._postings[term]
+                del postings[product_id]
+                if not postings:
+                    del self._postings[term]
+                    del self._terms[bisect_left(self._terms, term)]
+
+    def _expand(self, prefix: str) -> List[str]:
+        start = bisect_left(self._terms, prefix)
+        end = start
+        while end < len(self._terms) and self._terms[end].startswith(prefix):
+            end += 1
+        return self._terms[start:end]
+
+    def search(self, query: str) -> List[int]:
+        """Return matching product ids, best match first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            expansions = []
+            for token in dict.fromkeys(tokens):
+                terms = self._expand(token)
+                if not terms:
+                    return []
+                expansions.append(terms)
+            # Start from the rarest query term and only filter that candidate
+            # set afterwards, so the work is bounded by the smallest match set
+            # rather than by the postings of common terms.
+            expansions.sort(key=lambda terms: sum(len(self._postings[t]) for t in terms))
+            candidates = set().union(*(self._postings[t] for t in expansions[0]))
+            for terms in expansions[1:]:
+                postings_list = [self._postings[t] for t in terms]
+                candidates = {pid for pid in candidates if any(pid in p for p in postings_list)}
+                if not candidates:
+                    return []
+            doc_count = len(self._doc_terms)
+            avg_length = self._total_length / doc_count if doc_count else 0.0
+            scores = dict.fromkeys(candidates, 0.0)
+            for terms in expansions:
+                for term in terms:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    hits = postings if len(postings) < len(candidates) else candidates
+                    for product_id in hits:
+                        if product_id not in candidates or product_id not in postings:
+                            continue
+                        name_tf, description_tf = postings[product_id]
+                        tf = NAME_WEIGHT * name_tf + DESCRIPTION_WEIGHT * description_tf
+                        norm = 1 - B + B * (self._doc_lengths[product_id] / avg_length if avg_length else 0)
+                        scores[product_id] += idf * tf * (K1 + 1) / (tf + K1 * norm)
+        return sorted(scores, key=lambda pid: (-scores[pid], pid))
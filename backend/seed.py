@@ -0,0 +1,40 @@
+"""Add the sample products to an empty catalog.
+
+Usage: python -m backend.seed [--engine shelve|sqlite|memory] [--path DB_PATH]
+
+The engine and path default to ECOMMERCE_STORE and ECOMMERCE_DB_PATH, as for
+the server. Running it against a catalog that already has products changes
+nothing, so it is safe to repeat in deployment scripts. The shelve and
+memory engines cannot be seeded while the server has them open.
+"""
+import argparse
+import os
+
+from .models import ProductCreate
+from .stores import ENGINES, create_store
+
+SAMPLE_PRODUCTS = [
+    ProductCreate(name="Sample Phone", price=299.99, description="A great phone."),
+    ProductCreate(name="Sample Laptop", price=899.99, description="A powerful laptop."),
+    ProductCreate(name="Sample Headphones", price=99.99, description="Noise-cancelling headphones."),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", default=os.environ.get("ECOMMERCE_STORE", "shelve"), choices=sorted(ENGINES))
+    parser.add_argument("--path", default=os.environ.get("ECOMMERCE_DB_PATH"))
+    args = parser.parse_args(argv)
+    store = create_store(args.engine, args.path)
+    try:
+        added = store.seed_products(SAMPLE_PRODUCTS)
+    finally:
+        store.close()
+    if added:
+        print(f"added {len(added)} sample products")
+    else:
+        print("catalog already has products; nothing added")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+# Resolved tokens are trusted for this many seconds before the store is asked
+# again; unknown tokens are remembered for NEGATIVE_TTL seconds.
+CACHE_TTL = float(os.environ.get('ECOMMERCE_SESSION_CACHE_TTL', '60'))
+NEGATIVE_TTL = float(os.environ.get('ECOMMERCE_SESSION_NEGATIVE_TTL', '30'))
+CACHE_SIZE = int(os.environ.get('ECOMMERCE_SESSION_CACHE_SIZE', '10000'))
+
+MISS = object()
+
+
+class SessionCache:
+    """In-process LRU cache of session token -> username.
+
+    ``None`` is cached for tokens the store does not know, so repeated
+    requests with a bad token do not reach the store either. Entries expire
+    after ``ttl`` (or ``negative_ttl``) seconds, or when the session itself
+    expires if that is sooner, and the least recently used entry is evicted
+    once ``max_size`` is reached. Expired sessions are therefore never served
+    from the cache, whether or not the store has purged them yet.
+    """
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL,
+                 negative_ttl: float = NEGATIVE_TTL, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str):
+        """Return the cached username, None for a known-bad token, or MISS."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return MISS
+            username, expires = entry
+            if expires <= self._clock():
+                del self._entries[token]
+                return MISS
+            self._entries.move_to_end(token)
+            return username
+
+    def put(self, token: str, username: Optional[str], expires_at: Optional[datetime] = None):
+        ttl = self.ttl if username is not None else self.negative_ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at.timestamp() - time.time())
+        with self._lock:
+            self._entries[token] = (username, self._clock() + ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def sweep(self) -> int:
+        """Drop expired entries; returns how many were removed."""
+        now = self._clock()
+        with self._lock:
+            expired = [token for token, (_, expires) in self._entries.items() if expires <= now]
+            for token in expired:
+                del self._entries[token]
+        return len(expired)
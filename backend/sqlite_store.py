@@ -0,0 +1,647 @@
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from .base_store import BaseStore, InsufficientStock, check_quantities
+from .changes import ORDER, PRODUCT, change_feed
+from .checkout import Quote, order_items, price_cart, quote_model, with_report
+from .pagination import (
+    check_sort, decode_cursor, decode_order_cursor, encode_cursor, encode_order_cursor, name_key, sort_value
+)
+from .metrics import STORE_IO
+from .models import (
+    Product, ProductCreate, Cart, CartQuote, ChangeFeed, Order, OrderItem, User, SessionToken, CartItem, CartItemCreate,
+    StockLevel
+)
+from .search_index import DESCRIPTION_WEIGHT, NAME_WEIGHT, tokenize
+
+SQLITE_PATH = 'ecommerce.sqlite3'
+
+_OPEN = STORE_IO.labels('sqlite', 'open')
+_SYNC = STORE_IO.labels('sqlite', 'sync')
+
+SCHEMA = """
+-- name_key is pagination.name_key(name), written by the store: SQLite's
+-- lower() only folds ASCII, so sorting by it would disagree with cursors.
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    description TEXT NOT NULL,
+    name_key TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_products_price ON products(price, id);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions(username);
+CREATE TABLE IF NOT EXISTS cart_items (
+    user_id TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL,
+    PRIMARY KEY (user_id, product_id)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    total REAL NOT NULL,
+    created_at TEXT NOT NULL,
+    paid INTEGER NOT NULL
+);
+-- Every index entry ends with the rowid (= orders.id, in creation order), so
+-- order history pages walk this index backwards without sorting.
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id);
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
+-- Products without a row here do not track stock.
+CREATE TABLE IF NOT EXISTS stock (
+    product_id INTEGER PRIMARY KEY,
+    on_hand INTEGER NOT NULL
+);
+-- Units set aside by carts; a hold stops counting once expires_at passes.
+CREATE TABLE IF NOT EXISTS stock_holds (
+    user_id TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (user_id, product_id)
+);
+CREATE INDEX IF NOT EXISTS idx_stock_holds_product ON stock_holds(product_id, expires_at);
+-- Product and order changes, numbered in commit order: the triggers below
+-- write them inside the transaction that makes the change, and write
+-- transactions never overlap.
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,
+    action TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    at REAL NOT NULL  -- unix time
+);
+CREATE INDEX IF NOT EXISTS idx_changes_entity ON changes(entity, seq);
+CREATE TRIGGER IF NOT EXISTS products_change_insert AFTER INSERT ON products BEGIN
+    INSERT INTO changes (entity, action, entity_id, at)
+    VALUES ('product', 'created', new.id, (julianday('now') - 2440587.5) * 86400.0);
+END;
+CREATE TRIGGER IF NOT EXISTS products_change_update AFTER UPDATE ON products BEGIN
+    INSERT INTO changes (entity, action, entity_id, at)
+    VALUES ('product', 'updated', new.id, (julianday('now') - 2440587.5) * 86400.0);
+END;
+CREATE TRIGGER IF NOT EXISTS products_change_delete AFTER DELETE ON products BEGIN
+    INSERT INTO changes (entity, action, entity_id, at)
+    VALUES ('product', 'deleted', old.id, (julianday('now') - 2440587.5) * 86400.0);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_change_insert AFTER INSERT ON orders BEGIN
+    INSERT INTO changes (entity, action, entity_id, at)
+    VALUES ('order', 'created', new.id, (julianday('now') - 2440587.5) * 86400.0);
+END;
+"""
+
+# Full-text index over products, kept in sync by triggers. Created separately
+# so an existing database gets it built from its current rows once.
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, description, content='products', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts (products_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN "
+    "INSERT INTO products_fts (products_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+]
+
+# Statements are kept as fixed strings so sqlite3's per-connection statement
+# cache prepares each of them once and reuses the compiled form.
+SQL_SEARCH_PRODUCTS = (
+    "SELECT p.id, p.name, p.price, p.description FROM products_fts f "
+    "JOIN products p ON p.id = f.rowid WHERE products_fts MATCH ? "
+    f"ORDER BY bm25(products_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), p.id"
+)
+SQL_HAS_FTS = "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'"
+SQL_INSERT_USER = "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)"
+SQL_GET_USER = "SELECT username, password, role FROM users WHERE username = ?"
+SQL_INSERT_SESSION = "INSERT INTO sessions (token, username, expires_at) VALUES (?, ?, ?)"
+SQL_USER_BY_TOKEN = (
+    "SELECT u.username, u.password, u.role FROM sessions s "
+    "JOIN users u ON u.username = s.username WHERE s.token = ? AND s.expires_at > ?"
+)
+SQL_SESSION_BY_TOKEN = (
+    "SELECT s.token, s.username, u.role, s.expires_at FROM sessions s "
+    "JOIN users u ON u.username = s.username WHERE s.token = ? AND s.expires_at > ?"
+)
+SQL_PURGE_SESSIONS = "DELETE FROM sessions WHERE expires_at IS NULL OR expires_at <= ?"
+SQL_SESSION_COLUMNS = "SELECT name FROM pragma_table_info('sessions')"
+SQL_PRODUCT_COLUMNS = "SELECT name FROM pragma_table_info('products')"
+SQL_PRODUCT_UPDATE_TRIGGERS = (
+    "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'products' "
+    "AND sql LIKE '%AFTER UPDATE ON products%'"
+)
+SQL_INSERT_PRODUCT = "INSERT INTO products (name, price, description, name_key) VALUES (?, ?, ?, ?)"
+SQL_GET_PRODUCT = "SELECT id, name, price, description FROM products WHERE id = ?"
+SQL_ANY_PRODUCT = "SELECT 1 FROM products LIMIT 1"
+SQL_ALL_PRODUCTS = "SELECT id, name, price, description FROM products ORDER BY id"
+# Sort keys map onto the columns/expressions covered by the product indexes.
+SORT_COLUMNS = {'id': 'id', 'price': 'price', 'name': 'name_key'}
+SQL_UPDATE_PRODUCT = "UPDATE products SET name = ?, price = ?, description = ?, name_key = ? WHERE id = ?"
+SQL_DELETE_PRODUCT = "DELETE FROM products WHERE id = ?"
+SQL_CART_COLUMNS = "SELECT name FROM pragma_table_info('cart_items')"
+SQL_CART_ITEMS = "SELECT product_id, quantity, price FROM cart_items WHERE user_id = ? ORDER BY rowid"
+# The line keeps the product's price as of this add, for repricing reports.
+SQL_ADD_CART_ITEM = (
+    "INSERT INTO cart_items (user_id, product_id, quantity, price) "
+    "SELECT ?, id, ?, price FROM products WHERE id = ? "
+    "ON CONFLICT (user_id, product_id) DO UPDATE SET "
+    "quantity = quantity + excluded.quantity, price = excluded.price"
+)
+SQL_REMOVE_CART_ITEM = "DELETE FROM cart_items WHERE user_id = ? AND product_id = ?"
+SQL_CLEAR_CART = "DELETE FROM cart_items WHERE user_id = ?"
+# Every cart line with its product's current name and price (NULL if gone).
+SQL_CHECKOUT_LINES = (
+    "SELECT c.product_id, c.quantity, c.price, p.name, p.price FROM cart_items c "
+    "LEFT JOIN products p ON p.id = c.product_id WHERE c.user_id = ? ORDER BY c.rowid"
+)
+SQL_GET_STOCK = "SELECT on_hand FROM stock WHERE product_id = ?"
+SQL_SET_STOCK = (
+    "INSERT INTO stock (product_id, on_hand) VALUES (?, ?) "
+    "ON CONFLICT (product_id) DO UPDATE SET on_hand = excluded.on_hand"
+)
+SQL_DELETE_STOCK = "DELETE FROM stock WHERE product_id = ?"
+SQL_HELD = "SELECT COALESCE(SUM(quantity), 0) FROM stock_holds WHERE product_id = ? AND expires_at > ?"
+SQL_AVAILABLE = (
+    "SELECT s.on_hand - COALESCE((SELECT SUM(h.quantity) FROM stock_holds h "
+    "WHERE h.product_id = s.product_id AND h.expires_at > ?), 0) FROM stock s WHERE s.product_id = ?"
+)
+# An expired hold is replaced rather than topped up.
+SQL_ADD_HOLD = (
+    "INSERT INTO stock_holds (user_id, product_id, quantity, expires_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (user_id, product_id) DO UPDATE SET "
+    "quantity = CASE WHEN expires_at > ? THEN quantity ELSE 0 END + excluded.quantity, "
+    "expires_at = excluded.expires_at"
+)
+SQL_REMOVE_HOLD = "DELETE FROM stock_holds WHERE user_id = ? AND product_id = ?"
+SQL_CLEAR_HOLDS = "DELETE FROM stock_holds WHERE user_id = ?"
+SQL_DELETE_PRODUCT_HOLDS = "DELETE FROM stock_holds WHERE product_id = ?"
+SQL_PURGE_HOLDS = "DELETE FROM stock_holds WHERE expires_at <= ?"
+# Per tracked cart line: quantity and what is left for this user once other
+# carts' live holds are set aside.
+SQL_CHECKOUT_STOCK = (
+    "SELECT c.product_id, c.quantity, s.on_hand - COALESCE((SELECT SUM(h.quantity) FROM stock_holds h "
+    "WHERE h.product_id = c.product_id AND h.user_id != ? AND h.expires_at > ?), 0) "
+    "FROM cart_items c JOIN stock s ON s.product_id = c.product_id WHERE c.user_id = ?"
+)
+SQL_DEDUCT_STOCK = "UPDATE stock SET on_hand = on_hand - ? WHERE product_id = ?"
+SQL_INSERT_ORDER = "INSERT INTO orders (user_id, total, created_at, paid) VALUES (?, ?, ?, ?)"
+SQL_INSERT_ORDER_ITEM = (
+    "INSERT INTO order_items (order_id, product_id, name, price, quantity) VALUES (?, ?, ?, ?, ?)"
+)
+SQL_GET_ORDER = "SELECT id, total, created_at, paid, user_id FROM orders WHERE id = ?"
+# Upper bound for the first page of order history.
+MAX_ROWID = 2 ** 63 - 1
+SQL_USER_ORDERS = (
+    "SELECT id, total, created_at, paid, user_id FROM orders WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?"
+)
+SQL_CHANGES = "SELECT seq, entity, action, entity_id, at FROM changes WHERE seq > ? ORDER BY seq LIMIT ?"
+SQL_LAST_PRODUCT_CHANGE = "SELECT coalesce(max(seq), 0) FROM changes WHERE entity = 'product'"
+SQL_ORDER_ITEMS = (
+    "SELECT product_id, name, price, quantity FROM order_items WHERE order_id = ? ORDER BY rowid"
+)
+
+
+def _products_by_id(conn, ids) -> Dict[int, Product]:
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" * len(ids))
+    rows = conn.execute(f"SELECT id, name, price, description FROM products WHERE id IN ({placeholders})", list(ids))
+    return {row[0]: _product(row) for row in rows}
+
+
+def _product(row) -> Product:
+    return Product(id=row[0], name=row[1], price=row[2], description=row[3])
+
+
+def _page_sql(sort: str, descending: bool, after: bool, min_price: bool, max_price: bool) -> str:
+    # Only a handful of distinct strings come out of this, so each one is
+    # still prepared once per connection by the statement cache.
+    # A price range with sort=price is a range scan of idx_products_price.
+    # With another sort key SQLite either walks that key's index skipping
+    # rows outside the range or sorts every row in it, so a page can cost
+    # up to a scan of the catalog.
+    column = SORT_COLUMNS[sort]
+    where = []
+    if after:
+        where.append(f"({column}, id) {'<' if descending else '>'} (?, ?)")
+    if min_price:
+        where.append("price >= ?")
+    if max_price:
+        where.append("price <= ?")
+    direction = "DESC" if descending else "ASC"
+    sql = "SELECT id, name, price, description FROM products"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + f" ORDER BY {column} {direction}, id {direction} LIMIT ?"
+
+
+class SQLiteStore(BaseStore):
+    """Store backed by SQLite in WAL mode.
+
+    Each thread gets its own connection, and WAL lets any number of readers
+    run alongside one writer, so several uvicorn worker processes can share
+    the same database file.
+    """
+
+    shared = True
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.open()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            started = time.perf_counter()
+            conn = sqlite3.connect(
+                self.path,
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=128,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _OPEN.observe(time.perf_counter() - started)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        started = time.perf_counter()
+        conn.execute("COMMIT")
+        _SYNC.observe(time.perf_counter() - started)
+
+    def open(self):
+        self._conn().executescript(SCHEMA)
+        with self._transaction() as conn:
+            # Databases created before sessions expired lack the column.
+            columns = {row[0] for row in conn.execute(SQL_SESSION_COLUMNS)}
+            if 'expires_at' not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN expires_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+            # ...and carts from before lines kept their price.
+            if 'price' not in {row[0] for row in conn.execute(SQL_CART_COLUMNS)}:
+                conn.execute("ALTER TABLE cart_items ADD COLUMN price REAL")
+            # ...and products from before names had a sort key.
+            if 'name_key' not in {row[0] for row in conn.execute(SQL_PRODUCT_COLUMNS)}:
+                self._add_name_keys(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_products_name_key ON products(name_key, id)")
+            if not conn.execute(SQL_HAS_FTS).fetchone():
+                for statement in FTS_SCHEMA:
+                    conn.execute(statement)
+
+    def _add_name_keys(self, conn):
+        conn.execute("ALTER TABLE products ADD COLUMN name_key TEXT NOT NULL DEFAULT ''")
+        conn.execute("DROP INDEX IF EXISTS idx_products_name")
+        # Filling the column is not a product update: keep it out of the
+        # change feed and the search index while it runs.
+        triggers = conn.execute(SQL_PRODUCT_UPDATE_TRIGGERS).fetchall()
+        for trigger, _ in triggers:
+            conn.execute(f"DROP TRIGGER {trigger}")
+        rows = conn.execute("SELECT id, name FROM products").fetchall()
+        conn.executemany("UPDATE products SET name_key = ? WHERE id = ?",
+                         [(name_key(name), product_id) for product_id, name in rows])
+        for _, sql in triggers:
+            conn.execute(sql)
+
+    def flush(self):
+        # Every write commits its own transaction; fold the WAL back into the
+        # main database file so readers of the file see a compact copy.
+        self._conn().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def search_products(self, query: str) -> List[Product]:
+        # Same semantics as SearchIndex: every term is a prefix and all of
+        # them must match; bm25() weights name hits above description hits.
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = " AND ".join(f'"{token}"*' for token in tokens)
+        rows = self._conn().execute(SQL_SEARCH_PRODUCTS, (match,))
+        return [_product(row) for row in rows]
+
+    def signup(self, username: str, password: str, role: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(SQL_INSERT_USER, (username, password, role))
+            return cursor.rowcount == 1
+
+    def login(self, username: str, password: str) -> Optional[SessionToken]:
+        row = self._conn().execute(SQL_GET_USER, (username,)).fetchone()
+        if not row or row[1] != password:
+            return None
+        token = secrets.token_hex(16)
+        expires = time.time() + self.session_ttl
+        with self._transaction() as conn:
+            conn.execute(SQL_INSERT_SESSION, (token, username, expires))
+        return SessionToken(
+            token=token,
+            username=username,
+            role=row[2],
+            expires_at=datetime.fromtimestamp(expires)
+        )
+
+    def get_user_by_token(self, token: str) -> Optional[User]:
+        row = self._conn().execute(SQL_USER_BY_TOKEN, (token, time.time())).fetchone()
+        if not row:
+            return None
+        return User(username=row[0], password=row[1], role=row[2])
+
+    def get_session(self, token: str) -> Optional[SessionToken]:
+        row = self._conn().execute(SQL_SESSION_BY_TOKEN, (token, time.time())).fetchone()
+        if not row:
+            return None
+        return SessionToken(
+            token=row[0],
+            username=row[1],
+            role=row[2],
+            expires_at=datetime.fromtimestamp(row[3])
+        )
+
+    def purge_expired_sessions(self) -> int:
+        with self._transaction() as conn:
+            return conn.execute(SQL_PURGE_SESSIONS, (time.time(),)).rowcount
+
+    def add_product(self, name: str, price: float, description: str, stock: Optional[int] = None) -> Product:
+        with self._transaction() as conn:
+            cursor = conn.execute(SQL_INSERT_PRODUCT, (name, price, description, name_key(name)))
+            if stock is not None:
+                conn.execute(SQL_SET_STOCK, (cursor.lastrowid, stock))
+        return Product(id=cursor.lastrowid, name=name, price=price, description=description)
+
+    def add_products(self, products: List[ProductCreate]) -> List[Product]:
+        with self._transaction() as conn:
+            return self._insert_products(conn, products)
+
+    def _insert_products(self, conn, products: List[ProductCreate]) -> List[Product]:
+        created = []
+        for p in products:
+            cursor = conn.execute(SQL_INSERT_PRODUCT, (p.name, p.price, p.description, name_key(p.name)))
+            if p.stock is not None:
+                conn.execute(SQL_SET_STOCK, (cursor.lastrowid, p.stock))
+            created.append(Product(id=cursor.lastrowid, name=p.name, price=p.price, description=p.description))
+        return created
+
+    def seed_products(self, products: List[ProductCreate]) -> List[Product]:
+        # BEGIN IMMEDIATE takes the write lock before the check, so a second
+        # process seeding at the same time waits and then finds products.
+        with self._transaction() as conn:
+            if conn.execute(SQL_ANY_PRODUCT).fetchone():
+                return []
+            return self._insert_products(conn, products)
+
+    def get_product(self, product_id: int) -> Optional[Product]:
+        row = self._conn().execute(SQL_GET_PRODUCT, (product_id,)).fetchone()
+        return _product(row) if row else None
+
+    def get_all_products(self) -> List[Product]:
+        return [_product(row) for row in self._conn().execute(SQL_ALL_PRODUCTS)]
+
+    def list_products(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                      sort: str = 'id', descending: bool = False,
+                      min_price: Optional[float] = None,
+                      max_price: Optional[float] = None) -> Tuple[List[Product], Optional[str]]:
+        check_sort(sort)
+        after = decode_cursor(cursor, sort, descending) if cursor else None
+        params = []
+        if after is not None:
+            params.extend(after)
+        if min_price is not None:
+            params.append(min_price)
+        if max_price is not None:
+            params.append(max_price)
+        # Fetch one extra row to learn whether another page follows.
+        params.append(-1 if limit is None else limit + 1)
+        sql = _page_sql(sort, descending, after is not None, min_price is not None, max_price is not None)
+        products = [_product(row) for row in self._conn().execute(sql, params)]
+        next_cursor = None
+        if limit is not None and len(products) > limit:
+            del products[limit:]
+            if products:
+                last = products[-1]
+                next_cursor = encode_cursor(sort, descending, sort_value(sort, last), last.id)
+        return products, next_cursor
+
+    def update_product(self, product_id: int, **kwargs) -> Optional[Product]:
+        with self._transaction() as conn:
+            row = conn.execute(SQL_GET_PRODUCT, (product_id,)).fetchone()
+            if not row:
+                return None
+            product = _product(row)
+            for key, value in kwargs.items():
+                if value is not None:
+                    setattr(product, key, value)
+            conn.execute(SQL_UPDATE_PRODUCT, (product.name, product.price, product.description,
+                                              name_key(product.name), product_id))
+        return product
+
+    def delete_product(self, product_id: int) -> bool:
+        with self._transaction() as conn:
+            if conn.execute(SQL_DELETE_PRODUCT, (product_id,)).rowcount != 1:
+                return False
+            conn.execute(SQL_DELETE_STOCK, (product_id,))
+            conn.execute(SQL_DELETE_PRODUCT_HOLDS, (product_id,))
+            return True
+
+    def _stock_level(self, conn, product_id: int) -> StockLevel:
+        row = conn.execute(SQL_GET_STOCK, (product_id,)).fetchone()
+        if not row:
+            return StockLevel(product_id=product_id, stock=None)
+        held = conn.execute(SQL_HELD, (product_id, time.time())).fetchone()[0]
+        return StockLevel(product_id=product_id, stock=row[0], reserved=held, available=row[0] - held)
+
+    def get_stock(self, product_id: int) -> Optional[StockLevel]:
+        conn = self._conn()
+        if not conn.execute(SQL_GET_PRODUCT, (product_id,)).fetchone():
+            return None
+        return self._stock_level(conn, product_id)
+
+    def set_stock(self, product_id: int, stock: Optional[int]) -> Optional[StockLevel]:
+        with self._transaction() as conn:
+            if not conn.execute(SQL_GET_PRODUCT, (product_id,)).fetchone():
+                return None
+            if stock is None:
+                conn.execute(SQL_DELETE_STOCK, (product_id,))
+                conn.execute(SQL_DELETE_PRODUCT_HOLDS, (product_id,))
+            else:
+                if stock < conn.execute(SQL_HELD, (product_id, time.time())).fetchone()[0]:
+                    raise ValueError("Stock cannot be set below the units held in carts")
+                conn.execute(SQL_SET_STOCK, (product_id, stock))
+            return self._stock_level(conn, product_id)
+
+    def release_expired_holds(self) -> int:
+        with self._transaction() as conn:
+            return conn.execute(SQL_PURGE_HOLDS, (time.time(),)).rowcount
+
+    def _reserve(self, conn, user_id: str, wanted: Dict[int, int]):
+        # Runs inside the caller's write transaction, so the availability
+        # check and the hold cannot be interleaved with another writer.
+        check_quantities(wanted.values())
+        now = time.time()
+        expires = now + self.hold_ttl
+        holds = []
+        short = []
+        for pid, quantity in wanted.items():
+            row = conn.execute(SQL_AVAILABLE, (now, pid)).fetchone()
+            if not row:
+                continue
+            if row[0] < quantity:
+                short.append(pid)
+            holds.append((user_id, pid, quantity, expires, now))
+        if short:
+            raise InsufficientStock(short)
+        conn.executemany(SQL_ADD_HOLD, holds)
+
+    def get_cart(self, user_id: str) -> Cart:
+        rows = self._conn().execute(SQL_CART_ITEMS, (user_id,))
+        return Cart(items=[CartItem(product_id=row[0], quantity=row[1], price=row[2]) for row in rows])
+
+    def add_to_cart(self, user_id: str, product_id: int, quantity: int = 1) -> bool:
+        check_quantities([quantity])
+        with self._transaction() as conn:
+            if not conn.execute(SQL_GET_PRODUCT, (product_id,)).fetchone():
+                return False
+            self._reserve(conn, user_id, {product_id: quantity})
+            conn.execute(SQL_ADD_CART_ITEM, (user_id, quantity, product_id))
+        return True
+
+    def add_to_cart_many(self, user_id: str, items: List[CartItemCreate]) -> List[int]:
+        check_quantities(item.quantity for item in items)
+        with self._transaction() as conn:
+            missing = [
+                item.product_id for item in items
+                if not conn.execute(SQL_GET_PRODUCT, (item.product_id,)).fetchone()
+            ]
+            if missing:
+                return missing
+            wanted: Dict[int, int] = {}
+            for item in items:
+                wanted[item.product_id] = wanted.get(item.product_id, 0) + item.quantity
+            self._reserve(conn, user_id, wanted)
+            conn.executemany(SQL_ADD_CART_ITEM, [(user_id, item.quantity, item.product_id) for item in items])
+        return []
+
+    def remove_from_cart(self, user_id: str, product_id: int) -> bool:
+        with self._transaction() as conn:
+            conn.execute(SQL_REMOVE_CART_ITEM, (user_id, product_id))
+            conn.execute(SQL_REMOVE_HOLD, (user_id, product_id))
+        return True
+
+    def _quote(self, conn, user_id: str) -> Quote:
+        rows = conn.execute(SQL_CHECKOUT_LINES, (user_id,)).fetchall()
+        catalog = {row[0]: (row[3], row[4]) for row in rows if row[3] is not None}
+        return price_cart(((row[0], row[1], row[2]) for row in rows), catalog)
+
+    def quote_cart(self, user_id: str) -> CartQuote:
+        return quote_model(self._quote(self._conn(), user_id))
+
+    def checkout(self, user_id: str) -> Optional[Order]:
+        with self._transaction() as conn:
+            quote = self._quote(conn, user_id)
+            if not quote.lines:
+                return None
+            # The user's own holds are part of what is left for them, so a
+            # line only fails if its hold lapsed and others took the stock.
+            stock_lines = conn.execute(SQL_CHECKOUT_STOCK, (user_id, time.time(), user_id)).fetchall()
+            short = [pid for pid, quantity, left in stock_lines if left < quantity]
+            if short:
+                raise InsufficientStock(short)
+            conn.executemany(SQL_DEDUCT_STOCK, [(quantity, pid) for pid, quantity, _ in stock_lines])
+            conn.execute(SQL_CLEAR_HOLDS, (user_id,))
+            created_at = datetime.now()
+            cursor = conn.execute(SQL_INSERT_ORDER, (user_id, quote.total, created_at.isoformat(), 1))
+            oid = cursor.lastrowid
+            conn.executemany(SQL_INSERT_ORDER_ITEM, [(oid, *line) for line in quote.lines])
+            conn.execute(SQL_CLEAR_CART, (user_id,))
+        order = Order(id=oid, items=order_items(quote), total=quote.total, created_at=created_at, paid=True,
+                      user_id=user_id)
+        return with_report(order, quote)
+
+    def _order(self, conn, row) -> Order:
+        items = [
+            OrderItem(product_id=r[0], name=r[1], price=r[2], quantity=r[3])
+            for r in conn.execute(SQL_ORDER_ITEMS, (row[0],))
+        ]
+        return Order(
+            id=row[0],
+            items=items,
+            total=row[1],
+            created_at=datetime.fromisoformat(row[2]),
+            paid=bool(row[3]),
+            user_id=row[4]
+        )
+
+    def get_order(self, order_id: int) -> Optional[Order]:
+        conn = self._conn()
+        row = conn.execute(SQL_GET_ORDER, (order_id,)).fetchone()
+        return self._order(conn, row) if row else None
+
+    def last_product_change(self) -> int:
+        return self._conn().execute(SQL_LAST_PRODUCT_CHANGE).fetchone()[0]
+
+    def changes(self, since: int = 0, limit: int = 100) -> ChangeFeed:
+        conn = self._conn()
+        rows = conn.execute(SQL_CHANGES, (since, limit)).fetchall()
+        products = _products_by_id(conn, {row[3] for row in rows if row[1] == PRODUCT})
+        orders = {}
+        for oid in {row[3] for row in rows if row[1] == ORDER}:
+            row = conn.execute(SQL_GET_ORDER, (oid,)).fetchone()
+            if row:
+                orders[oid] = self._order(conn, row)
+        return change_feed(
+            ((seq, entity, action, entity_id, datetime.fromtimestamp(at))
+             for seq, entity, action, entity_id, at in rows), since, products, orders
+        )
+
+    def list_orders(self, user_id: str, limit: int = 20,
+                    cursor: Optional[str] = None) -> Tuple[List[Order], Optional[str]]:
+        before = decode_order_cursor(cursor) if cursor else MAX_ROWID
+        conn = self._conn()
+        rows = conn.execute(SQL_USER_ORDERS, (user_id, before, limit + 1)).fetchall()
+        orders = [self._order(conn, row) for row in rows[:limit]]
+        next_cursor = encode_order_cursor(orders[-1].id) if len(rows) > limit else None
+        return orders, next_cursor
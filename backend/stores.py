@@ -0,0 +1,23 @@
+from typing import Optional, Type
+from .base_store import BaseStore
+from .inmemory_store import InMemoryStore
+from .memory_store import MemoryStore
+from .sqlite_store import SQLiteStore
+
+ENGINES = {
+    'shelve': MemoryStore,
+    'sqlite': SQLiteStore,
+    'memory': InMemoryStore,
+}
+
+
+def engine_class(engine: str) -> Type[BaseStore]:
+    try:
+        return ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown store engine {engine!r}, expected one of {sorted(ENGINES)}") from None
+
+
+def create_store(engine: str = 'shelve', path: Optional[str] = None) -> BaseStore:
+    store_cls = engine_class(engine)
+    return store_cls(path) if path else store_cls()
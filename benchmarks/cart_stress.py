@@ -0,0 +1,101 @@
+"""Multi-threaded cart/checkout stress test for the store engines.
+
+Many threads add items to carts and check out concurrently, several threads
+per user. Afterwards every unit added must be found in exactly one place:
+in an order returned by checkout() or in the user's remaining cart. Order
+ids must be unique. Exits with status 1 if an update was lost.
+
+Usage: python -m benchmarks.cart_stress [--engines shelve sqlite memory]
+                                        [--users 16] [--threads-per-user 4]
+                                        [--ops 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from backend.stores import ENGINES, create_store
+
+
+def run_engine(engine, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = create_store(engine, os.path.join(tmp, "stress_db"))
+        try:
+            product_ids = [store.add_product(f"Stress {i}", 1.0, "stress").id for i in range(args.products)]
+            users = [f"user{i}" for i in range(args.users)]
+            added = Counter()
+            orders = []
+            record_lock = threading.Lock()
+            start = threading.Barrier(args.users * args.threads_per_user)
+
+            def worker(user, seed):
+                rnd = random.Random(seed)
+                local_added = 0
+                local_orders = []
+                start.wait()
+                for _ in range(args.ops):
+                    if rnd.random() < args.checkout_ratio:
+                        order = store.checkout(user)
+                        if order is not None:
+                            local_orders.append((user, order))
+                    else:
+                        store.add_to_cart(user, rnd.choice(product_ids), 1)
+                        local_added += 1
+                with record_lock:
+                    added[user] += local_added
+                    orders.extend(local_orders)
+
+            threads = [
+                threading.Thread(target=worker, args=(user, n * 1000 + t))
+                for n, user in enumerate(users)
+                for t in range(args.threads_per_user)
+            ]
+            began = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+
+            errors = []
+            ordered = Counter()
+            for user, order in orders:
+                ordered[user] += sum(item.quantity for item in order.items)
+            for user in users:
+                in_cart = sum(item.quantity for item in store.get_cart(user).items)
+                if ordered[user] + in_cart != added[user]:
+                    errors.append(f"{user}: added {added[user]}, ordered {ordered[user]}, in cart {in_cart}")
+            order_ids = [order.id for _, order in orders]
+            if len(order_ids) != len(set(order_ids)):
+                errors.append(f"duplicate order ids: {len(order_ids) - len(set(order_ids))}")
+        finally:
+            store.close()
+
+    total_ops = len(threads) * args.ops
+    status = "OK" if not errors else "FAILED"
+    print(f"{engine:<8} {status:<7} {total_ops} ops in {elapsed:.2f}s ({total_ops / elapsed:,.0f} ops/s), "
+          f"{len(orders)} orders")
+    for error in errors[:10]:
+        print(f"    {error}")
+    return not errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engines", nargs="+", default=sorted(ENGINES), choices=sorted(ENGINES))
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--threads-per-user", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--checkout-ratio", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    ok = all([run_engine(engine, args) for engine in args.engines])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Helpers shared by the benchmark scripts: latency stats, baselines, servers."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A change counts as a regression when throughput drops, or p95/p99 latency
+# grows, by more than this fraction.
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(latencies, elapsed):
+    """Stats for one operation from per-call latencies in seconds."""
+    ms = sorted(lat * 1000 for lat in latencies)
+    return {
+        "count": len(ms),
+        "ops_per_s": len(ms) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(ms) / len(ms),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+    }
+
+
+def print_results(results):
+    width = max(len(name) for name in results) + 2
+    print(f"{'':<{width}}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<{width}}{stats['ops_per_s']:>12,.1f}{stats['p50_ms']:>10.3f}"
+              f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+
+def save_baseline(path, benchmark, args, results):
+    report = {
+        "benchmark": benchmark,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"saved {path}")
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, results, threshold=REGRESSION_THRESHOLD):
+    """Print each shared result next to the baseline; return the regressions."""
+    regressions = []
+    old_results = baseline["results"]
+    width = max([len(name) for name in results] + [10]) + 2
+    print(f"compared with baseline from {baseline.get('created', '?')}")
+    print(f"{'':<{width}}{'ops/s':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in results.items():
+        old = old_results.get(name)
+        if old is None:
+            continue
+        throughput = stats["ops_per_s"] / old["ops_per_s"] - 1 if old["ops_per_s"] else 0.0
+        p95 = stats["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        p99 = stats["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0
+        worse = throughput < -threshold or p95 > threshold or p99 > threshold
+        if worse:
+            regressions.append(name)
+        print(f"{name:<{width}}{throughput:>+10.1%}{p95:>+10.1%}{p99:>+10.1%}{'  REGRESSION' if worse else ''}")
+    missing = len(set(old_results) - set(results))
+    if missing:
+        print(f"{missing} baseline result(s) not measured this run")
+    return regressions
+
+
+def add_baseline_args(parser):
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative change that counts as a regression (default 0.10)")
+
+
+def finish(benchmark, args, results):
+    """Save and/or compare results as requested; exits 1 on a regression."""
+    if args.save:
+        save_baseline(args.save, benchmark, args, results)
+    if args.compare:
+        regressions = compare(load_baseline(args.compare), results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+def wait_until_up(base_url, timeout=30.0):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{base_url}/", timeout=1).raise_for_status()
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+def start_server(port, engine, db_path, workers=1, **env):
+    """Run backend.main under uvicorn; extra keyword arguments become env vars."""
+    env = dict(os.environ, ECOMMERCE_STORE=engine, ECOMMERCE_DB_PATH=db_path, ECOMMERCE_WORKERS=str(workers),
+               **{name: str(value) for name, value in env.items()})
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning",
+         "--workers", str(workers)],
+        cwd=ROOT, env=env,
+    )
@@ -0,0 +1,68 @@
+"""Size and CPU cost of the response encodings for a page of products.
+
+Serializes the same list of ``Product`` models the way FastAPI does by
+default (``jsonable_encoder`` + ``json.dumps``), with ``dump_json`` (orjson
+when installed) and as MessagePack, then compresses each with gzip and
+brotli. Reports bytes on the wire and encode/decode rates per page; the
+MessagePack and brotli rows are skipped when those packages are missing.
+
+Usage: python -m benchmarks.encodings [--products 1000] [--rounds 200]
+"""
+import argparse
+import gzip
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from backend import encoding
+from backend.http_cache import dump_json
+from backend.models import Product
+
+
+def fastapi_json(products):
+    return json.dumps(jsonable_encoder(products), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def rate(fn, arg, rounds):
+    began = time.perf_counter()
+    for _ in range(rounds):
+        out = fn(arg)
+    return out, rounds / (time.perf_counter() - began)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000, help="products per page")
+    parser.add_argument("--rounds", type=int, default=200, help="times each page is encoded and decoded")
+    args = parser.parse_args(argv)
+
+    products = [Product(id=i + 1, name=f"Product {i}", price=round(1 + (i % 5000) * 0.37, 2),
+                        description=f"Description of product number {i}") for i in range(args.products)]
+    formats = [("fastapi json", fastapi_json, json.loads), ("dump_json", dump_json, json.loads)]
+    if encoding.msgpack is not None:
+        formats.append(("msgpack", lambda p: encoding.encode(p, encoding.MSGPACK), encoding.msgpack.unpackb))
+    compressions = [("", None, None), ("+gzip", "gzip", gzip.decompress)]
+    if encoding.brotli is not None:
+        compressions.append(("+br", "br", encoding.brotli.decompress))
+
+    print(f"{args.products:,} products per page, {args.rounds} rounds")
+    print(f"{'':<20}{'bytes':>12}{'encode/s':>12}{'decode/s':>12}")
+    for label, dump, load in formats:
+        body, dump_rate = rate(dump, products, args.rounds)
+        _, load_rate = rate(load, body, args.rounds)
+        for suffix, name, decompress in compressions:
+            if name is None:
+                print(f"{label:<20}{len(body):>12,}{dump_rate:>12,.1f}{load_rate:>12,.1f}")
+                continue
+            packed, pack_rate = rate(lambda b: encoding.compress(b, name), body, args.rounds)
+            _, unpack_rate = rate(decompress, packed, args.rounds)
+            # Compression runs once per cached variant on the server, so it
+            # is shown on its own rather than added to every request.
+            print(f"{label + suffix:<20}{len(packed):>12,}{pack_rate:>12,.1f}{unpack_rate:>12,.1f}")
+    if encoding.msgpack is None or encoding.brotli is None:
+        print("install msgpack and brotli to include them")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Compare API latency with store calls on and off the event loop.
+
+Starts a uvicorn server twice against a scratch database: once with
+ECOMMERCE_STORE_THREADS=0 (store calls block the event loop, as the routes
+used to) and once with the thread pool. Each run drives a mix of health
+checks, product reads, searches and writes from many client threads and
+reports throughput and latency percentiles.
+
+Usage: python -m benchmarks.event_loop [--engine shelve] [--requests 2000]
+                                       [--concurrency 32]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .common import percentile, start_server, wait_until_up
+
+
+def one_request(session, base_url, product_ids):
+    """Issue one request from the mix; return (kind, latency in seconds).
+
+    Health checks never touch the store, so their latency shows how long
+    requests queue behind store work that holds the event loop.
+    """
+    roll = random.random()
+    start = time.perf_counter()
+    if roll < 0.3:
+        kind = "health"
+        response = session.get(f"{base_url}/")
+    elif roll < 0.5:
+        kind = "store"
+        response = session.get(f"{base_url}/products/{random.choice(product_ids)}")
+    elif roll < 0.7:
+        kind = "store"
+        response = session.get(f"{base_url}/products/search", params={"query": "item"})
+    elif roll < 0.9:
+        kind = "store"
+        response = session.post(f"{base_url}/cart", params={"product_id": random.choice(product_ids)})
+    else:
+        kind = "store"
+        response = session.post(f"{base_url}/products",
+                                json={"name": "Bench item", "price": 1.0, "description": "load"})
+    response.raise_for_status()
+    return kind, time.perf_counter() - start
+
+
+def drive(base_url, total, concurrency, product_ids):
+    def worker(count):
+        with requests.Session() as session:
+            return [one_request(session, base_url, product_ids) for _ in range(count)]
+
+    per_worker = [total // concurrency] * concurrency
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [lat for batch in pool.map(worker, per_worker) for lat in batch]
+    return latencies, time.perf_counter() - started
+
+
+def run_mode(label, threads, args, port):
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(port, args.engine, os.path.join(tmp, "bench_db"), ECOMMERCE_STORE_THREADS=threads)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_up(base_url)
+            with requests.Session() as session:
+                product_ids = [
+                    session.post(f"{base_url}/products",
+                                 json={"name": f"Item {i}", "price": 1.0 + i, "description": "seed item"}).json()["id"]
+                    for i in range(args.products)
+                ]
+            latencies, elapsed = drive(base_url, args.requests, args.concurrency, product_ids)
+        finally:
+            server.terminate()
+            server.wait()
+    print(f"{label:<10} {len(latencies) / elapsed:>9.1f} req/s")
+    for kind in ("all", "health", "store"):
+        ms = [lat * 1000 for k, lat in latencies if kind in ("all", k)]
+        print(f"  {kind:<8} p50 {percentile(ms, 50):7.2f} ms  "
+              f"p95 {percentile(ms, 95):7.2f} ms  p99 {percentile(ms, 99):7.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", default="shelve")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16, help="pool size for the threaded run")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+    print(f"engine={args.engine} requests={args.requests} concurrency={args.concurrency}")
+    run_mode("inline", 0, args, args.port)
+    run_mode("threaded", args.threads, args, args.port + 1)
+
+
+if __name__ == "__main__":
+    main()
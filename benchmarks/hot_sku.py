@@ -0,0 +1,138 @@
+"""Flash-sale benchmark: many shoppers buying one hot product at once.
+
+Every shopper thread loops over add_to_cart(hot product) + checkout until
+the product sells out or the time is up, while a few other threads keep
+buying untracked "cold" products to show whether the sale holds them up.
+Reports reserve, checkout and cold-checkout throughput and latency, and
+exits with status 1 if more units were sold than were in stock or on-hand
+stock does not match the units sold.
+
+For the shelve and memory engines each --shards value is run in turn (the
+number of counter shards per product, ECOMMERCE_STOCK_SHARDS); SQLite keeps
+stock in the database and ignores it.
+
+Usage: python -m benchmarks.hot_sku [--engines memory shelve sqlite] [--shards 1 8]
+                                    [--threads 32] [--cold-threads 4] [--stock 20000]
+                                    [--seconds 5] [--save PATH] [--compare PATH]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from backend.base_store import InsufficientStock
+from backend.stores import ENGINES, create_store
+
+from .common import add_baseline_args, finish, print_results, summarize
+
+COLD_PRODUCTS = 100
+
+
+def run_engine(engine, shards, args, results):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = create_store(engine, os.path.join(tmp, "hot_db"))
+        inventory = getattr(store, "_inventory", None)
+        if inventory is not None:
+            inventory.shards = shards
+        try:
+            hot = store.add_product("Flash sale item", 9.99, "limited stock", stock=args.stock).id
+            cold = [store.add_product(f"Cold {i}", 1.0, "always in stock").id for i in range(COLD_PRODUCTS)]
+            samples = {"reserve": [], "checkout": [], "cold_checkout": []}
+            sold = []
+            sold_out = threading.Event()
+            record_lock = threading.Lock()
+            start = threading.Barrier(args.threads + args.cold_threads)
+            deadline = None
+
+            def shopper(n):
+                user = f"hot{n}"
+                reserve, checkout, bought = [], [], 0
+                start.wait()
+                while not sold_out.is_set() and time.perf_counter() < deadline:
+                    began = time.perf_counter()
+                    try:
+                        store.add_to_cart(user, hot, 1)
+                    except InsufficientStock:
+                        sold_out.set()
+                        break
+                    reserved = time.perf_counter()
+                    order = store.checkout(user)
+                    reserve.append(reserved - began)
+                    checkout.append(time.perf_counter() - reserved)
+                    bought += sum(item.quantity for item in order.items)
+                with record_lock:
+                    samples["reserve"].extend(reserve)
+                    samples["checkout"].extend(checkout)
+                    sold.append(bought)
+
+            def cold_shopper(n):
+                user = f"cold{n}"
+                latencies = []
+                start.wait()
+                i = n
+                while not sold_out.is_set() and time.perf_counter() < deadline:
+                    store.add_to_cart(user, cold[i % COLD_PRODUCTS], 1)
+                    began = time.perf_counter()
+                    store.checkout(user)
+                    latencies.append(time.perf_counter() - began)
+                    i += 1
+                with record_lock:
+                    samples["cold_checkout"].extend(latencies)
+
+            threads = [threading.Thread(target=shopper, args=(n,)) for n in range(args.threads)]
+            threads += [threading.Thread(target=cold_shopper, args=(n,)) for n in range(args.cold_threads)]
+            deadline = time.perf_counter() + args.seconds
+            began = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+
+            units = sum(sold)
+            level = store.get_stock(hot)
+            errors = []
+            if units > args.stock:
+                errors.append(f"oversold: {units} units sold, {args.stock} in stock")
+            if level.stock != args.stock - units or level.reserved:
+                errors.append(f"stock {level.stock} (reserved {level.reserved}) after selling {units} "
+                              f"of {args.stock}")
+        finally:
+            store.close()
+
+    label = f"{engine}/shards{shards}" if inventory is not None else engine
+    for name, latencies in samples.items():
+        if latencies:
+            results[f"{label}/{name}"] = summarize(latencies, elapsed)
+    status = "OK" if not errors else "FAILED"
+    print(f"{label:<16} {status:<7} {units} units sold in {elapsed:.2f}s"
+          f"{' (sold out)' if sold_out.is_set() else ''}")
+    for error in errors:
+        print(f"    {error}")
+    return not errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engines", nargs="+", default=sorted(ENGINES), choices=sorted(ENGINES))
+    parser.add_argument("--shards", nargs="+", type=int, default=[1, 8], help="counter shards to compare")
+    parser.add_argument("--threads", type=int, default=32, help="shoppers buying the hot product")
+    parser.add_argument("--cold-threads", type=int, default=4, help="shoppers buying other products")
+    parser.add_argument("--stock", type=int, default=20_000, help="units of the hot product")
+    parser.add_argument("--seconds", type=float, default=5.0, help="time limit per run")
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+    results = {}
+    ok = True
+    for engine in args.engines:
+        for shards in (args.shards if engine != "sqlite" else args.shards[:1]):
+            ok = run_engine(engine, shards, args, results) and ok
+    print_results(results)
+    finish("hot_sku", args, results)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
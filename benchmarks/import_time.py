@@ -0,0 +1,86 @@
+"""Cold-start time of the API and the SDKs.
+
+Each target runs --runs times in a fresh interpreter (after one discarded
+run that writes the .pyc files) and reports how long its imports take, and
+for ``api_startup`` how long until the app has finished its startup hook
+against a scratch database. ``ops/s`` is simply cold starts per second.
+With --top the slowest imports of each target are listed, from
+``python -X importtime``.
+
+Usage: python -m benchmarks.import_time [--targets sdk async_sdk api api_startup]
+                                        [--runs 20] [--engine shelve] [--top 10]
+                                        [--save PATH] [--compare PATH]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from .common import ROOT, add_baseline_args, finish, print_results, summarize
+
+DONE = "print(time.perf_counter() - started)"
+TARGETS = {
+    "sdk": f"import sdk.ecommerce_sdk\n{DONE}",
+    "async_sdk": f"import sdk.async_ecommerce_sdk\n{DONE}",
+    "api": f"import backend.main\n{DONE}",
+    "api_startup": f"""
+import asyncio
+from backend.main import app
+
+async def start():
+    async with app.router.lifespan_context(app):
+        {DONE}
+
+asyncio.run(start())
+""",
+}
+
+
+def run_target(code, env, cwd, importtime=False):
+    script = f"import time\nstarted = time.perf_counter()\n{code}"
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", script]
+    result = subprocess.run(command, env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    return float(result.stdout.split()[-1]), result.stderr
+
+
+def slowest_imports(report, count):
+    """(cumulative microseconds, module) for the slowest imports in an importtime report."""
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--runs", type=int, default=20, help="fresh interpreters per target")
+    parser.add_argument("--engine", default="shelve", help="store engine for api_startup")
+    parser.add_argument("--top", type=int, default=0, help="list this many slowest imports per target")
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT, ECOMMERCE_STORE=args.engine,
+                   ECOMMERCE_DB_PATH=os.path.join(tmp, "startup_db"))
+        for name in args.targets:
+            code = TARGETS[name]
+            run_target(code, env, tmp)
+            latencies = [run_target(code, env, tmp)[0] for _ in range(args.runs)]
+            results[name] = summarize(latencies, sum(latencies))
+            if args.top:
+                _, report = run_target(code, env, tmp, importtime=True)
+                print(f"{name}: slowest imports (cumulative ms)")
+                for micros, module in slowest_imports(report, args.top):
+                    print(f"  {micros / 1000:>9.1f}  {module}")
+    print_results(results)
+    finish("import_time", args, results)
+
+
+if __name__ == "__main__":
+    main()
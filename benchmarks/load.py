@@ -0,0 +1,201 @@
+"""End-to-end load generator for the API.
+
+Simulated shoppers sign up, log in and then loop over actions picked from a
+weighted mix until the run time is over. Each mix is run in turn and the
+throughput and p50/p95/p99 latency of every action reported.
+
+Targets:
+  inprocess  drive backend.main.app through httpx's ASGI transport (no
+             network, client and server share one event loop)
+  uvicorn    start ``uvicorn backend.main:app`` on a scratch database
+  --url      an already running server
+
+Usage: python -m benchmarks.load [--target inprocess] [--engine shelve]
+                                 [--mixes browse search cart checkout mixed]
+                                 [--duration 10] [--users 32] [--products 10000]
+                                 [--save PATH] [--compare PATH]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from .common import add_baseline_args, finish, print_results, start_server, summarize, wait_until_up
+from .store_ops import ADJECTIVES, NOUNS, WORDS, generate_products
+
+# action -> relative weight
+MIXES = {
+    "browse": {"list_page": 4, "get_product": 5, "search": 1},
+    "search": {"search": 7, "get_product": 3},
+    "cart": {"get_product": 3, "add_to_cart": 5, "view_cart": 2},
+    "checkout": {"add_to_cart": 6, "view_cart": 2, "checkout": 2},
+    "mixed": {"list_page": 25, "get_product": 30, "search": 20, "add_to_cart": 15, "view_cart": 6, "checkout": 4},
+}
+SEED_BATCH = 1000
+
+
+class Shopper:
+    def __init__(self, client, name, product_ids, rnd):
+        self.client = client
+        self.name = name
+        self.product_ids = product_ids
+        self.rnd = rnd
+        self.headers = {}
+        self.cursor = None
+
+    async def login(self):
+        credentials = {"username": self.name, "password": "secret"}
+        await self.client.post("/signup", json={**credentials, "role": "buyer"})
+        response = await self.client.post("/login", json=credentials)
+        response.raise_for_status()
+        self.headers = {"token": response.json()["token"]}
+
+    async def list_page(self):
+        # Page through the catalog like a user clicking "next", starting over
+        # at the end.
+        params = {"limit": 50, "sort": self.rnd.choice(("id", "price", "name"))}
+        if self.cursor:
+            params = self.cursor
+        response = await self.client.get("/products", params=params)
+        next_cursor = response.headers.get("X-Next-Cursor")
+        self.cursor = {**params, "cursor": next_cursor} if next_cursor else None
+        return response
+
+    async def get_product(self):
+        return await self.client.get(f"/products/{self.rnd.choice(self.product_ids)}")
+
+    async def search(self):
+        query = self.rnd.choice((
+            f"{self.rnd.choice(ADJECTIVES)} {self.rnd.choice(NOUNS)}",
+            self.rnd.choice(NOUNS)[:3],
+            f"{self.rnd.choice(NOUNS)} {self.rnd.choice(WORDS)}",
+        ))
+        return await self.client.get("/products/search", params={"query": query})
+
+    async def add_to_cart(self):
+        params = {"product_id": self.rnd.choice(self.product_ids), "quantity": self.rnd.randint(1, 3)}
+        return await self.client.post("/cart", params=params, headers=self.headers)
+
+    async def view_cart(self):
+        return await self.client.get("/cart", headers=self.headers)
+
+    async def checkout(self):
+        response = await self.client.post("/checkout", headers=self.headers)
+        # An empty cart is a normal outcome for a shopper, not an error.
+        return response if response.status_code != 400 else None
+
+
+async def shop(shopper, mix, deadline, samples, errors):
+    actions = list(mix)
+    weights = [mix[action] for action in actions]
+    while time.perf_counter() < deadline:
+        action = shopper.rnd.choices(actions, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await getattr(shopper, action)()
+            if response is not None:
+                response.raise_for_status()
+        except httpx.HTTPError:
+            errors[action] += 1
+            continue
+        samples[action].append(time.perf_counter() - start)
+
+
+async def seed(client, count):
+    rnd = random.Random(0)
+    ids = []
+    batch = []
+    for product in generate_products(count, rnd):
+        batch.append({"name": product.name, "price": product.price, "description": product.description})
+        if len(batch) == SEED_BATCH or len(ids) + len(batch) == count:
+            response = await client.post("/products/batch", json=batch)
+            response.raise_for_status()
+            ids.extend(p["id"] for p in response.json())
+            batch = []
+    return ids
+
+
+async def run_mixes(client, args):
+    product_ids = await seed(client, args.products)
+    if not product_ids:
+        response = await client.get("/products", params={"limit": 1000})
+        product_ids = [p["id"] for p in response.json()]
+    results = {}
+    for mix_name in args.mixes:
+        rnd = random.Random(mix_name)
+        shoppers = [Shopper(client, f"{mix_name}-shopper{n}-{rnd.random():.6f}", product_ids,
+                            random.Random(rnd.random())) for n in range(args.users)]
+        await asyncio.gather(*(shopper.login() for shopper in shoppers))
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        began = time.perf_counter()
+        deadline = began + args.duration
+        await asyncio.gather(*(shop(s, MIXES[mix_name], deadline, samples, errors) for s in shoppers))
+        elapsed = time.perf_counter() - began
+        for action, latencies in sorted(samples.items()):
+            results[f"{mix_name}/{action}"] = summarize(latencies, elapsed)
+        results[f"{mix_name}/all"] = summarize([lat for lats in samples.values() for lat in lats], elapsed)
+        if errors:
+            print(f"{mix_name}: errors {dict(errors)}")
+    return results
+
+
+async def run_inprocess(args, tmp):
+    # backend.main reads its store settings at import time, so point it at
+    # the scratch database first; the store itself is built on startup.
+    os.environ["ECOMMERCE_STORE"] = args.engine
+    os.environ["ECOMMERCE_DB_PATH"] = os.path.join(tmp, "load_db")
+    from backend.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://inprocess", timeout=60) as client:
+            return await run_mixes(client, args)
+
+
+async def run_http(args, base_url):
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        return await run_mixes(client, args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument("--engine", default="shelve")
+    parser.add_argument("--mixes", nargs="+", default=list(MIXES), choices=list(MIXES))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mix")
+    parser.add_argument("--users", type=int, default=32, help="concurrent shoppers")
+    parser.add_argument("--products", type=int, default=10_000, help="products to seed first")
+    parser.add_argument("--port", type=int, default=8780)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    print(f"target={args.url or args.target} engine={args.engine} users={args.users} "
+          f"duration={args.duration}s products={args.products}")
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            results = asyncio.run(run_http(args, args.url.rstrip("/")))
+        elif args.target == "inprocess":
+            results = asyncio.run(run_inprocess(args, tmp))
+        else:
+            server = start_server(args.port, args.engine, os.path.join(tmp, "load_db"))
+            base_url = f"http://127.0.0.1:{args.port}"
+            try:
+                wait_until_up(base_url)
+                results = asyncio.run(run_http(args, base_url))
+            finally:
+                server.terminate()
+                server.wait()
+    print_results(results)
+    finish("load", args, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Memory and (de)serialization cost of stored products: Pydantic vs records.
+
+Builds the same catalog as Pydantic ``Product`` objects (what the stores kept
+before) and as ``ProductRecord`` tuples, then compares resident memory per
+product, stored bytes per product and encode/decode throughput of pickling
+the models versus the binary record codec.
+
+Usage: python -m benchmarks.record_codec [--products 1000000]
+"""
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+
+from backend import records
+from backend.models import Product
+from backend.records import ProductRecord
+
+
+def catalog(n):
+    for i in range(n):
+        yield i + 1, f"Product {i}", round(1 + (i % 5000) * 0.37, 2), f"Description of product number {i}"
+
+
+def measure_memory(build, n):
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items, current / n
+
+
+def timed(fn, items):
+    began = time.perf_counter()
+    out = [fn(item) for item in items]
+    return out, time.perf_counter() - began
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    n = args.products
+
+    models, model_bytes = measure_memory(
+        lambda: [Product(id=i, name=name, price=price, description=d) for i, name, price, d in catalog(n)], n
+    )
+    pickled, model_dump = timed(lambda p: pickle.dumps(p, pickle.HIGHEST_PROTOCOL), models)
+    _, model_load = timed(pickle.loads, pickled)
+    model_stored = sum(map(len, pickled)) / n
+    del models, pickled
+
+    recs, record_bytes = measure_memory(lambda: [ProductRecord(*row) for row in catalog(n)], n)
+    encoded, record_dump = timed(lambda r: records.dump('product', r), recs)
+    decoded, record_load = timed(lambda b: records.load('product', b), encoded)
+    assert decoded == recs
+    record_stored = sum(map(len, encoded)) / n
+    del recs, encoded, decoded
+
+    print(f"{n:,} products")
+    print(f"{'':<24}{'memory B/product':>18}{'stored B/product':>18}{'encode k/s':>12}{'decode k/s':>12}")
+    for label, memory, stored, dump_s, load_s in (
+        ("pydantic + pickle", model_bytes, model_stored, model_dump, model_load),
+        ("record + codec", record_bytes, record_stored, record_dump, record_load),
+    ):
+        print(f"{label:<24}{memory:>18,.0f}{stored:>18,.0f}{n / dump_s / 1000:>12,.0f}{n / load_s / 1000:>12,.0f}")
+    print(f"memory {model_bytes / record_bytes:.1f}x smaller, stored {model_stored / record_stored:.1f}x smaller, "
+          f"encode {model_dump / record_dump:.1f}x / decode {model_load / record_load:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Micro-benchmarks of every store operation at several catalog sizes.
+
+For each engine and catalog size a scratch store is filled with generated
+products (via add_products), then each operation is called repeatedly for a
+fixed time budget and its throughput and p50/p95/p99 latency reported.
+Setup work an operation needs (filling a cart before checkout, creating a
+product to delete) is done outside the timed call.
+
+Usage: python -m benchmarks.store_ops [--engines shelve] [--sizes 1000 100000 1000000]
+                                      [--seconds 1.0] [--save PATH] [--compare PATH]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from backend.models import CartItemCreate, ProductCreate
+from backend.pagination import encode_cursor
+from backend.stores import ENGINES, create_store
+
+from .common import add_baseline_args, finish, print_results, summarize
+
+ADJECTIVES = ("red", "blue", "green", "small", "large", "classic", "modern", "wireless", "smart", "compact",
+              "premium", "basic", "portable", "silent", "rugged", "slim", "vintage", "digital", "solar", "sport")
+NOUNS = ("phone", "laptop", "lamp", "chair", "desk", "speaker", "camera", "watch", "kettle", "backpack",
+         "monitor", "keyboard", "mouse", "charger", "blender", "jacket", "helmet", "bottle", "drone", "tablet")
+WORDS = ("durable", "lightweight", "waterproof", "ergonomic", "fast", "quiet", "stylish", "affordable",
+         "powerful", "efficient", "reliable", "versatile", "elegant", "sturdy", "soft", "bright", "warm",
+         "cool", "eco", "friendly", "compact", "handmade", "original", "refurbished", "new")
+USERS = 100
+CHUNK = 10_000
+
+
+def generate_products(size, rnd):
+    for i in range(size):
+        name = f"{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {i}"
+        description = " ".join(rnd.sample(WORDS, 6))
+        yield ProductCreate(name=name, price=round(rnd.uniform(1, 2000), 2), description=description)
+
+
+def populate(store, size, rnd):
+    batch = []
+    for product in generate_products(size, rnd):
+        batch.append(product)
+        if len(batch) == CHUNK:
+            store.add_products(batch)
+            batch = []
+    if batch:
+        store.add_products(batch)
+    for n in range(USERS):
+        store.signup(f"user{n}", "secret", "buyer")
+
+
+def operations(store, size, rnd):
+    """name -> (prepare, run). prepare() runs untimed; its result goes to run()."""
+    def product_id():
+        return rnd.randint(1, size)
+
+    def user():
+        return f"user{rnd.randrange(USERS)}"
+
+    def fill_cart():
+        name = user()
+        store.add_to_cart_many(name, [CartItemCreate(product_id=product_id(), quantity=1) for _ in range(3)])
+        return name
+
+    def new_product():
+        return store.add_product("Disposable", 1.0, "created for the delete benchmark").id
+
+    token = store.login("user0", "secret").token
+    return {
+        "get_product": (product_id, store.get_product),
+        "list_products_first_page": (None, lambda _: store.list_products(limit=50)),
+        "list_products_deep_page": (
+            lambda: encode_cursor("id", False, product_id(), 0),
+            lambda cursor: store.list_products(limit=50, cursor=cursor)),
+        "list_products_by_price": (
+            lambda: rnd.uniform(1, 1900),
+            lambda low: store.list_products(limit=50, sort="price", min_price=low, max_price=low + 100)),
+        "search_exact": (lambda: str(product_id() - 1), store.search_products),
+        "search_two_words": (lambda: f"{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)}", store.search_products),
+        "search_prefix": (lambda: rnd.choice(NOUNS)[:3] + " " + rnd.choice(WORDS), store.search_products),
+        "get_all_products": (None, lambda _: store.get_all_products()),
+        "add_product": (None, lambda _: store.add_product("Bench item", 9.99, "added during the benchmark")),
+        "update_product": (product_id, lambda pid: store.update_product(pid, price=rnd.uniform(1, 2000))),
+        "delete_product": (new_product, store.delete_product),
+        "add_to_cart": (lambda: (user(), product_id()), lambda args: store.add_to_cart(*args)),
+        "get_cart": (user, store.get_cart),
+        "checkout": (fill_cart, store.checkout),
+        "login": (None, lambda _: store.login("user1", "secret")),
+        "get_user_by_token": (None, lambda _: store.get_user_by_token(token)),
+    }
+
+
+def time_operation(prepare, run, seconds, max_calls):
+    latencies = []
+    spent = 0.0
+    while spent < seconds and len(latencies) < max_calls:
+        arg = prepare() if prepare else None
+        start = time.perf_counter()
+        run(arg)
+        latency = time.perf_counter() - start
+        latencies.append(latency)
+        spent += latency
+    return summarize(latencies, spent)
+
+
+def run_engine(engine, size, args, results):
+    rnd = random.Random(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = create_store(engine, os.path.join(tmp, "bench_db"))
+        try:
+            began = time.perf_counter()
+            populate(store, size, rnd)
+            print(f"{engine}: {size:,} products loaded in {time.perf_counter() - began:.1f}s")
+            for name, (prepare, run) in operations(store, size, rnd).items():
+                if args.ops and name not in args.ops:
+                    continue
+                results[f"{engine}/{size}/{name}"] = time_operation(prepare, run, args.seconds, args.max_calls)
+        finally:
+            store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engines", nargs="+", default=["shelve"], choices=sorted(ENGINES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per operation")
+    parser.add_argument("--max-calls", type=int, default=2000, help="call cap per operation")
+    parser.add_argument("--ops", nargs="+", help="only run these operations")
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+    results = {}
+    for engine in args.engines:
+        for size in args.sizes:
+            run_engine(engine, size, args, results)
+    print_results(results)
+    finish("store_ops", args, results)
+
+
+if __name__ == "__main__":
+    main()
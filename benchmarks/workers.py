@@ -0,0 +1,126 @@
+"""Throughput of the API as the number of uvicorn worker processes grows.
+
+For each --workers count a fresh SQLite database is served by ``uvicorn
+--workers N`` (the only engine that can be shared between processes) and
+driven by several client processes, each running a share of the shoppers
+from ``benchmarks.load``. Reports throughput and latency per worker count
+and the speedup over the first count.
+
+Workers only help while there are idle cores: on a machine with fewer
+cores than workers plus client processes the curve flattens early.
+
+Usage: python -m benchmarks.workers [--workers 1 2 4 8] [--mixes mixed]
+                                    [--clients 4] [--users 64] [--duration 10]
+                                    [--products 10000] [--save PATH] [--compare PATH]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from .common import add_baseline_args, finish, print_results, start_server, summarize, wait_until_up
+from .load import MIXES, Shopper, seed, shop
+
+
+async def drive(base_url, mix_name, users, duration, product_ids, client, barrier):
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        rnd = random.Random(f"{mix_name}-{client}")
+        shoppers = [Shopper(http, f"{mix_name}-c{client}-shopper{n}-{rnd.random():.6f}", product_ids,
+                            random.Random(rnd.random())) for n in range(users)]
+        await asyncio.gather(*(shopper.login() for shopper in shoppers))
+        # Every client process starts shopping at the same moment.
+        await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(shop(s, MIXES[mix_name], deadline, samples, errors) for s in shoppers))
+    return dict(samples), dict(errors)
+
+
+def client_process(base_url, mix_name, users, duration, product_ids, client, barrier, queue):
+    queue.put(asyncio.run(drive(base_url, mix_name, users, duration, product_ids, client, barrier)))
+
+
+async def seed_catalog(base_url, count):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as http:
+        return await seed(http, count)
+
+
+def run_workers(workers, args, tmp, results):
+    server = start_server(args.port, "sqlite", os.path.join(tmp, f"workers{workers}.sqlite3"), workers=workers)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(base_url)
+        product_ids = asyncio.run(seed_catalog(base_url, args.products))
+        for mix_name in args.mixes:
+            users = [args.users // args.clients + (1 if i < args.users % args.clients else 0)
+                     for i in range(args.clients)]
+            barrier = multiprocessing.Barrier(args.clients)
+            queue = multiprocessing.Queue()
+            clients = [multiprocessing.Process(target=client_process, args=(
+                base_url, mix_name, users[i], args.duration, product_ids, i, barrier, queue))
+                for i in range(args.clients)]
+            for process in clients:
+                process.start()
+            samples = defaultdict(list)
+            errors = defaultdict(int)
+            for _ in clients:
+                client_samples, client_errors = queue.get()
+                for action, latencies in client_samples.items():
+                    samples[action].extend(latencies)
+                for action, count in client_errors.items():
+                    errors[action] += count
+            for process in clients:
+                process.join()
+            label = f"workers{workers}/{mix_name}"
+            for action, latencies in sorted(samples.items()):
+                results[f"{label}/{action}"] = summarize(latencies, args.duration)
+            results[f"{label}/all"] = summarize([lat for lats in samples.values() for lat in lats], args.duration)
+            if errors:
+                print(f"{label}: errors {dict(errors)}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8], help="worker counts to compare")
+    parser.add_argument("--mixes", nargs="+", default=["mixed"], choices=list(MIXES))
+    parser.add_argument("--clients", type=int, default=4, help="client processes generating load")
+    parser.add_argument("--users", type=int, default=64, help="concurrent shoppers over all clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mix")
+    parser.add_argument("--products", type=int, default=10_000, help="products to seed first")
+    parser.add_argument("--port", type=int, default=8781)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    print(f"workers={args.workers} clients={args.clients} users={args.users} duration={args.duration}s "
+          f"products={args.products} cpus={os.cpu_count()}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            run_workers(workers, args, tmp, results)
+    print_results(results)
+
+    print(f"\n{'':<12}" + "".join(f"{mix:>16}" for mix in args.mixes))
+    first = args.workers[0]
+    for workers in args.workers:
+        cells = []
+        for mix in args.mixes:
+            ops = results[f"workers{workers}/{mix}/all"]["ops_per_s"]
+            base = results[f"workers{first}/{mix}/all"]["ops_per_s"]
+            cells.append(f"{ops:>9,.0f} {ops / base if base else 0:>5.2f}x")
+        print(f"{workers:>2} workers " + "".join(f"{cell:>16}" for cell in cells))
+    finish("workers", args, results)
+
+
+if __name__ == "__main__":
+    main()
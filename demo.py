@@ -41,10 +41,8 @@ def main():
         {"name": "Monitor", "price": 299.99, "description": "27-inch 4K monitor"}
     ]
     
-    added_products = []
-    for product_data in products:
-        product = sdk.add_product(**product_data)
-        added_products.append(product)
+    added_products = sdk.add_products(products)
+    for product in added_products:
         print(f"✓ Added: {product['name']} - ${product['price']}")
     
     print_separator("2. SELLER: Listing All Products")
@@ -72,8 +70,8 @@ def main():
         (4, 1)   # 1 Monitor
     ]
     
+    sdk.add_to_cart_many(cart_items)
     for product_id, quantity in cart_items:
-        result = sdk.add_to_cart(product_id, quantity)
         product = sdk.get_product(product_id)
         print(f"✓ Added {quantity}x {product['name']} to cart")
     
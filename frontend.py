@@ -19,7 +19,7 @@ if 'role' not in st.session_state:
 if 'username' not in st.session_state:
     st.session_state['username'] = None
 if 'sdk' not in st.session_state:
-    st.session_state['sdk'] = EcommerceSDK()
+    st.session_state['sdk'] = EcommerceSDK(cache=True)
 sdk = st.session_state['sdk']
 if st.session_state['token']:
     sdk.set_token(st.session_state['token'])
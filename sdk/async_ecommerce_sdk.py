@@ -0,0 +1,298 @@
+import asyncio
+import json
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from .ecommerce_sdk import (
+    BATCH_SIZE, CACHED_HEADERS, NDJSON, STREAM_CHUNK, FileTarget, _binary_accept, _chunks, _decode, _open,
+    _read_offset, _save_offset
+)
+from .response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class AsyncEcommerceSDK:
+    """asyncio counterpart of EcommerceSDK, built on httpx.AsyncClient.
+
+    Connections are pooled and kept alive (``max_connections`` /
+    ``max_keepalive``) and at most ``concurrency`` requests are in flight at
+    once, so large fan-outs queue instead of flooding the server. ``cache``
+    and ``binary`` work as in EcommerceSDK. Pass a
+    FastAPI ``app`` to run against it in-process without any network; the
+    app's startup and shutdown run when the client is entered and closed::
+
+        async with AsyncEcommerceSDK(app=app) as sdk:
+            products = await sdk.gather_products([1, 2, 3])
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", user_id: str = "default_user",
+                 token: str = None, max_connections: int = 100, max_keepalive: int = 20,
+                 concurrency: int = 50, timeout: float = 30.0, app=None,
+                 transport: Optional["httpx.AsyncBaseTransport"] = None,
+                 cache: bool = False, cache_size: int = 256, cache_ttl: float = 5.0,
+                 binary: bool = False):
+        self.base_url = base_url.rstrip('/')
+        self.user_id = user_id
+        self.token = token
+        self.timeout = timeout
+        # httpx takes a while to import, so it is only loaded once a client
+        # is actually created.
+        import httpx
+
+        if app is not None and transport is None:
+            transport = httpx.ASGITransport(app=app)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=timeout,
+            transport=transport,
+            headers=_binary_accept(binary),
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.cache = ResponseCache(cache_size, cache_ttl) if cache else None
+        self._app = app
+        # The app's lifespan while it runs in-process; ASGITransport does not
+        # start it by itself.
+        self._lifespan = None
+
+    async def __aenter__(self):
+        if self._app is not None and self._lifespan is None:
+            lifespan = self._app.router.lifespan_context(self._app)
+            await lifespan.__aenter__()
+            self._lifespan = lifespan
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+        if self._lifespan is not None:
+            lifespan, self._lifespan = self._lifespan, None
+            await lifespan.__aexit__(None, None, None)
+
+    def set_token(self, token: str):
+        self.token = token
+
+    def _headers(self):
+        return {"token": self.token} if self.token else {}
+
+    async def _send(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                    check: bool = True, **kwargs) -> "httpx.Response":
+        async with self._semaphore:
+            response = await self.client.request(method, path, headers={**self._headers(), **(headers or {})},
+                                                 **kwargs)
+        # Any product write by this client makes the cached catalog stale.
+        if method != "GET" and path.startswith("/products") and self.cache is not None:
+            self.cache.clear()
+        if check:
+            response.raise_for_status()
+        return response
+
+    async def _request(self, method: str, path: str, **kwargs) -> Any:
+        return _decode(await self._send(method, path, **kwargs))
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Any, Dict[str, str]]:
+        if self.cache is None:
+            response = await self._send("GET", path, params=params)
+            return _decode(response), response.headers
+        key = self.cache.key(path, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            return entry.data, entry.headers
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else None
+        response = await self._send("GET", path, headers=headers, check=False, params=params)
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(entry)
+            return entry.data, entry.headers
+        response.raise_for_status()
+        kept = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        entry = self.cache.put(key, response.headers.get("ETag"), _decode(response), kept)
+        return entry.data, entry.headers
+
+    async def add_product(self, name: str, price: float, description: str,
+                          stock: Optional[int] = None) -> Dict[str, Any]:
+        return await self._request(
+            "POST", "/products", json={"name": name, "price": price, "description": description, "stock": stock}
+        )
+
+    async def add_products(self, products: Iterable[Dict[str, Any]],
+                           chunk_size: int = BATCH_SIZE) -> List[Dict[str, Any]]:
+        """Add many products in chunks of ``chunk_size``, sent in order.
+
+        As with EcommerceSDK, each chunk is committed atomically; if a later
+        chunk fails, earlier ones stay.
+        """
+        created = []
+        for chunk in _chunks(products, chunk_size):
+            created.extend(await self._request("POST", "/products/batch", json=chunk))
+        return created
+
+    async def update_product(self, product_id: int, **kwargs) -> Dict[str, Any]:
+        return await self._request("PUT", f"/products/{product_id}", json=kwargs)
+
+    async def delete_product(self, product_id: int) -> Dict[str, Any]:
+        return await self._request("DELETE", f"/products/{product_id}")
+
+    async def get_products(self) -> List[Dict[str, Any]]:
+        return (await self._get("/products"))[0]
+
+    async def get_products_page(self, limit: int = 100, cursor: Optional[str] = None, sort: str = "id",
+                                desc: bool = False, min_price: Optional[float] = None,
+                                max_price: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        params = {"limit": limit, "sort": sort, "desc": desc}
+        if cursor:
+            params["cursor"] = cursor
+        if min_price is not None:
+            params["min_price"] = min_price
+        if max_price is not None:
+            params["max_price"] = max_price
+        products, headers = await self._get("/products", params)
+        return products, headers.get("X-Next-Cursor")
+
+    async def iter_products(self, page_size: int = 100, **filters) -> AsyncIterator[Dict[str, Any]]:
+        cursor = None
+        while True:
+            products, cursor = await self.get_products_page(limit=page_size, cursor=cursor, **filters)
+            for product in products:
+                yield product
+            if not cursor:
+                return
+
+    async def get_stock(self, product_id: int) -> Dict[str, Any]:
+        return await self._request("GET", f"/products/{product_id}/stock")
+
+    async def set_stock(self, product_id: int, stock: Optional[int]) -> Dict[str, Any]:
+        return await self._request("PUT", f"/products/{product_id}/stock", json={"stock": stock})
+
+    async def export_products(self, target: FileTarget, chunk_size: int = STREAM_CHUNK) -> int:
+        count = 0
+        async with self._semaphore:
+            async with self.client.stream("GET", "/products/export", headers=self._headers()) as response:
+                response.raise_for_status()
+                with _open(target, "wb") as f:
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        f.write(chunk)
+                        count += chunk.count(b"\n")
+        return count
+
+    async def iter_export(self) -> AsyncIterator[Dict[str, Any]]:
+        async with self._semaphore:
+            async with self.client.stream("GET", "/products/export", headers=self._headers()) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        yield json.loads(line)
+
+    async def import_products(self, source: FileTarget, chunk_size: int = STREAM_CHUNK) -> Dict[str, Any]:
+        with _open(source, "rb") as f:
+            async def body():
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+
+            return await self._request("POST", "/products/import", content=body(),
+                                       headers={"Content-Type": NDJSON})
+
+    async def search_products(self, query: str) -> List[Dict[str, Any]]:
+        return (await self._get("/products/search", {"query": query}))[0]
+
+    async def get_product(self, product_id: int) -> Dict[str, Any]:
+        return (await self._get(f"/products/{product_id}"))[0]
+
+    async def gather_products(self, product_ids: Iterable[int],
+                              return_exceptions: bool = False) -> List[Any]:
+        """Fetch many products concurrently, in the order of ``product_ids``.
+
+        With ``return_exceptions=True`` a failed lookup (e.g. a 404) yields
+        its exception in place instead of cancelling the rest.
+        """
+        return await asyncio.gather(
+            *(self.get_product(pid) for pid in product_ids), return_exceptions=return_exceptions
+        )
+
+    async def add_to_cart(self, product_id: int, quantity: int = 1) -> Dict[str, Any]:
+        return await self._request("POST", "/cart", params={"product_id": product_id, "quantity": quantity})
+
+    async def add_to_cart_many(self, items: Iterable[Union[Tuple[int, int], Dict[str, int]]],
+                               chunk_size: int = BATCH_SIZE) -> Dict[str, Any]:
+        count = 0
+        lines = (
+            item if isinstance(item, dict) else {"product_id": item[0], "quantity": item[1]}
+            for item in items
+        )
+        # Chunks go one after another: they update the same cart.
+        for chunk in _chunks(lines, chunk_size):
+            await self._request("POST", "/cart/batch", json=chunk)
+            count += len(chunk)
+        return {"message": f"{count} items added to cart"}
+
+    async def view_cart(self) -> Dict[str, Any]:
+        return await self._request("GET", "/cart")
+
+    async def quote_cart(self) -> Dict[str, Any]:
+        return await self._request("GET", "/cart/quote")
+
+    async def remove_from_cart(self, product_id: int) -> Dict[str, Any]:
+        return await self._request("DELETE", f"/cart/{product_id}")
+
+    async def checkout(self) -> Dict[str, Any]:
+        return await self._request("POST", "/checkout")
+
+    async def get_orders_page(self, limit: int = 20,
+                              cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = await self._send("GET", "/orders", params=params)
+        return _decode(response), response.headers.get("X-Next-Cursor")
+
+    async def iter_orders(self, page_size: int = 20) -> AsyncIterator[Dict[str, Any]]:
+        cursor = None
+        while True:
+            orders, cursor = await self.get_orders_page(limit=page_size, cursor=cursor)
+            for order in orders:
+                yield order
+            if not cursor:
+                return
+
+    async def get_order(self, order_id: int) -> Dict[str, Any]:
+        return await self._request("GET", f"/orders/{order_id}")
+
+    async def get_changes(self, since: int = 0, limit: int = 100, wait: float = 0) -> Dict[str, Any]:
+        """As EcommerceSDK.get_changes; the request timeout is extended by ``wait``."""
+        return await self._request("GET", "/changes", params={"since": since, "limit": limit, "wait": wait},
+                                   timeout=self.timeout + wait)
+
+    async def iter_changes(self, since: int = 0, offset_file: Optional[str] = None, limit: int = 100,
+                           wait: float = 30.0, follow: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """As EcommerceSDK.iter_changes, for ``async for``."""
+        handled = saved = _read_offset(offset_file, since) if offset_file else since
+        try:
+            while True:
+                feed = await self.get_changes(handled, limit, wait if follow else 0)
+                for change in feed["changes"]:
+                    yield change
+                    handled = change["seq"]
+                if offset_file and handled != saved:
+                    _save_offset(offset_file, handled)
+                    saved = handled
+                if not feed["changes"] and not follow:
+                    return
+        finally:
+            if offset_file and handled != saved:
+                _save_offset(offset_file, handled)
+
+    async def signup(self, username: str, password: str, role: str) -> Dict[str, Any]:
+        return await self._request(
+            "POST", "/signup", json={"username": username, "password": password, "role": role}
+        )
+
+    async def login(self, username: str, password: str) -> Dict[str, Any]:
+        return await self._request("POST", "/login", json={"username": username, "password": password})
+
+    async def health_check(self) -> Dict[str, Any]:
+        return await self._request("GET", "/")
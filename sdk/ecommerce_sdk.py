@@ -1,14 +1,104 @@
-import requests
-from typing import List, Dict, Any, Optional
+import contextlib
+import json
+import os
+from typing import List, Dict, Any, IO, Iterable, Iterator, Optional, Tuple, Union
 
+from .response_cache import ResponseCache
+
+
+# Matches the server's default per-request batch limit.
+BATCH_SIZE = 1000
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Response headers kept alongside cached bodies.
+CACHED_HEADERS = ("X-Next-Cursor",)
+# Bytes read or written at a time when streaming an export or import.
+STREAM_CHUNK = 64 * 1024
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+# Sent by clients created with binary=True: MessagePack, or JSON from
+# servers that do not offer it.
+BINARY_ACCEPT = f"{MSGPACK}, application/json;q=0.9"
+
+FileTarget = Union[str, os.PathLike, IO[bytes]]
+
+
+def _open(target: FileTarget, mode: str):
+    """Open a path, or pass an already open binary file through unclosed."""
+    if isinstance(target, (str, os.PathLike)):
+        return open(target, mode)
+    return contextlib.nullcontext(target)
+
+
+def _binary_accept(binary: bool) -> Dict[str, str]:
+    """The Accept header asking for MessagePack, if wanted and msgpack is installed."""
+    if not binary:
+        return {}
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return {}
+    return {"Accept": BINARY_ACCEPT}
+
+
+def _decode(response) -> Any:
+    """The body of a JSON or MessagePack response."""
+    if response.headers.get("Content-Type", "").startswith(MSGPACK):
+        import msgpack
+        return msgpack.unpackb(response.content)
+    return response.json()
+
+
+def _read_offset(path: str, default: int) -> int:
+    """The change sequence number saved in ``path``, or ``default`` if there is none yet."""
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or default)
+    except FileNotFoundError:
+        return default
+
+
+def _save_offset(path: str, seq: int):
+    # Write and rename, so a crash never leaves a half-written offset behind.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(seq))
+    os.replace(tmp_path, path)
 
 
 class EcommerceSDK:
-    def __init__(self, base_url: str = "http://localhost:8000", user_id: str = "default_user", token: str = None):
+    def __init__(self, base_url: str = "http://localhost:8000", user_id: str = "default_user", token: str = None,
+                 cache: bool = False, cache_size: int = 256, cache_ttl: float = 5.0, binary: bool = False):
+        """With ``cache=True`` product, catalog and search responses are
+        cached (see ResponseCache) and dropped whenever this client changes
+        a product. Cached lists and dicts are shared, so do not mutate them.
+
+        With ``binary=True`` responses are requested as MessagePack, which is
+        smaller and faster to decode than JSON, when ``msgpack`` is
+        installed; results are the same either way. Compressed responses
+        are always accepted.
+        """
         self.base_url = base_url.rstrip('/')
         self.user_id = user_id
         self.token = token
+        # requests takes a while to import, so it is only loaded once a
+        # client is actually created.
+        import requests
+
         self.session = requests.Session()
+        self.session.headers.update(_binary_accept(binary))
+        self.cache = ResponseCache(cache_size, cache_ttl) if cache else None
 
     def set_token(self, token: str):
         self.token = token
@@ -16,14 +106,57 @@ class EcommerceSDK:
     def _headers(self):
         return {"token": self.token} if self.token else {}
 
-    def add_product(self, name: str, price: float, description: str) -> Dict[str, Any]:
+    def _invalidate(self):
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Any, Dict[str, str]]:
+        """GET ``path``; returns (json, headers), using the cache if enabled."""
+        if self.cache is None:
+            response = self.session.get(f"{self.base_url}{path}", params=params, headers=self._headers())
+            response.raise_for_status()
+            return _decode(response), response.headers
+        key = self.cache.key(path, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            return entry.data, entry.headers
+        headers = self._headers()
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        response = self.session.get(f"{self.base_url}{path}", params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(entry)
+            return entry.data, entry.headers
+        response.raise_for_status()
+        kept = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        entry = self.cache.put(key, response.headers.get("ETag"), _decode(response), kept)
+        return entry.data, entry.headers
+
+    def add_product(self, name: str, price: float, description: str,
+                    stock: Optional[int] = None) -> Dict[str, Any]:
         response = self.session.post(
             f"{self.base_url}/products",
-            json={"name": name, "price": price, "description": description},
+            json={"name": name, "price": price, "description": description, "stock": stock},
             headers=self._headers()
         )
+        self._invalidate()
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
+
+    def add_products(self, products: Iterable[Dict[str, Any]], chunk_size: int = BATCH_SIZE) -> List[Dict[str, Any]]:
+        """Add many products, sending them in chunks of ``chunk_size``.
+
+        Each product is a dict with name, price, description and optionally
+        stock. Each chunk
+        is committed atomically; if a later chunk fails, earlier ones stay.
+        """
+        created = []
+        for chunk in _chunks(products, chunk_size):
+            response = self.session.post(f"{self.base_url}/products/batch", json=chunk, headers=self._headers())
+            self._invalidate()
+            response.raise_for_status()
+            created.extend(_decode(response))
+        return created
 
     def update_product(self, product_id: int, **kwargs) -> Dict[str, Any]:
         response = self.session.put(
@@ -31,28 +164,107 @@ class EcommerceSDK:
             json=kwargs,
             headers=self._headers()
         )
+        self._invalidate()
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
 
     def delete_product(self, product_id: int) -> Dict[str, Any]:
         response = self.session.delete(f"{self.base_url}/products/{product_id}", headers=self._headers())
+        self._invalidate()
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
 
     def get_products(self) -> List[Dict[str, Any]]:
-        response = self.session.get(f"{self.base_url}/products", headers=self._headers())
+        return self._get("/products")[0]
+
+    def get_products_page(self, limit: int = 100, cursor: Optional[str] = None, sort: str = "id",
+                          desc: bool = False, min_price: Optional[float] = None,
+                          max_price: Optional[float] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Fetch one page of products; returns (products, next_cursor)."""
+        params = {"limit": limit, "sort": sort, "desc": desc}
+        if cursor:
+            params["cursor"] = cursor
+        if min_price is not None:
+            params["min_price"] = min_price
+        if max_price is not None:
+            params["max_price"] = max_price
+        products, headers = self._get("/products", params)
+        return products, headers.get("X-Next-Cursor")
+
+    def iter_products(self, page_size: int = 100, **filters) -> Iterator[Dict[str, Any]]:
+        """Yield every product, fetching pages lazily as the caller iterates.
+
+        Accepts the same sort/filter keywords as get_products_page.
+        """
+        cursor = None
+        while True:
+            products, cursor = self.get_products_page(limit=page_size, cursor=cursor, **filters)
+            yield from products
+            if not cursor:
+                return
+
+    def get_stock(self, product_id: int) -> Dict[str, Any]:
+        """Units on hand, held by carts and available; never cached."""
+        response = self.session.get(f"{self.base_url}/products/{product_id}/stock", headers=self._headers())
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
 
-    def search_products(self, query: str) -> List[Dict[str, Any]]:
-        response = self.session.get(f"{self.base_url}/products/search", params={"query": query}, headers=self._headers())
+    def set_stock(self, product_id: int, stock: Optional[int]) -> Dict[str, Any]:
+        """Set units on hand; None stops tracking stock for the product."""
+        response = self.session.put(
+            f"{self.base_url}/products/{product_id}/stock",
+            json={"stock": stock},
+            headers=self._headers()
+        )
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
 
-    def get_product(self, product_id: int) -> Dict[str, Any]:
-        response = self.session.get(f"{self.base_url}/products/{product_id}", headers=self._headers())
+    def export_products(self, target: FileTarget, chunk_size: int = STREAM_CHUNK) -> int:
+        """Stream the catalog as NDJSON into ``target`` (a path or binary file).
+
+        Returns the number of products written. Only one chunk is in memory
+        at a time.
+        """
+        count = 0
+        url = f"{self.base_url}/products/export"
+        with self.session.get(url, headers=self._headers(), stream=True) as response:
+            response.raise_for_status()
+            with _open(target, "wb") as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    count += chunk.count(b"\n")
+        return count
+
+    def iter_export(self) -> Iterator[Dict[str, Any]]:
+        """Yield every product from the export stream, one at a time."""
+        url = f"{self.base_url}/products/export"
+        with self.session.get(url, headers=self._headers(), stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(STREAM_CHUNK):
+                if line:
+                    yield json.loads(line)
+
+    def import_products(self, source: FileTarget) -> Dict[str, Any]:
+        """Upload NDJSON products (name, price, description[, stock]) from ``source``.
+
+        The file is streamed, not read into memory; the server commits it in
+        batches and returns ``{"imported": count}``.
+        """
+        with _open(source, "rb") as f:
+            response = self.session.post(
+                f"{self.base_url}/products/import",
+                data=f,
+                headers={**self._headers(), "Content-Type": NDJSON}
+            )
+        self._invalidate()
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
+
+    def search_products(self, query: str) -> List[Dict[str, Any]]:
+        return self._get("/products/search", {"query": query})[0]
+
+    def get_product(self, product_id: int) -> Dict[str, Any]:
+        return self._get(f"/products/{product_id}")[0]
 
     def add_to_cart(self, product_id: int, quantity: int = 1) -> Dict[str, Any]:
         response = self.session.post(
@@ -61,7 +273,24 @@ class EcommerceSDK:
             headers=self._headers()
         )
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
+
+    def add_to_cart_many(self, items: Iterable[Union[Tuple[int, int], Dict[str, int]]],
+                         chunk_size: int = BATCH_SIZE) -> Dict[str, Any]:
+        """Add many cart lines, given as (product_id, quantity) pairs or dicts.
+
+        Lines are sent in chunks of ``chunk_size``, each applied atomically.
+        """
+        count = 0
+        lines = (
+            item if isinstance(item, dict) else {"product_id": item[0], "quantity": item[1]}
+            for item in items
+        )
+        for chunk in _chunks(lines, chunk_size):
+            response = self.session.post(f"{self.base_url}/cart/batch", json=chunk, headers=self._headers())
+            response.raise_for_status()
+            count += len(chunk)
+        return {"message": f"{count} items added to cart"}
 
     def view_cart(self) -> Dict[str, Any]:
         response = self.session.get(
@@ -69,7 +298,13 @@ class EcommerceSDK:
             headers=self._headers()
         )
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
+
+    def quote_cart(self) -> Dict[str, Any]:
+        """Price the cart as checkout would: items, total, missing_product_ids, repriced."""
+        response = self.session.get(f"{self.base_url}/cart/quote", headers=self._headers())
+        response.raise_for_status()
+        return _decode(response)
 
     def remove_from_cart(self, product_id: int) -> Dict[str, Any]:
         response = self.session.delete(
@@ -77,7 +312,7 @@ class EcommerceSDK:
             headers=self._headers()
         )
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
 
     def checkout(self) -> Dict[str, Any]:
         response = self.session.post(
@@ -85,7 +320,77 @@ class EcommerceSDK:
             headers=self._headers()
         )
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
+
+    def get_orders_page(self, limit: int = 20,
+                        cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Fetch one page of this user's orders, newest first; returns (orders, next_cursor)."""
+        # Orders are per user, so they bypass the response cache, whose keys
+        # do not include the token.
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = self.session.get(f"{self.base_url}/orders", params=params, headers=self._headers())
+        response.raise_for_status()
+        return _decode(response), response.headers.get("X-Next-Cursor")
+
+    def iter_orders(self, page_size: int = 20) -> Iterator[Dict[str, Any]]:
+        """Yield this user's orders, newest first, fetching pages lazily."""
+        cursor = None
+        while True:
+            orders, cursor = self.get_orders_page(limit=page_size, cursor=cursor)
+            yield from orders
+            if not cursor:
+                return
+
+    def get_order(self, order_id: int) -> Dict[str, Any]:
+        response = self.session.get(f"{self.base_url}/orders/{order_id}", headers=self._headers())
+        response.raise_for_status()
+        return _decode(response)
+
+    def get_changes(self, since: int = 0, limit: int = 100, wait: float = 0) -> Dict[str, Any]:
+        """Changes after sequence number ``since``: {"changes": [...], "last_seq": n}.
+
+        With ``wait`` the server holds the request for up to that many
+        seconds until a change arrives.
+        """
+        response = self.session.get(
+            f"{self.base_url}/changes",
+            params={"since": since, "limit": limit, "wait": wait},
+            headers=self._headers()
+        )
+        response.raise_for_status()
+        return _decode(response)
+
+    def iter_changes(self, since: int = 0, offset_file: Optional[str] = None, limit: int = 100,
+                     wait: float = 30.0, follow: bool = True) -> Iterator[Dict[str, Any]]:
+        """Yield product and order changes after ``since``, oldest first.
+
+        With ``follow`` (the default) this never ends: once caught up it
+        long-polls for new changes. Otherwise it stops when caught up.
+
+        With ``offset_file`` the last handled sequence number is kept in that
+        file and iteration resumes after it; ``since`` only applies while the
+        file does not exist. A change counts as handled once the next one is
+        requested, so a consumer that dies mid-change sees it again rather
+        than missing it. The file is written after each page and when
+        iteration stops.
+        """
+        handled = saved = _read_offset(offset_file, since) if offset_file else since
+        try:
+            while True:
+                feed = self.get_changes(handled, limit, wait if follow else 0)
+                for change in feed["changes"]:
+                    yield change
+                    handled = change["seq"]
+                if offset_file and handled != saved:
+                    _save_offset(offset_file, handled)
+                    saved = handled
+                if not feed["changes"] and not follow:
+                    return
+        finally:
+            if offset_file and handled != saved:
+                _save_offset(offset_file, handled)
 
     def signup(self, username: str, password: str, role: str) -> Dict[str, Any]:
         response = self.session.post(
@@ -93,7 +398,7 @@ class EcommerceSDK:
             json={"username": username, "password": password, "role": role}
         )
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
 
     def login(self, username: str, password: str) -> Dict[str, Any]:
         response = self.session.post(
@@ -101,9 +406,9 @@ class EcommerceSDK:
             json={"username": username, "password": password}
         )
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
 
     def health_check(self) -> Dict[str, Any]:
         response = self.session.get(f"{self.base_url}/")
         response.raise_for_status()
-        return response.json()
+        return _decode(response)
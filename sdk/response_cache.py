@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class CachedResponse:
+    __slots__ = ("etag", "data", "headers", "fresh_until")
+
+    def __init__(self, etag: Optional[str], data: Any, headers: Dict[str, str], fresh_until: float):
+        self.etag = etag
+        self.data = data
+        self.headers = headers
+        self.fresh_until = fresh_until
+
+
+class ResponseCache:
+    """LRU cache of decoded GET responses, keyed by path and params.
+
+    An entry younger than ``ttl`` seconds is returned without contacting the
+    server. Older entries are kept and revalidated with ``If-None-Match``; a
+    304 makes them fresh again without transferring the body. At most
+    ``max_size`` entries are kept, least recently used first out.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 5.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(path: str, params: Optional[Dict[str, Any]] = None) -> Hashable:
+        return path, tuple(sorted((params or {}).items()))
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return entry.fresh_until > self._clock()
+
+    def put(self, key: Hashable, etag: Optional[str], data: Any,
+            headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        entry = CachedResponse(etag, data, headers or {}, self._clock() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def touch(self, entry: CachedResponse):
+        """Mark an entry fresh again after a 304."""
+        entry.fresh_until = self._clock() + self.ttl
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.stores import ENGINES, create_store
+
+
+@pytest.fixture(params=sorted(ENGINES))
+def engine(request):
+    return request.param
+
+
+@pytest.fixture
+def make_store(engine, tmp_path):
+    """Open (or reopen) the engine's store at one path; all are closed afterwards."""
+    opened = []
+
+    def make():
+        store = create_store(engine, str(tmp_path / "db"))
+        opened.append(store)
+        return store
+
+    yield make
+    for store in opened:
+        store.close()
+
+
+@pytest.fixture
+def store(make_store):
+    return make_store()
+
+
+@pytest.fixture
+def client(engine, tmp_path, monkeypatch):
+    """A TestClient for the app running on a fresh store of the engine."""
+    monkeypatch.setattr(main, "STORE_ENGINE", engine)
+    monkeypatch.setattr(main, "STORE_PATH", str(tmp_path / "db"))
+    with TestClient(main.create_app()) as client:
+        yield client
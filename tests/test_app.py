@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from sdk.async_ecommerce_sdk import AsyncEcommerceSDK
+
+
+def test_apps_do_not_share_stores_or_caches(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "STORE_ENGINE", engine)
+    monkeypatch.setattr(main, "STORE_PATH", str(tmp_path / "one"))
+    with TestClient(main.create_app()) as one:
+        monkeypatch.setattr(main, "STORE_PATH", str(tmp_path / "two"))
+        with TestClient(main.create_app()) as two:
+            one.post("/products", json={"name": "A", "price": 1.0, "description": ""})
+            assert two.get("/products").json() == []
+            assert [p["name"] for p in one.get("/products").json()] == ["A"]
+            assert one.app.state.read_cache is not two.app.state.read_cache
+
+
+def test_store_stays_open_until_the_last_lifespan_leaves(client):
+    app = client.app
+    store = app.state.store
+
+    async def run():
+        sdk = AsyncEcommerceSDK(app=app)
+        await sdk.__aenter__()
+        try:
+            assert app.state.store is store
+            # The outer lifespan leaves first; the SDK keeps using the store.
+            client.__exit__(None, None, None)
+            assert app.state.store is store
+            await sdk.add_product("A", 1.0, "")
+            assert [p["name"] for p in await sdk.get_products()] == ["A"]
+        finally:
+            await sdk.aclose()
+        assert app.state.store is None
+        assert app.state.lifespans == 0
+
+    asyncio.run(run())
+
+
+def test_async_add_products_sends_chunks_in_order(client):
+    products = [{"name": f"P{i}", "price": 1.0, "description": ""} for i in range(8)]
+    products[4]["price"] = "not a price"
+
+    async def run():
+        async with AsyncEcommerceSDK(app=client.app) as sdk:
+            created = await sdk.add_products(products[:4] + products[5:], chunk_size=3)
+            assert [p["name"] for p in created] == [p["name"] for p in products if p is not products[4]]
+            assert [p["id"] for p in created] == sorted(p["id"] for p in created)
+            with pytest.raises(httpx.HTTPStatusError):
+                await sdk.add_products(products, chunk_size=3)
+            # The first chunk is kept; nothing after the bad one is sent.
+            return [p["name"] for p in await sdk.get_products()][7:]
+
+    assert asyncio.run(run()) == ["P0", "P1", "P2"]
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from backend.changes import ORDER, PRODUCT, ChangeLog
+from backend.db_store import ShelfHandle
+from backend.models import ProductCreate
+from backend.records import CHANGE_BLOCK
+from sdk.ecommerce_sdk import EcommerceSDK
+
+
+def test_change_log_reads_across_blocks(tmp_path):
+    handle = ShelfHandle(str(tmp_path / "log"), sync_interval=0)
+    log = ChangeLog(handle)
+    log.load()
+    total = 2 * CHANGE_BLOCK + 5
+    log.append(PRODUCT, "created", range(1, CHANGE_BLOCK))
+    for entity_id in range(CHANGE_BLOCK, total + 1):
+        log.append(PRODUCT, "updated", [entity_id])
+    assert log.last_seq == total
+    for since in (0, CHANGE_BLOCK - 1, CHANGE_BLOCK, CHANGE_BLOCK + 1, total - 1, total):
+        assert [r.seq for r in log.read(since, 10)] == list(range(since + 1, min(since + 10, total) + 1))
+    assert [r.entity_id for r in log.read(0, total)] == list(range(1, total + 1))
+    handle.close()
+
+    reopened = ChangeLog(handle)
+    reopened.load()
+    assert reopened.last_seq == total
+    reopened.append(ORDER, "created", [1])
+    assert [r.seq for r in reopened.read(total - 1, 10)] == [total, total + 1]
+    handle.close()
+
+
+def read_feed(store, since=0, limit=7):
+    seqs = []
+    while True:
+        feed = store.changes(since, limit)
+        if not feed.changes:
+            assert feed.last_seq == since
+            return seqs
+        seqs.extend(change.seq for change in feed.changes)
+        since = feed.last_seq
+
+
+def test_feed_is_gap_free_across_reopen(make_store):
+    store = make_store()
+    products = store.add_products([ProductCreate(name=f"P{i}", price=1.0, description="", stock=5) for i in range(40)])
+    store.update_product(products[0].id, name="Renamed")
+    store.delete_product(products[1].id)
+    store.add_to_cart("alice", products[2].id, 1)
+    order = store.checkout("alice")
+    feed = store.changes(40, 10)
+    assert [(c.entity, c.action, c.id) for c in feed.changes] == [
+        (PRODUCT, "updated", products[0].id), (PRODUCT, "deleted", products[1].id), (ORDER, "created", order.id)
+    ]
+    assert feed.changes[0].product.name == "Renamed"
+    assert feed.changes[1].product is None
+    assert feed.changes[2].order.id == order.id
+    assert read_feed(store) == list(range(1, 44))
+    store.close()
+
+    store = make_store()
+    assert read_feed(store) == list(range(1, 44))
+    store.add_product("After", 1.0, "")
+    assert read_feed(store, since=43) == [44]
+    assert store.last_product_change() == 44
+
+
+def test_changes_long_poll_wakes_on_a_change(client):
+    pid = client.post("/products", json={"name": "A", "price": 1.0, "description": ""}).json()["id"]
+    assert client.get("/changes", params={"since": 1}).json() == {"changes": [], "last_seq": 1}
+
+    timer = threading.Timer(0.3, client.app.state.store.update_product, (pid,), {"name": "B"})
+    timer.start()
+    started = time.perf_counter()
+    feed = client.get("/changes", params={"since": 1, "wait": 10}).json()
+    timer.join()
+    assert time.perf_counter() - started < 5
+    assert [(c["seq"], c["action"], c["product"]["name"]) for c in feed["changes"]] == [(2, "updated", "B")]
+
+
+def test_iter_changes_resumes_from_offset_file(client, tmp_path):
+    sdk = EcommerceSDK("http://testserver")
+    sdk.session = client
+    for i in range(5):
+        sdk.add_product(f"P{i}", 1.0, "")
+    offset = str(tmp_path / "offset")
+
+    seen = []
+    for change in sdk.iter_changes(offset_file=offset, limit=2, follow=False):
+        seen.append(change["seq"])
+        if change["seq"] == 3:
+            break
+    assert seen == [1, 2, 3]
+    # Change 3 was being handled when iteration stopped, so it comes again.
+    assert open(offset).read() == "2"
+    assert [c["seq"] for c in sdk.iter_changes(offset_file=offset, follow=False)] == [3, 4, 5]
+    assert open(offset).read() == "5"
+    assert list(sdk.iter_changes(offset_file=offset, follow=False)) == []
+
+    sdk.add_product("P5", 1.0, "")
+    assert [c["seq"] for c in sdk.iter_changes(offset_file=offset, follow=False)] == [6]
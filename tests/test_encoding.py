@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from backend import encoding
+
+
+@pytest.fixture
+def engine():
+    # Negotiation does not depend on the storage engine.
+    return "memory"
+
+
+@pytest.fixture
+def catalog(client):
+    products = [{"name": f"Item {i}", "price": i + 0.5, "description": "d" * 40} for i in range(100)]
+    client.post("/products/batch", json=products)
+    return client
+
+
+@pytest.fixture
+def without_brotli(monkeypatch):
+    monkeypatch.setattr(encoding, "brotli", None)
+    monkeypatch.setattr(encoding, "ENCODINGS", ("gzip",))
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("identity", None),
+    ("identity;q=0, gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*;q=0", None),
+    ("deflate, gzip;q=0.1", "gzip"),
+    ("gzip;q=junk", None),
+])
+def test_choose_encoding(without_brotli, header, expected):
+    assert encoding.choose_encoding(header) == expected
+
+
+def test_brotli_only_when_installed(without_brotli):
+    assert encoding.choose_encoding("br") is None
+    assert encoding.choose_encoding("br, gzip") == "gzip"
+
+
+def test_brotli_preference():
+    if encoding.brotli is None:
+        pytest.skip("brotli is not installed")
+    assert encoding.choose_encoding("br, gzip") == "br"
+    assert encoding.choose_encoding("br;q=0.5, gzip") == "gzip"
+    assert encoding.choose_encoding("*") == "br"
+
+
+def test_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(encoding, "msgpack", None)
+    assert encoding.choose_media_type("application/msgpack") == encoding.JSON
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("application/msgpack", encoding.MSGPACK),
+    ("application/x-msgpack", encoding.MSGPACK),
+    ("application/msgpack, application/json;q=0.9", encoding.MSGPACK),
+    ("application/json, application/msgpack;q=0.5", encoding.JSON),
+    ("*/*", encoding.JSON),
+    (None, encoding.JSON),
+])
+def test_choose_media_type(accept, expected):
+    if encoding.msgpack is None:
+        pytest.skip("msgpack is not installed")
+    assert encoding.choose_media_type(accept) == expected
+
+
+def test_large_listing_is_gzipped(catalog, without_brotli):
+    plain = catalog.get("/products", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept, Accept-Encoding"
+
+    packed = catalog.get("/products", headers={"Accept-Encoding": "br, gzip"})
+    assert packed.headers["content-encoding"] == "gzip"
+    assert packed.headers["vary"] == "Accept, Accept-Encoding"
+    assert int(packed.headers["content-length"]) < len(plain.content)
+    assert packed.json() == plain.json()
+    assert packed.headers["etag"] != plain.headers["etag"]
+    # Either representation's ETag revalidates the other.
+    revalidated = catalog.get("/products", headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_small_bodies_are_not_compressed(catalog):
+    response = catalog.get("/products/1", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+    response = catalog.get("/cart", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept"
+
+
+def test_uncached_responses_are_compressed_by_the_middleware(catalog):
+    response = catalog.get("/changes", params={"limit": 100}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+    assert len(response.json()["changes"]) == 100
+
+
+def test_streamed_export_is_compressed_as_it_goes(catalog):
+    with catalog.stream("GET", "/products/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        lines = b"".join(response.iter_bytes()).splitlines()
+    assert [json.loads(line)["name"] for line in lines] == [f"Item {i}" for i in range(100)]
+
+
+def test_msgpack_falls_back_to_json(catalog, monkeypatch):
+    monkeypatch.setattr(encoding, "msgpack", None)
+    for path in ("/products", "/products/1", "/changes"):
+        response = catalog.get(path, headers={"Accept": "application/msgpack"})
+        assert response.headers["content-type"] == encoding.JSON
+        response.json()
+
+
+def test_msgpack_round_trips(catalog):
+    msgpack = pytest.importorskip("msgpack")
+    plain = catalog.get("/products").json()
+    response = catalog.get("/products", headers={"Accept": "application/msgpack", "Accept-Encoding": "gzip"})
+    assert response.headers["content-type"] == encoding.MSGPACK
+    assert msgpack.unpackb(response.content) == plain
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from backend.base_store import BaseStore, InsufficientStock
+from backend.models import Cart, CartItem, CartItemCreate, OrderItem
+
+
+def stocked(store, stock):
+    return store.add_product("Widget", 2.5, "", stock=stock).id
+
+
+def test_concurrent_adds_never_oversell(store):
+    pid = stocked(store, 5)
+    results = []
+    start = threading.Barrier(20)
+
+    def buy(user):
+        start.wait()
+        try:
+            results.append(store.add_to_cart(user, pid, 1))
+        except InsufficientStock:
+            results.append(False)
+
+    threads = [threading.Thread(target=buy, args=(f"user{i}",)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 5
+    level = store.get_stock(pid)
+    assert (level.stock, level.reserved, level.available) == (5, 5, 0)
+
+
+def test_add_beyond_stock_holds_nothing(store):
+    pid = stocked(store, 2)
+    other = stocked(store, 10)
+    with pytest.raises(InsufficientStock) as raised:
+        store.add_to_cart_many("alice", [CartItemCreate(product_id=other, quantity=1),
+                                         CartItemCreate(product_id=pid, quantity=3)])
+    assert raised.value.product_ids == [pid]
+    assert store.get_cart("alice").items == []
+    assert store.get_stock(other).available == 10
+
+
+@pytest.mark.parametrize("quantity", [0, -1])
+def test_rejects_quantities_below_one(store, quantity):
+    pid = stocked(store, 5)
+    with pytest.raises(ValueError):
+        store.add_to_cart("alice", pid, quantity)
+    assert store.get_stock(pid).available == 5
+
+
+def test_expired_holds_are_released(monkeypatch, make_store):
+    monkeypatch.setattr(BaseStore, "hold_ttl", 0)
+    store = make_store()
+    pid = stocked(store, 5)
+    store.add_to_cart("alice", pid, 3)
+    assert store.release_expired_holds() == 1
+    assert store.get_stock(pid).available == 5
+    assert store.release_expired_holds() == 0
+    # The cart line stays; only its hold lapsed.
+    assert [item.quantity for item in store.get_cart("alice").items] == [3]
+
+
+def test_live_holds_are_kept(store):
+    pid = stocked(store, 5)
+    store.add_to_cart("alice", pid, 3)
+    assert store.release_expired_holds() == 0
+    assert store.get_stock(pid).available == 2
+
+
+def test_set_stock_below_held_units_raises(store):
+    pid = stocked(store, 5)
+    store.add_to_cart("alice", pid, 3)
+    with pytest.raises(ValueError):
+        store.set_stock(pid, 2)
+    assert store.get_stock(pid).stock == 5
+    level = store.set_stock(pid, 3)
+    assert (level.stock, level.available) == (3, 0)
+
+
+def test_checkout_short_of_stock_changes_nothing(monkeypatch, make_store):
+    monkeypatch.setattr(BaseStore, "hold_ttl", 0)
+    store = make_store()
+    pid = stocked(store, 5)
+    other = stocked(store, 5)
+    store.add_to_cart("alice", other, 1)
+    store.add_to_cart("alice", pid, 3)
+    store.release_expired_holds()
+    store.set_stock(pid, 1)
+    cart = store.get_cart("alice")
+    with pytest.raises(InsufficientStock) as raised:
+        store.checkout("alice")
+    assert raised.value.product_ids == [pid]
+    assert store.get_cart("alice") == cart
+    assert store.get_stock(pid).stock == 1
+    assert store.get_stock(other).stock == 5
+    assert store.list_orders("alice")[0] == []
+
+
+def test_checkout_deducts_held_stock(store):
+    pid = stocked(store, 5)
+    store.add_to_cart("alice", pid, 3)
+    order = store.checkout("alice")
+    assert [item.quantity for item in order.items] == [3]
+    level = store.get_stock(pid)
+    assert (level.stock, level.reserved, level.available) == (2, 0, 2)
+    assert store.get_cart("alice").items == []
+
+
+def test_batch_rejects_quantities_below_one(client):
+    pid = client.post("/products", json={"name": "A", "price": 1.0, "description": "", "stock": 5}).json()["id"]
+    response = client.post("/cart/batch", json=[{"product_id": pid, "quantity": 0}])
+    assert response.status_code == 422
+    assert client.get("/cart").json() == {"items": []}
+
+
+def test_stored_lines_are_served_whatever_their_quantity():
+    # Carts and orders written before quantities were checked must still load.
+    assert Cart(items=[CartItem(product_id=1, quantity=0)]).items[0].quantity == 0
+    assert OrderItem(product_id=1, name="a", price=1.0, quantity=-1).quantity == -1
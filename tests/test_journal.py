@@ -0,0 +1,155 @@
+import os
+
+import pytest
+
+from backend.inmemory_store import JournalHandle
+from backend.records import ProductRecord
+
+
+def product(pid, name="P"):
+    return ProductRecord(pid, name, 1.0, "")
+
+
+def open_handle(path):
+    handle = JournalHandle(path, flush_interval=60)
+    handle.open()
+    return handle
+
+
+def crash(handle):
+    # Stop without close(): what reached the journal stays, pending writes
+    # are lost and nothing is compacted.
+    handle._pending = []
+    handle._stopping = True
+    handle._wakeup.set()
+    handle._flusher.join()
+    handle._journal.close()
+    handle._process_lock.release()
+
+
+def compact(handle):
+    with handle._io_lock:
+        handle._compact()
+
+
+def names(handle):
+    return {pid: p.name for pid, p in ((p.id, p) for p in handle.values('product'))}
+
+
+def test_replays_journal_after_crash(tmp_path):
+    path = str(tmp_path / "mem")
+    handle = open_handle(path)
+    handle.put('product', 1, product(1))
+    handle.put_many('product', {2: product(2), 3: product(3)})
+    handle.delete('product', 2)
+    handle.sync()
+    handle.put('product', 4, product(4))  # still pending: lost in the crash
+    crash(handle)
+
+    handle = open_handle(path)
+    assert names(handle) == {1: "P", 3: "P"}
+    handle.close()
+
+
+def test_close_compacts_and_reopens(tmp_path):
+    path = str(tmp_path / "mem")
+    handle = open_handle(path)
+    handle.put('product', 1, product(1))
+    handle.delete('product', 1)
+    handle.put('product', 2, product(2))
+    handle.close()
+
+    handle = open_handle(path)
+    assert names(handle) == {2: "P"}
+    # Only the epoch header is left in the journal.
+    assert os.path.getsize(handle.journal_path) < 64
+    handle.close()
+
+
+def test_writes_after_compaction_survive_a_crash(tmp_path):
+    path = str(tmp_path / "mem")
+    handle = open_handle(path)
+    handle.put('product', 1, product(1))
+    handle.sync()
+    compact(handle)
+    handle.put('product', 1, product(1, "after"))
+    handle.put('product', 2, product(2))
+    handle.sync()
+    crash(handle)
+
+    handle = open_handle(path)
+    assert names(handle) == {1: "after", 2: "P"}
+    handle.close()
+
+
+def test_stale_journal_is_not_replayed_over_newer_snapshot(tmp_path):
+    path = str(tmp_path / "mem")
+    handle = open_handle(path)
+    handle.put('product', 1, product(1, "old"))
+    handle.put('product', 2, product(2))
+    handle.sync()
+    handle.delete('product', 2)
+    handle.put('product', 1, product(1, "new"))  # pending, so only in the snapshot
+    with open(handle.journal_path, 'rb') as f:
+        stale = f.read()
+    compact(handle)
+    crash(handle)
+    # As if the crash hit after the snapshot was replaced but before the
+    # journal was emptied.
+    with open(handle.journal_path, 'wb') as f:
+        f.write(stale)
+
+    handle = open_handle(path)
+    assert names(handle) == {1: "new"}
+    handle.put('product', 3, product(3))
+    handle.close()
+    handle = open_handle(path)
+    assert names(handle) == {1: "new", 3: "P"}
+    handle.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = str(tmp_path / "mem")
+    handle = open_handle(path)
+    handle.put('product', 1, product(1))
+    handle.sync()
+    good = os.path.getsize(handle.journal_path)
+    handle.put('product', 2, product(2))
+    handle.sync()
+    crash(handle)
+    os.truncate(handle.journal_path, os.path.getsize(handle.journal_path) - 3)
+
+    handle = open_handle(path)
+    assert names(handle) == {1: "P"}
+    assert os.path.getsize(handle.journal_path) == good
+    # New entries follow the good prefix instead of the torn bytes.
+    handle.put('product', 3, product(3))
+    handle.sync()
+    crash(handle)
+
+    handle = open_handle(path)
+    assert names(handle) == {1: "P", 3: "P"}
+    handle.close()
+
+
+def test_use_after_close_raises(tmp_path):
+    path = str(tmp_path / "mem")
+    handle = open_handle(path)
+    handle.put('product', 1, product(1))
+    handle.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        handle.put('product', 2, product(2))
+    with pytest.raises(RuntimeError, match="closed"):
+        handle.get('product', 1)
+    assert not handle.is_open
+
+    handle.open()
+    assert names(handle) == {1: "P"}
+    handle.close()
+
+
+def test_opens_lazily_before_first_open(tmp_path):
+    handle = JournalHandle(str(tmp_path / "mem"), flush_interval=60)
+    handle.put('product', 1, product(1))
+    assert handle.is_open
+    handle.close()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+from backend import main, ndjson
+
+
+async def chunked(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def read_all(*chunks, max_line=100):
+    async def collect():
+        return [item async for item in ndjson.read_lines(chunked(*chunks), max_line)]
+    return asyncio.run(collect())
+
+
+def test_lines_split_across_chunks():
+    assert read_all(b'{"a"', b': 1}\n{"b": 2}\n{"c"', b': 3}\n') == [
+        (1, b'{"a": 1}'), (2, b'{"b": 2}'), (3, b'{"c": 3}')
+    ]
+
+
+def test_missing_trailing_newline_keeps_last_line():
+    assert read_all(b'{"a": 1}\n{"b": 2}') == [(1, b'{"a": 1}'), (2, b'{"b": 2}')]
+
+
+def test_blank_lines_are_skipped_but_counted():
+    assert read_all(b'\n{"a": 1}\n  \n{"b": 2}\n\n') == [(2, b'{"a": 1}'), (4, b'{"b": 2}')]
+
+
+def test_overlong_line_raises():
+    with pytest.raises(ValueError, match="Line 2"):
+        read_all(b'{"a": 1}\n' + b"x" * 60, b"x" * 60, max_line=100)
+    with pytest.raises(ValueError, match="Line 1"):
+        read_all(b"x" * 101 + b"\n", max_line=100)
+
+
+def test_encode_lines():
+    assert ndjson.encode_lines([{"a": 1}, {"b": "é"}]) == '{"a":1}\n{"b":"é"}\n'.encode()
+
+
+def products(count):
+    return [{"name": f"Item {i}", "price": i + 0.25, "description": f"Ü {i}"} for i in range(count)]
+
+
+def body(items, end=b"\n"):
+    return b"\n".join(json.dumps(item).encode() for item in items) + end
+
+
+def test_export_import_round_trip(client, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_PAGE", 7)
+    client.post("/products/batch", json=products(20))
+    exported = client.get("/products/export")
+    assert exported.headers["content-type"] == ndjson.MEDIA_TYPE
+    lines = exported.content.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == list(range(1, 21))
+
+    response = client.post("/products/import", content=exported.content, headers={"Content-Type": ndjson.MEDIA_TYPE})
+    assert response.json() == {"imported": 20}
+    catalog = client.get("/products").json()
+    strip = [{k: v for k, v in p.items() if k != "id"} for p in catalog]
+    assert strip[20:] == strip[:20] == products(20)
+
+
+def test_import_without_trailing_newline(client):
+    response = client.post("/products/import", content=body(products(3), end=b""))
+    assert response.json() == {"imported": 3}
+    assert [p["name"] for p in client.get("/products").json()] == ["Item 0", "Item 1", "Item 2"]
+
+
+def test_malformed_line_keeps_committed_batches(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_BATCH", 2)
+    lines = body(products(3)) + b"{not json}\n" + body(products(1))
+    response = client.post("/products/import", content=lines)
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["imported"] == 2
+    assert detail["message"].startswith("Line 4")
+    assert len(client.get("/products").json()) == 2
+
+
+def test_invalid_product_is_rejected(client):
+    response = client.post("/products/import", content=body([{"name": "no price"}]))
+    assert response.status_code == 400
+    assert response.json()["detail"]["imported"] == 0
+
+
+def test_overlong_import_line_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_IMPORT_LINE", 64)
+    response = client.post("/products/import", content=body([{"name": "x" * 100, "price": 1.0, "description": ""}]))
+    assert response.status_code == 400
+    assert response.json()["detail"]["message"] == "Line 1 is longer than 64 bytes"
+    assert client.get("/products").json() == []
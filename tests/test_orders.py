@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.fixture
+def token(client):
+    client.post("/signup", json={"username": "alice", "password": "pw", "role": "customer"})
+    return client.post("/login", json={"username": "alice", "password": "pw"}).json()["token"]
+
+
+def place_order(client, headers=None):
+    pid = client.post("/products", json={"name": "A", "price": 1.0, "description": ""}).json()["id"]
+    client.post("/cart", params={"product_id": pid}, headers=headers)
+    return client.post("/checkout", headers=headers).json()["id"]
+
+
+@pytest.mark.parametrize("headers", [None, {"token": "unknown"}])
+def test_orders_need_a_valid_session(client, headers):
+    oid = place_order(client)
+    assert client.get("/orders", headers=headers).status_code == 401
+    assert client.get(f"/orders/{oid}", headers=headers).status_code == 401
+
+
+def test_orders_are_listed_for_their_owner_only(client, token):
+    anonymous = place_order(client)
+    own = place_order(client, {"token": token})
+    response = client.get("/orders", headers={"token": token})
+    assert [order["id"] for order in response.json()] == [own]
+    assert client.get(f"/orders/{own}", headers={"token": token}).status_code == 200
+    assert client.get(f"/orders/{anonymous}", headers={"token": token}).status_code == 404
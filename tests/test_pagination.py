@@ -0,0 +1,52 @@
+import pytest
+
+from backend.models import ProductCreate
+from backend.pagination import name_key
+
+NAMES = ['Äpfel', 'apple', 'Zebra', 'Élan', 'banana', 'Ölkanne', 'cherry']
+
+
+def page_through(store, **kwargs):
+    names, cursor = [], None
+    # A cursor that disagrees with the ordering can repeat pages forever.
+    for _ in range(len(NAMES) + 1):
+        products, cursor = store.list_products(limit=2, cursor=cursor, sort='name', **kwargs)
+        names.extend(p.name for p in products)
+        if cursor is None:
+            return names
+    pytest.fail(f"paging did not finish: {names}")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_non_ascii_names_by_name(store, descending):
+    for name in NAMES:
+        store.add_product(name, 1.0, "")
+    expected = sorted(NAMES, key=name_key, reverse=descending)
+    assert page_through(store, descending=descending) == expected
+
+
+def test_renamed_product_moves_in_name_order(store):
+    products = [store.add_product(name, 1.0, "") for name in NAMES]
+    store.update_product(products[0].id, name="Zürich")
+    names = page_through(store, descending=False)
+    assert names == sorted([*NAMES[1:], "Zürich"], key=name_key)
+
+
+@pytest.mark.parametrize("sort", ['id', 'name'])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("band", [(10.0, 12.0), (0.0, 90.0), (None, 3.0), (95.0, None)])
+def test_price_filter_with_other_sort_keys(store, sort, descending, band):
+    store.add_products([ProductCreate(name=f"p{(i * 37) % 100:02}", price=float(i % 100), description="")
+                        for i in range(200)])
+    min_price, max_price = band
+    everything, _ = store.list_products(sort=sort, descending=descending)
+    expected = [p.id for p in everything
+                if (min_price is None or p.price >= min_price) and (max_price is None or p.price <= max_price)]
+    ids, cursor = [], None
+    for _ in range(len(expected) + 1):
+        products, cursor = store.list_products(limit=7, cursor=cursor, sort=sort, descending=descending,
+                                               min_price=min_price, max_price=max_price)
+        ids.extend(p.id for p in products)
+        if cursor is None:
+            break
+    assert ids == expected
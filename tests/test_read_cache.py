@@ -0,0 +1,105 @@
+import pytest
+
+from backend import main
+from backend.read_cache import LISTING, PRODUCT, SEARCH, ReadCache
+
+
+def fill(cache, *keys, size=10):
+    for key in keys:
+        cache.put(key, b"x" * size, cache.generation)
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = ReadCache(max_bytes=30)
+    fill(cache, (PRODUCT, 1), (PRODUCT, 2), (PRODUCT, 3))
+    cache.get((PRODUCT, 1))
+    fill(cache, (PRODUCT, 4))
+    assert cache.get((PRODUCT, 2)) is None
+    assert all(cache.get((PRODUCT, pid)) for pid in (1, 3, 4))
+    assert cache.size == 30
+
+
+def test_variants_count_towards_the_bound():
+    cache = ReadCache(max_bytes=30)
+    fill(cache, (PRODUCT, 1), (PRODUCT, 2))
+    entry = cache.get((PRODUCT, 2))
+    cache.put_variant((PRODUCT, 2), entry, ("application/json", "gzip"), b"y" * 15)
+    assert cache.get((PRODUCT, 1)) is None
+    assert cache.size == 25
+
+
+def test_bodies_over_the_bound_are_not_kept():
+    cache = ReadCache(max_bytes=5)
+    entry = cache.put((PRODUCT, 1), b"x" * 6, cache.generation)
+    assert entry.body == b"x" * 6
+    assert cache.get((PRODUCT, 1)) is None
+    assert cache.size == 0
+
+
+def test_add_drops_listings_and_searches():
+    cache = ReadCache()
+    fill(cache, (PRODUCT, 1), (LISTING, None), (SEARCH, "a"))
+    cache.products_added()
+    assert cache.get((PRODUCT, 1)) is not None
+    assert cache.get((LISTING, None)) is None
+    assert cache.get((SEARCH, "a")) is None
+
+
+def test_change_drops_the_product_listings_and_searches():
+    cache = ReadCache()
+    fill(cache, (PRODUCT, 1), (PRODUCT, 2), (LISTING, None), (SEARCH, "a"))
+    cache.products_changed([1])
+    assert cache.get((PRODUCT, 1)) is None
+    assert cache.get((PRODUCT, 2)) is not None
+    assert len(cache) == 1
+    assert cache.size == 10
+
+
+def test_put_after_a_write_is_not_cached():
+    cache = ReadCache()
+    generation = cache.generation
+    cache.products_changed([1])
+    cache.put((PRODUCT, 1), b"stale", generation)
+    assert cache.get((PRODUCT, 1)) is None
+
+
+def test_follow_clears_only_when_the_change_moves():
+    cache = ReadCache()
+    cache.follow(5)
+    fill(cache, (PRODUCT, 1))
+    cache.follow(5)
+    assert cache.get((PRODUCT, 1)) is not None
+    cache.follow(6)
+    assert cache.get((PRODUCT, 1)) is None
+
+
+def test_writes_are_visible_on_the_next_get(client):
+    pid = client.post("/products", json={"name": "A", "price": 1.0, "description": ""}).json()["id"]
+    for _ in range(2):
+        assert client.get(f"/products/{pid}").json()["name"] == "A"
+        assert [p["name"] for p in client.get("/products").json()] == ["A"]
+        assert [p["name"] for p in client.get("/products/search", params={"query": "A"}).json()] == ["A"]
+
+    client.put(f"/products/{pid}", json={"name": "B"})
+    assert client.get(f"/products/{pid}").json()["name"] == "B"
+    assert [p["name"] for p in client.get("/products").json()] == ["B"]
+    assert client.get("/products/search", params={"query": "A"}).json() == []
+
+    client.post("/products", json={"name": "C", "price": 2.0, "description": ""})
+    assert [p["name"] for p in client.get("/products").json()] == ["B", "C"]
+
+    client.delete(f"/products/{pid}")
+    assert client.get(f"/products/{pid}").status_code == 404
+    assert [p["name"] for p in client.get("/products").json()] == ["C"]
+
+
+def test_shared_store_writes_from_elsewhere_are_picked_up(client, monkeypatch):
+    if not client.app.state.store.shared:
+        pytest.skip("only shared engines see writes from other processes")
+    pid = client.post("/products", json={"name": "A", "price": 1.0, "description": ""}).json()["id"]
+    assert client.get(f"/products/{pid}").json()["name"] == "A"
+    monkeypatch.setattr(client.app.state, "next_change_check", 0.0)
+    monkeypatch.setattr(main, "CHANGE_CHECK_INTERVAL", 0.0)
+    # Bypasses the write routes, as a write in another worker would.
+    client.app.state.store.update_product(pid, name="B")
+    assert client.get(f"/products/{pid}").json()["name"] == "B"
@@ -0,0 +1,102 @@
+from datetime import datetime
+
+import pytest
+
+from backend import records
+from backend.models import Cart, CartItem, Order, OrderItem, Product, SessionToken, User
+from backend.records import (
+    CartLine, ChangeRecord, OrderLine, OrderRecord, ProductRecord, SessionRecord, StockRecord, UserRecord,
+    from_micros, to_micros
+)
+
+NOW = to_micros(datetime(2024, 2, 29, 23, 59, 59, 999999))
+
+SAMPLES = [
+    ('product', ProductRecord(1, "Widget", 9.99, "A widget")),
+    ('product', ProductRecord(2**40, "Ölkanne ☕", 0.0, "")),
+    ('cart', ()),
+    ('cart', (CartLine(1, 2, 9.99), CartLine(7, 1), CartLine(3, 10**6, 0.0))),
+    ('order', OrderRecord(5, (OrderLine(1, "Widget", 9.99, 2), OrderLine(2, "Ünïcode", 1.5, 1)),
+                          21.48, NOW, True, "alice")),
+    ('order', OrderRecord(6, (), 0.0, 0, False)),
+    ('user', UserRecord("alice", "pässword", "customer")),
+    ('user', UserRecord("", "", "")),
+    ('session', SessionRecord("t0ken", "alice", "customer", NOW)),
+    ('session', SessionRecord("t0ken", "alice", "customer", None)),
+    ('user_orders', ()),
+    ('user_orders', (1, 5, 2**50)),
+    ('stock', StockRecord(1, 0)),
+    ('stock', StockRecord(2, 10**9)),
+    ('changes', ()),
+    ('changes', tuple(ChangeRecord(seq, entity, action, seq * 10, NOW + seq)
+                      for seq, (entity, action) in enumerate(
+                          [(e, a) for e in records.CHANGE_ENTITIES for a in records.CHANGE_ACTIONS], 1))),
+]
+
+
+@pytest.mark.parametrize("table, record", SAMPLES)
+def test_round_trip(table, record):
+    encoded = records.dump(table, record)
+    assert isinstance(encoded, bytes)
+    decoded = records.load(table, encoded)
+    assert decoded == record
+    assert type(decoded) is type(record)
+
+
+def test_every_table_is_covered():
+    assert {table for table, _ in SAMPLES} == set(records.CODECS)
+
+
+def test_micros_are_exact():
+    moment = datetime(2024, 2, 29, 23, 59, 59, 999999)
+    assert from_micros(to_micros(moment)) == moment
+    assert from_micros(to_micros(datetime(1969, 12, 31, 23, 59, 59))) == datetime(1969, 12, 31, 23, 59, 59)
+
+
+def test_decodes_version_1_order():
+    line = records._ORDER_LINE.pack(1, 10.0, 2, len(b"Widget")) + b"Widget"
+    data = records._ORDER_V1.pack(1, 5, 20.0, NOW, True, 1) + line
+    assert records.load('order', data) == OrderRecord(5, (OrderLine(1, "Widget", 10.0, 2),), 20.0, NOW, True, None)
+
+
+def test_decodes_version_1_cart():
+    data = records._CART.pack(1, 2) + records._CART_LINE_V1.pack(1, 3) + records._CART_LINE_V1.pack(4, 1)
+    assert records.load('cart', data) == (CartLine(1, 3, None), CartLine(4, 1, None))
+
+
+def test_order_without_owner_is_stored_as_none():
+    record = OrderRecord(1, (), 0.0, NOW, True, None)
+    assert records.load('order', records.dump('order', record)).user_id is None
+
+
+def test_unknown_version_raises():
+    data = bytearray(records.dump('product', ProductRecord(1, "a", 1.0, "")))
+    data[0] = 99
+    with pytest.raises(ValueError, match="version 99"):
+        records.load('product', bytes(data))
+
+
+def test_upgrades_legacy_models():
+    created = datetime(2023, 1, 2, 3, 4, 5)
+    assert records.load('product', Product(id=1, name="a", price=1.0, description="d")) == \
+        ProductRecord(1, "a", 1.0, "d")
+    order = Order(id=2, items=[OrderItem(product_id=1, name="a", price=1.0, quantity=3)], total=3.0,
+                  created_at=created, paid=True)
+    assert records.load('order', order) == \
+        OrderRecord(2, (OrderLine(1, "a", 1.0, 3),), 3.0, to_micros(created), True, None)
+    assert records.load('cart', Cart(items=[CartItem(product_id=1, quantity=2)])) == (CartLine(1, 2),)
+    assert records.load('user', User(username="u", password="p", role="r")) == UserRecord("u", "p", "r")
+    session = SessionToken(token="t", username="u", role="r")
+    assert records.load('session', session) == SessionRecord("t", "u", "r", None)
+
+
+def test_tables_without_codec_pass_through():
+    assert records.dump('meta', 5) == 5
+    assert records.load('meta', 5) == 5
+    assert records.load('product', None) is None
+
+
+def test_models_keep_optional_fields():
+    assert records.cart_model((CartLine(1, 2),)).items == [CartItem(product_id=1, quantity=2, price=None)]
+    assert records.session_model(SessionRecord("t", "u", "r", None)).expires_at is None
+    assert records.order_model(OrderRecord(1, (), 0.0, NOW, True)).user_id is None
@@ -0,0 +1,87 @@
+import time
+from datetime import datetime, timedelta
+
+from backend.base_store import BaseStore
+from backend.session_cache import MISS, SessionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cached_username_expires_after_ttl():
+    clock = Clock()
+    cache = SessionCache(ttl=60, negative_ttl=30, clock=clock)
+    cache.put("t", "alice")
+    clock.now = 59
+    assert cache.get("t") == "alice"
+    clock.now = 60
+    assert cache.get("t") is MISS
+    assert len(cache) == 0
+
+
+def test_unknown_token_is_remembered_for_negative_ttl():
+    clock = Clock()
+    cache = SessionCache(ttl=60, negative_ttl=30, clock=clock)
+    cache.put("bad", None)
+    clock.now = 29
+    assert cache.get("bad") is None
+    clock.now = 30
+    assert cache.get("bad") is MISS
+
+
+def test_entry_never_outlives_its_session():
+    clock = Clock()
+    cache = SessionCache(ttl=60, clock=clock)
+    cache.put("t", "alice", datetime.now() + timedelta(seconds=5))
+    clock.now = 4
+    assert cache.get("t") == "alice"
+    clock.now = 5.5
+    assert cache.get("t") is MISS
+    cache.put("gone", "bob", datetime.now() - timedelta(seconds=1))
+    assert cache.get("gone") is MISS
+
+
+def test_least_recently_used_is_evicted():
+    cache = SessionCache(max_size=2, clock=Clock())
+    cache.put("a", "alice")
+    cache.put("b", "bob")
+    cache.get("a")
+    cache.put("c", "carol")
+    assert cache.get("b") is MISS
+    assert (cache.get("a"), cache.get("c")) == ("alice", "carol")
+
+
+def test_sweep_drops_expired_entries():
+    clock = Clock()
+    cache = SessionCache(ttl=60, negative_ttl=30, clock=clock)
+    cache.put("a", "alice")
+    cache.put("bad", None)
+    clock.now = 30
+    assert cache.sweep() == 1
+    assert cache.get("a") == "alice"
+
+
+def test_purge_expired_sessions(monkeypatch, store):
+    store.signup("alice", "pw", "customer")
+    live = store.login("alice", "pw")
+    monkeypatch.setattr(store, "session_ttl", -1)
+    expired = store.login("alice", "pw")
+    assert store.get_session(expired.token) is None
+    assert store.get_session(live.token).username == "alice"
+    assert store.purge_expired_sessions() == 1
+    assert store.purge_expired_sessions() == 0
+    assert store.get_user_by_token(live.token).username == "alice"
+
+
+def test_expired_session_is_not_served_from_cache(monkeypatch, client):
+    client.post("/signup", json={"username": "alice", "password": "pw", "role": "customer"})
+    monkeypatch.setattr(BaseStore, "session_ttl", 1)
+    token = client.post("/login", json={"username": "alice", "password": "pw"}).json()["token"]
+    assert client.get("/orders", headers={"token": token}).status_code == 200
+    time.sleep(1.1)
+    assert client.get("/orders", headers={"token": token}).status_code == 401